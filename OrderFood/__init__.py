@@ -1,3 +1,4 @@
+import multiprocessing
 import os
 from urllib.parse import quote
 
@@ -7,6 +8,7 @@ from authlib.integrations.flask_client import OAuth
 from dotenv import load_dotenv
 from flask import Flask
 from flask_mail import Mail
+from flask_migrate import Migrate
 from flask_sqlalchemy import SQLAlchemy
 from werkzeug.security import generate_password_hash
 
@@ -18,6 +20,7 @@ load_dotenv()
 # ================== Global extensions ==================
 db = SQLAlchemy()
 mail = Mail()
+migrate = Migrate(directory=os.path.join(os.path.dirname(__file__), "migrations"))
 oauth = OAuth()
 scheduler = BackgroundScheduler(timezone="Asia/Ho_Chi_Minh", daemon=True)
 _SCHEDULER_STARTED = False  # chống start 2 lần
@@ -96,6 +99,18 @@ def create_app():
     db.init_app(app)
     mail.init_app(app)
 
+    # CLI: flask --app OrderFood db upgrade
+    # (create_all chỉ tạo bảng mới; thêm cột / đổi enum trên bảng đã có nằm trong migrations/)
+    migrate.init_app(app, db)
+
+    # 1 commit / request (DAO chỉ flush)
+    from OrderFood.unit_of_work import init_app as init_uow
+    init_uow(app)
+
+    # CLI: flask --app OrderFood reconcile-payments <settlement.csv>
+    from OrderFood.reconcile import init_app as init_reconcile
+    init_reconcile(app)
+
     # Admin blueprint + notifications
 
     init_noti(app)
@@ -135,6 +150,11 @@ def create_app():
                     db.session.query(models.OrderRating).delete()
                     db.session.query(models.Refund).delete()
                     db.session.query(models.Payment).delete()
+                    db.session.query(models.PayoutStatement).delete()
+                    db.session.query(models.OrderEvent).delete()
+                    db.session.query(models.EventCheckpoint).delete()
+                    db.session.query(models.OrderDailyRollup).delete()
+                    db.session.query(models.OrderLine).delete()
                     db.session.query(models.Order).delete()
                     db.session.query(models.CartItem).delete()
                     db.session.query(models.Cart).delete()
@@ -343,9 +363,27 @@ def create_app():
                 db.session.commit()
 
             # nếu đã có dữ liệu: bỏ qua seeding để bảo toàn giao dịch
+        # ---- Đơn tạo trước khi có order_line: sinh bản chụp từ cart_item ----
+        try:
+            from OrderFood.checkout_service import backfill_order_lines
+            n = backfill_order_lines()
+            if n:
+                print(f"[ORDER_LINE] backfilled {n} rows")
+        except Exception as e:
+            db.session.rollback()
+            print("[ORDER_LINE] backfill failed:", e)
+        # ---- Nạp lại bảng món hot (trending) từ các đơn COMPLETED trong tuần ----
+        try:
+            from OrderFood.trending import warm_up as warm_up_trending
+            warm_up_trending()
+        except Exception as e:
+            db.session.rollback()
+            print("[TRENDING] warm up failed:", e)
         # ---- START SCHEDULER (1 lần, có app context) ----
         global _SCHEDULER_STARTED, scheduler
         should_start = (not app.debug) or (os.environ.get("WERKZEUG_RUN_MAIN") == "true")
+        # process con của ProcessPool (payout) có thể import lại __main__ (python index.py) -> không start
+        should_start = should_start and multiprocessing.parent_process() is None
         if (not _SCHEDULER_STARTED) and should_start:
             from OrderFood.jobs import cancel_expired_orders  # import TRONG hàm, tránh circular
 
@@ -363,8 +401,65 @@ def create_app():
                 max_instances=1,
                 replace_existing=True,
             )
+            from OrderFood.cohort_job import run_cohort_job
+
+            def _run_cohort_job():
+                with app.app_context():
+                    run_cohort_job()
+
+            # Cohort/retention cho admin: chạy đêm, request chỉ đọc bảng tổng hợp
+            scheduler.add_job(
+                _run_cohort_job,
+                "cron",
+                hour=2,
+                minute=0,
+                id="compute_cohorts",
+                coalesce=True,
+                max_instances=1,
+                replace_existing=True,
+            )
+            app.extensions["cohort_job"] = _run_cohort_job
+
+            from OrderFood.payout_job import run_payout_job
+
+            def _run_payout_job():
+                with app.app_context():
+                    run_payout_job()
+
+            # Payout tháng trước cho từng nhà hàng: 03:00 ngày 1 hằng tháng
+            scheduler.add_job(
+                _run_payout_job,
+                "cron",
+                day=1,
+                hour=3,
+                minute=0,
+                id="payout_statements",
+                coalesce=True,
+                max_instances=1,
+                replace_existing=True,
+            )
             scheduler.start()
             _SCHEDULER_STARTED = True
+
+            # Worker gửi email từ outbox (thread pool, dùng lại kết nối SMTP theo lô)
+            from OrderFood.mail_outbox import worker as mail_worker
+            mail_worker.start(app)
+            mail_worker.wake()  # gửi nốt mail còn tồn từ lần chạy trước
+
+            # Worker hoàn tiền (đơn bị huỷ sau khi đã thanh toán)
+            from OrderFood.refund_queue import worker as refund_worker
+            refund_worker.start(app)
+            refund_worker.wake()
+
+            # Dispatcher order_event (noti, email, thống kê ngày, cache)
+            from OrderFood.order_events import dispatcher as event_dispatcher
+            event_dispatcher.start(app)
+            event_dispatcher.wake()  # xử lý nốt event tồn từ lần chạy trước
+
+            # WebSocket bảng đơn realtime cho owner (nhận event qua dispatcher)
+            from OrderFood import live_board
+            if live_board.LIVE_WS_ENABLED:
+                live_board.live_broker.start(app)
             print("[SCHED] started")
         # ---- END SCHEDULER ----
 
@@ -1,19 +1,27 @@
-from flask import Blueprint, render_template, session, redirect, url_for, flash, jsonify, request
-from flask import current_app
+from flask import Blueprint, render_template, session, redirect, url_for, flash, jsonify, request, abort
+from flask import current_app, send_file
 from datetime import datetime
 from sqlalchemy import func, extract
 from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy.orm import joinedload
 
 from OrderFood import db
+from OrderFood.background import submit as submit_job, get_job
+from OrderFood.bulk_delete import delete_customer_bulk, delete_owner_bulk
+from OrderFood.dao import order_dao
 from OrderFood.dao.restaurant_dao import get_all_restaurants, get_restaurant_by_id
-from OrderFood.dao.user_dao import get_all_user
-from OrderFood.email_service import send_restaurant_status_email
-from OrderFood.models import StatusRes, Order, StatusOrder, Customer, Role, Notification, Restaurant, User, \
-    RestaurantOwner
-from sqlalchemy.orm import joinedload
+from OrderFood.dao.user_dao import search_users, count_users_by_role
+from OrderFood.email_service import send_restaurant_status_email, queue_restaurant_status_emails
+from OrderFood.export_service import export_orders_csv
+from OrderFood.mail_outbox import mail_metrics
+from OrderFood.db_retry import retry_metrics, retry_on_deadlock
+from OrderFood.bulk_orders import parse_order_ids, BulkInputError, BULK_ORDER_LIMIT, complete_orders
+from OrderFood.refund_queue import refund_metrics
+from OrderFood.order_events import event_metrics
+from OrderFood.order_state_machine import order_machine, COMPLETE, ADMIN_CANCEL
+from OrderFood.payout_job import run_payout_job, parse_period, export_path
+from OrderFood.models import StatusRes, Order, StatusOrder, Customer, Role, Restaurant, User, \
+    RestaurantOwner, CohortSummary, CohortRetention
 
-from OrderFood.notifications import push_customer_noti_on_completed
 
 admin_bp = Blueprint("admin", __name__, url_prefix="/admin")
 
@@ -77,15 +85,15 @@ def reject_restaurant(restaurant_id: int):
     if session.get("user_id"):
         res.by_admin_id = session["user_id"]
 
-    db.session.commit()
-
-    # GỬI MAIL CHO OWNER
+    # GỬI MAIL CHO OWNER (xếp vào outbox, commit cùng trạng thái, worker gửi nền)
     try:
         owner_email = getattr(getattr(res.owner, "user", None), "email", None)
         if owner_email:
             send_restaurant_status_email(owner_email, res.name, "REJECT", reason=reason)
     except Exception:
-        current_app.logger.warning("Không gửi được email thông báo REJECT", exc_info=True)
+        current_app.logger.warning("Không xếp được email thông báo REJECT", exc_info=True)
+
+    db.session.flush()
 
     return jsonify({"ok": True, "id": restaurant_id, "status": res.status.value})
 
@@ -106,39 +114,147 @@ def approve_restaurant(restaurant_id: int):
     if session.get("user_id"):
         res.by_admin_id = session["user_id"]
 
-    db.session.commit()
-
-    # GỬI MAIL CHO OWNER
+    # GỬI MAIL CHO OWNER (xếp vào outbox, commit cùng trạng thái, worker gửi nền)
     try:
         owner_email = getattr(getattr(res.owner, "user", None), "email", None)
         if owner_email:
             send_restaurant_status_email(owner_email, res.name, "APPROVED")
     except Exception:
-        current_app.logger.warning("Không gửi được email thông báo APPROVE", exc_info=True)
+        current_app.logger.warning("Không xếp được email thông báo APPROVE", exc_info=True)
+
+    db.session.flush()
 
     return jsonify({"ok": True, "id": restaurant_id, "status": res.status.value})
 
+BULK_MODERATION_LIMIT = 500
+
+
+@admin_bp.route("/restaurants/bulk", methods=["PATCH"])
+def bulk_moderate_restaurants():
+    """
+    Duyệt / từ chối nhiều nhà hàng PENDING một lần.
+    Body JSON: {"ids": [1, 2, 3], "action": "approve" | "reject", "reason": "..."}
+    -> 1 câu UPDATE cho cả lô, email xếp vào outbox 1 lần, trả kết quả theo từng id.
+    """
+    if not is_admin(session.get("role")):
+        return jsonify({"error": "forbidden"}), 403
+
+    payload = request.get_json(silent=True) or {}
+    action = (payload.get("action") or "").strip().lower()
+    if action not in ("approve", "reject"):
+        return jsonify({"error": "invalid_action"}), 400
+    reason = (payload.get("reason") or "").strip() or None
+
+    ids = []
+    for raw in payload.get("ids") or []:
+        try:
+            rid = int(raw)
+        except (TypeError, ValueError):
+            continue
+        if rid not in ids:
+            ids.append(rid)
+    if not ids:
+        return jsonify({"error": "empty_ids"}), 400
+    if len(ids) > BULK_MODERATION_LIMIT:
+        return jsonify({"error": "too_many_ids", "limit": BULK_MODERATION_LIMIT}), 400
+
+    target = StatusRes.APPROVED if action == "approve" else StatusRes.REJECTED
+    mail_status = "APPROVED" if action == "approve" else "REJECT"
+    admin_id = session.get("user_id")
+
+    try:
+        # khoá các dòng trong lô để trạng thái đọc được khớp với lúc UPDATE
+        rows = (db.session.query(Restaurant.restaurant_id, Restaurant.name, Restaurant.status, User.email)
+                .outerjoin(RestaurantOwner, RestaurantOwner.user_id == Restaurant.res_owner_id)
+                .outerjoin(User, User.user_id == RestaurantOwner.user_id)
+                .filter(Restaurant.restaurant_id.in_(ids))
+                .with_for_update()
+                .all())
+        found = {r.restaurant_id: r for r in rows}
+        eligible = [rid for rid in ids if rid in found and found[rid].status == StatusRes.PENDING]
+
+        if eligible:
+            values = {"status": target}
+            if admin_id:
+                values["by_admin_id"] = admin_id
+            (db.session.query(Restaurant)
+             .filter(Restaurant.restaurant_id.in_(eligible), Restaurant.status == StatusRes.PENDING)
+             .update(values, synchronize_session=False))
+
+            queue_restaurant_status_emails(
+                ((found[rid].email, found[rid].name) for rid in eligible if found[rid].email),
+                mail_status, reason=reason,
+            )
+        db.session.flush()
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 500
+
+    results = []
+    for rid in ids:
+        if rid not in found:
+            results.append({"id": rid, "ok": False, "error": "not_found"})
+        elif rid in eligible:
+            results.append({"id": rid, "ok": True, "status": target.value})
+        else:
+            results.append({"id": rid, "ok": False, "error": "not_pending",
+                            "status": getattr(found[rid].status, "value", found[rid].status)})
+
+    return jsonify({"ok": True, "updated": len(eligible), "results": results})
+
+
 @admin_bp.route("/delivery", methods=["GET"])
 def admin_delivery():
     if not is_admin(session.get("role")):
         flash("Bạn không có quyền truy cập trang admin", "danger")
         return redirect(url_for("index"))
 
-    orders = (
-        Order.query
-        .options(
-            joinedload(Order.customer).joinedload(Customer.user),
-            joinedload(Order.restaurant)
-        )
-        .order_by(Order.created_date.desc())
-        .all()
+    date_from, date_to, statuses = order_dao.parse_order_filters(request.args)
+    status_param = (request.args.get("status") or "").strip().upper()
+    if status_param == "ALL":
+        statuses = []
+    elif not statuses:
+        # mặc định chỉ hiện đơn cần xử lý
+        statuses = list(order_dao.ACTIONABLE_STATUSES)
+    restaurant_id = request.args.get("restaurant_id", type=int)
+    cursor = request.args.get("cursor")
+    per_page = max(10, min(request.args.get("per_page", 50, type=int), 200))
+
+    orders, next_cursor = order_dao.list_delivery_orders(
+        statuses, restaurant_id=restaurant_id, date_from=date_from, date_to=date_to,
+        cursor=cursor, per_page=per_page,
     )
+    status_counts = order_dao.count_orders_by_status(restaurant_id, date_from, date_to)
+
+    # giữ lại filter khi chuyển trang / đổi tab
+    filters = {k: v for k, v in {
+        "restaurant_id": restaurant_id,
+        "from": request.args.get("from"),
+        "to": request.args.get("to"),
+        "per_page": request.args.get("per_page", type=int),
+    }.items() if v}
+
     waiting_time = current_app.config.get("WAITING_TIME", 10)
     return render_template("admin/admin_delivery.html",
                            orders=orders,
+                           next_cursor=next_cursor,
+                           is_first_page=not cursor,
+                           status_counts=status_counts,
+                           selected_statuses=[s.value for s in statuses],
+                           filters=filters,
                            current_waiting_time=waiting_time)
 
 
+@admin_bp.route("/orders/export.csv")
+def export_orders():
+    """Xuất CSV toàn bộ đơn hàng (filter: from, to, status, restaurant_id)."""
+    if not is_admin(session.get("role")):
+        return jsonify({"error": "forbidden"}), 403
+
+    restaurant_id = request.args.get("restaurant_id", type=int)
+    return export_orders_csv(request.args, restaurant_id=restaurant_id)
+
+
 @admin_bp.route("/delivery/set_waiting_time", methods=["POST"])
 def set_waiting_time():
     """Cập nhật waiting_time dùng khi tạo Order mới (VD: checkout VNPay)"""
@@ -160,23 +276,39 @@ def mark_completed(order_id):
     if not is_admin(session.get("role")):
         return jsonify({"error": "forbidden"}), 403
 
-    order = Order.query.get_or_404(order_id)
+    admin_id = session.get("user_id")  # id admin đăng nhập
+    if not admin_id:
+        flash("Không xác định được admin đang đăng nhập!", "danger")
+        return redirect(url_for("admin.admin_delivery"))
+
+    # ACCEPTED -> COMPLETED; event: noti cho CUSTOMER + bảng món hot (sau commit)
+    if not order_machine.apply(COMPLETE, order_id, values={"delivery_id": admin_id}) \
+            and not db.session.get(Order, order_id):
+        abort(404)
+
+    return redirect(url_for("admin.admin_delivery"))
 
-    # so sánh Enum trực tiếp cho chắc
-    if order.status == StatusOrder.ACCEPTED:
-        admin_id = session.get("user_id")  # id admin đăng nhập
-        if not admin_id:
-            flash("Không xác định được admin đang đăng nhập!", "danger")
-            return redirect(url_for("admin.admin_delivery"))
+@admin_bp.route("/delivery/bulk_complete", methods=["POST"])
+@retry_on_deadlock("bulk_complete_orders")
+def bulk_mark_completed():
+    """
+    Giao xong nhiều đơn ACCEPTED một lần (delivery_id = admin đang đăng nhập).
+    Body JSON: {"order_ids": [1, 2, 3]} -> kết quả theo từng id.
+    """
+    if not is_admin(session.get("role")):
+        return jsonify({"error": "forbidden"}), 403
+    admin_id = session.get("user_id")
+    if not admin_id:
+        return jsonify({"error": "forbidden"}), 403
 
-        order.delivery_id = admin_id
-        order.status = StatusOrder.COMPLETED
-        db.session.commit()
+    try:
+        ids = parse_order_ids((request.get_json(silent=True) or {}).get("order_ids"))
+    except BulkInputError as e:
+        return jsonify({"error": e.code, "limit": BULK_ORDER_LIMIT}), 400
 
-        # tạo noti cho CUSTOMER (owner_id = None)
-        push_customer_noti_on_completed(order)
+    updated, results = complete_orders(admin_id, ids)
+    return jsonify({"ok": True, "updated": updated, "results": results})
 
-    return redirect(url_for("admin.admin_delivery"))
 
 @admin_bp.route("/cancel/<int:order_id>", methods=["POST"])
 def cancel_order(order_id: int):
@@ -189,31 +321,11 @@ def cancel_order(order_id: int):
     if not role or str(getattr(role, "value", role)).lower() != "admin":
         return jsonify({"error": "forbidden"}), 403
 
-    order = Order.query.get_or_404(order_id)
-
-    if order.status in (StatusOrder.PENDING, StatusOrder.ACCEPTED, StatusOrder.PAID):
-        order.status = StatusOrder.CANCELED
-        order.canceled_by = Role.CUSTOMER  # ✅
-
-        # ===== Lấy res_owner_id từ bảng restaurant qua join =====
-        res_owner_id = (
-            db.session.query(Restaurant.res_owner_id)
-            .filter(Restaurant.restaurant_id == order.restaurant_id)
-            .scalar()
-        )
-
-        # ===== Tạo noti cho RESTAURANT_OWNER =====
-        if res_owner_id:
-            noti = Notification(
-                order_id=order.order_id,
-                message=f"Đơn hàng #{order.order_id} của bạn bị hủy bởi phía khách hàng.",
-                owner_id=res_owner_id,   # ✅ gửi cho chủ nhà hàng
-                customer_id=None
-            )
-            db.session.add(noti)
-
-        db.session.commit()
-        flash(f"Đã hủy đơn hàng #{order.order_id}.", "success")
+    # PENDING/PAID/ACCEPTED -> CANCELED + xếp hàng hoàn tiền (cùng transaction); event: noti cho owner
+    if order_machine.apply(ADMIN_CANCEL, order_id):
+        flash(f"Đã hủy đơn hàng #{order_id}.", "success")
+    elif not db.session.get(Order, order_id):
+        abort(404)
     else:
         flash("Chỉ có thể hủy đơn ở trạng thái PENDING/ACCEPTED/PAID.", "warning")
 
@@ -316,57 +428,169 @@ def stats_transactions():
     })
 
 
+@admin_bp.route("/api/stats/cohorts")
+def stats_cohorts():
+    """Đọc bảng tổng hợp do cohort_job ghi (không tính toán trong request)."""
+    if not is_admin(session.get("role")):
+        return jsonify({"error": "forbidden"}), 403
+
+    months = max(1, min(request.args.get("months", 12, type=int), 36))
+    summaries = (CohortSummary.query
+                 .order_by(CohortSummary.cohort.desc())
+                 .limit(months)
+                 .all())[::-1]
+    cohorts = [s.cohort for s in summaries]
+
+    retention = {c: [] for c in cohorts}
+    if cohorts:
+        rows = (db.session.query(CohortRetention.cohort, CohortRetention.period, CohortRetention.active_customers)
+                .filter(CohortRetention.cohort.in_(cohorts))
+                .order_by(CohortRetention.cohort, CohortRetention.period)
+                .all())
+        for cohort, period, active in rows:
+            retention[cohort].append({"period": period, "active": active})
+
+    def _rate(n, d):
+        return round(n * 100.0 / d, 1) if d else 0.0
+
+    return jsonify({
+        "labels": cohorts,
+        "sizes": [s.size for s in summaries],
+        "repeat_rate": [_rate(s.repeat_customers, s.ordered_customers) for s in summaries],
+        "churn_rate": [_rate(s.churned_customers, s.ordered_customers) for s in summaries],
+        "retention": retention,
+        "computed_at": summaries[-1].computed_at.strftime("%H:%M %d/%m/%Y")
+        if summaries and summaries[-1].computed_at else None,
+    })
+
+
+@admin_bp.route("/api/stats/cohorts/refresh", methods=["POST"])
+def refresh_cohorts():
+    """Đưa cohort_job vào scheduler chạy ngay (nền), request trả về luôn."""
+    if not is_admin(session.get("role")):
+        return jsonify({"error": "forbidden"}), 403
+
+    job = current_app.extensions.get("cohort_job")
+    if not job:
+        return jsonify({"error": "scheduler_not_running"}), 503
+
+    from OrderFood import scheduler
+    scheduler.add_job(job, id="compute_cohorts_now", replace_existing=True)
+    return jsonify({"ok": True}), 202
+
+
+@admin_bp.route("/api/payouts/run", methods=["POST"])
+def run_payouts():
+    """Tính payout_statement cho kỳ ?period=YYYY-MM (mặc định tháng trước) ở nền, trả job_id."""
+    if not is_admin(session.get("role")):
+        return jsonify({"error": "forbidden"}), 403
+    try:
+        start, end = parse_period(request.args.get("period"))
+    except ValueError:
+        return jsonify({"error": "invalid_period"}), 400
+
+    job_id = submit_job(run_payout_job, start, end, name="payout")
+    return jsonify({"ok": True, "job_id": job_id,
+                    "period_start": start.isoformat(), "period_end": end.isoformat()}), 202
+
+
+@admin_bp.route("/payouts/<period>.csv")
+def download_payouts(period: str):
+    """Tải file payout đã xuất của kỳ YYYY-MM."""
+    if not is_admin(session.get("role")):
+        return jsonify({"error": "forbidden"}), 403
+    try:
+        start, end = parse_period(period)
+    except ValueError:
+        return jsonify({"error": "invalid_period"}), 400
+
+    path = export_path(current_app, start, end)
+    if not path:
+        return jsonify({"error": "not_found"}), 404
+    return send_file(path, mimetype="text/csv", as_attachment=True,
+                     download_name=f"payout_{period}.csv")
+
+
+@admin_bp.route("/api/mail/metrics")
+def mail_outbox_metrics():
+    """Số liệu outbox email: đã gửi / thử lại / lỗi + độ sâu hàng đợi."""
+    if not is_admin(session.get("role")):
+        return jsonify({"error": "forbidden"}), 403
+    return jsonify(mail_metrics())
+
+
+@admin_bp.route("/api/refunds/metrics")
+def refund_queue_metrics():
+    """Số liệu hàng đợi hoàn tiền: hoàn thành / thử lại / lỗi + độ sâu hàng đợi."""
+    if not is_admin(session.get("role")):
+        return jsonify({"error": "forbidden"}), 403
+    return jsonify(refund_metrics())
+
+
+@admin_bp.route("/api/events/metrics")
+def order_event_metrics():
+    """Số liệu dispatcher order_event: số event đã xử lý / lỗi + độ trễ (lag) từng consumer."""
+    if not is_admin(session.get("role")):
+        return jsonify({"error": "forbidden"}), 403
+    return jsonify(event_metrics())
+
+
+@admin_bp.route("/api/db/retry-metrics")
+def db_retry_metrics():
+    """Số lần chạy lại transaction do deadlock / lock wait theo từng thao tác."""
+    if not is_admin(session.get("role")):
+        return jsonify({"error": "forbidden"}), 403
+    return jsonify(retry_metrics())
+
+
 @admin_bp.route("/manage_user")
 def manage_user():
-    users = get_all_user()  # trả về tất cả user (trừ admin)
+    if not is_admin(session.get("role")):
+        flash("Bạn không có quyền truy cập trang admin", "danger")
+        return redirect(url_for("index"))
+
+    role_param = (request.args.get("role") or Role.CUSTOMER.value).strip().upper()
+    role = Role.RESTAURANT_OWNER if role_param == Role.RESTAURANT_OWNER.value else Role.CUSTOMER
+    keyword = (request.args.get("q") or "").strip()
+    cursor = request.args.get("cursor", type=int)
+    per_page = max(10, min(request.args.get("per_page", 50, type=int), 200))
 
-    customers = [u for u in users if u.role == Role.CUSTOMER]
-    owners = [u for u in users if u.role == Role.RESTAURANT_OWNER]
+    users, next_cursor = search_users(role=role, keyword=keyword, cursor=cursor, per_page=per_page)
+    role_counts = count_users_by_role()
 
     return render_template(
         "admin/manage_user.html",
-        customers=customers,
-        owners=owners
+        users=users,
+        role=role.value,
+        keyword=keyword,
+        next_cursor=next_cursor,
+        is_first_page=not cursor,
+        role_counts=role_counts,
     )
 
 
-@admin_bp.route("/<int:user_id>/delete_customer", methods=["DELETE"])
-def delete_customer(user_id: int):
-    try:
-        customer = Customer.query.get(user_id)
-        if not customer:
-            return jsonify({"error": "not_found"}), 404
-
-        # Xóa  Payment liên quan đến cus
-        for order in customer.orders:
-            if order.payment:
-                db.session.delete(order.payment)
+def _wants_async() -> bool:
+    return (request.args.get("async") or "").lower() in ("1", "true", "yes")
 
-        # Xóa orderating của cus
-        for rating in customer.ratings:
-            db.session.delete(rating)
 
-        #  Xóa Notification
-        notifications = Notification.query.filter_by(customer_id=user_id).all()
-        for noti in notifications:
-            db.session.delete(noti)
-
-        # Xóa Order
-        for order in customer.orders:
-            db.session.delete(order)
+@admin_bp.route("/<int:user_id>/delete_customer", methods=["DELETE"])
+def delete_customer(user_id: int):
+    if not is_admin(session.get("role")):
+        return jsonify({"error": "forbidden"}), 403
 
-        #  Xóa CartItem + Cart
-        for cart in customer.carts:
-            for item in cart.items:
-                db.session.delete(item)
-            db.session.delete(cart)
+    if not Customer.query.get(user_id):
+        return jsonify({"error": "not_found"}), 404
 
-        #  Xóa Customer và User
-        db.session.delete(customer)
-        db.session.delete(customer.user)
+    # ?async=1 -> chạy nền, trả job_id để theo dõi tiến độ
+    if _wants_async():
+        job_id = submit_job(delete_customer_bulk, user_id, name="delete_customer")
+        return jsonify({"ok": True, "id": user_id, "job_id": job_id}), 202
 
-        db.session.commit()
-        return jsonify({"message": "deleted successfully"}), 200
+    try:
+        deleted = delete_customer_bulk(user_id)
+        if deleted is None:
+            return jsonify({"error": "not_found"}), 404
+        return jsonify({"message": "deleted successfully", "deleted": deleted}), 200
 
     except Exception as e:
         db.session.rollback()
@@ -377,18 +601,32 @@ def delete_owner(user_id: int):
     if not is_admin(session.get("role")):
         return jsonify({"error": "forbidden"}), 403
 
-    user = User.query.get(user_id)
-    if not user or user.role.name != "RESTAURANT_OWNER":
+    # user bị xoá (không phải người đang đăng nhập) -> chỉ cần cột role
+    role = db.session.query(User.role).filter(User.user_id == user_id).scalar()
+    if role != Role.RESTAURANT_OWNER:
         return jsonify({"error": "not_found"}), 404
 
+    if _wants_async():
+        job_id = submit_job(delete_owner_bulk, user_id, name="delete_owner")
+        return jsonify({"ok": True, "id": user_id, "job_id": job_id}), 202
+
     try:
-        if user.restaurant_owner:
-            if user.restaurant_owner.restaurant:
-                db.session.delete(user.restaurant_owner.restaurant)
-            db.session.delete(user.restaurant_owner)
-        db.session.delete(user)
-        db.session.commit()
-        return jsonify({"ok": True, "id": user_id})
+        deleted = delete_owner_bulk(user_id)
+        if deleted is None:
+            return jsonify({"error": "not_found"}), 404
+        return jsonify({"ok": True, "id": user_id, "deleted": deleted})
     except SQLAlchemyError as e:
         db.session.rollback()
         return jsonify({"error": str(e)}), 500
+
+
+@admin_bp.route("/jobs/<job_id>")
+def job_status(job_id: str):
+    """Theo dõi tiến độ job chạy nền (xoá user, ...)."""
+    if not is_admin(session.get("role")):
+        return jsonify({"error": "forbidden"}), 403
+
+    job = get_job(job_id)
+    if not job:
+        return jsonify({"error": "not_found"}), 404
+    return jsonify(job)
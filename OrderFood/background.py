@@ -0,0 +1,75 @@
+# OrderFood/background.py
+"""
+Chạy tác vụ nặng ở nền (ngoài request) + theo dõi tiến độ.
+
+- submit(fn, ...) đưa fn vào APScheduler (nếu đang chạy) hoặc thread riêng,
+  luôn có app context, trả về job_id ngay.
+- fn nhận thêm kwarg `progress` (callable) để báo tiến độ: progress(done=..., total=...)
+- get_job(job_id) đọc trạng thái (QUEUED / RUNNING / DONE / FAILED).
+
+Registry nằm trong RAM của process, chỉ giữ MAX_JOBS job gần nhất.
+"""
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from uuid import uuid4
+from zoneinfo import ZoneInfo
+
+from flask import current_app
+
+_TZ = ZoneInfo("Asia/Ho_Chi_Minh")
+MAX_JOBS = 200
+
+_jobs: "OrderedDict[str, dict]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def _now_str():
+    return datetime.now(_TZ).strftime("%H:%M:%S %d/%m/%Y")
+
+
+def _update(job_id: str, **fields) -> None:
+    with _lock:
+        job = _jobs.get(job_id)
+        if job is not None:
+            job.update(fields)
+
+
+def get_job(job_id: str) -> dict | None:
+    with _lock:
+        job = _jobs.get(job_id)
+        return dict(job) if job else None
+
+
+def submit(fn, *args, name: str = "job", **kwargs) -> str:
+    """Đưa fn(*args, progress=..., **kwargs) chạy nền, trả về job_id."""
+    from OrderFood import db, scheduler
+
+    app = current_app._get_current_object()
+    job_id = uuid4().hex[:12]
+    with _lock:
+        _jobs[job_id] = {"id": job_id, "name": name, "status": "QUEUED", "created_at": _now_str()}
+        while len(_jobs) > MAX_JOBS:
+            _jobs.popitem(last=False)
+
+    def _progress(**fields):
+        _update(job_id, **fields)
+
+    def _run():
+        with app.app_context():
+            _update(job_id, status="RUNNING", started_at=_now_str())
+            try:
+                result = fn(*args, progress=_progress, **kwargs)
+                _update(job_id, status="DONE", result=result, finished_at=_now_str())
+            except Exception as ex:
+                db.session.rollback()
+                app.logger.exception("background job %s (%s) failed", job_id, name)
+                _update(job_id, status="FAILED", error=str(ex), finished_at=_now_str())
+            finally:
+                db.session.remove()
+
+    if scheduler.running:
+        scheduler.add_job(_run, id=f"{name}-{job_id}")
+    else:
+        threading.Thread(target=_run, name=f"{name}-{job_id}", daemon=True).start()
+    return job_id
@@ -0,0 +1,143 @@
+# OrderFood/bulk_delete.py
+"""
+Xoá customer / owner theo kiểu set-based thay vì duyệt từng object ORM.
+
+- Mỗi bảng con bị xoá bằng DELETE ... WHERE fk IN (subquery / lô id),
+  theo đúng thứ tự phụ thuộc FK (con trước, cha sau).
+- Đơn hàng được xử lý theo lô CHUNK_SIZE; mỗi lô commit riêng để không giữ lock lâu.
+  Nếu job dừng giữa chừng, chạy lại sẽ xoá tiếp phần còn lại.
+- `progress` (tuỳ chọn) được gọi sau mỗi lô: progress(done=..., total=..., step=...).
+"""
+from sqlalchemy import select, delete, func, or_
+
+from OrderFood import db
+from OrderFood.models import (
+    User, Customer, RestaurantOwner, Restaurant, Dish, Category,
+    Cart, CartItem, Order, OrderLine, Payment, Refund, Notification, OrderRating, PayoutStatement,
+)
+
+CHUNK_SIZE = 500
+
+
+def _noop(**_):
+    pass
+
+
+def _exec_delete(stmt) -> int:
+    res = db.session.execute(stmt.execution_options(synchronize_session=False))
+    return int(res.rowcount or 0)
+
+
+def _delete_order_children(order_ids) -> dict:
+    """Xoá các bảng phụ thuộc order (chưa commit)."""
+    payment_ids = select(Payment.payment_id).where(Payment.order_id.in_(order_ids))
+    return {
+        "refund": _exec_delete(delete(Refund).where(Refund.payment_id.in_(payment_ids))),
+        "payment": _exec_delete(delete(Payment).where(Payment.order_id.in_(order_ids))),
+        "notification": _exec_delete(delete(Notification).where(Notification.order_id.in_(order_ids))),
+        "order_rating": _exec_delete(delete(OrderRating).where(OrderRating.order_id.in_(order_ids))),
+        "order_line": _exec_delete(delete(OrderLine).where(OrderLine.order_id.in_(order_ids))),
+    }
+
+
+def _add_counts(acc: dict, counts: dict) -> None:
+    for k, v in counts.items():
+        acc[k] = acc.get(k, 0) + v
+
+
+def _delete_orders(where, chunk_size: int, progress, acc: dict) -> None:
+    total = db.session.scalar(select(func.count(Order.order_id)).where(where)) or 0
+    done = 0
+    progress(step="order", done=done, total=total)
+    while True:
+        ids = db.session.scalars(
+            select(Order.order_id).where(where).order_by(Order.order_id).limit(chunk_size)
+        ).all()
+        if not ids:
+            break
+        counts = _delete_order_children(ids)
+        counts["order"] = _exec_delete(delete(Order).where(Order.order_id.in_(ids)))
+        db.session.commit()
+        _add_counts(acc, counts)
+        done += len(ids)
+        progress(step="order", done=done, total=total)
+
+
+def _delete_by_pk_chunks(model, pk_col, where, chunk_size: int, acc: dict, label: str) -> None:
+    """DELETE theo lô khoá chính cho các bảng có thể rất lớn (cart_item, notification...)."""
+    while True:
+        ids = db.session.scalars(select(pk_col).where(where).limit(chunk_size)).all()
+        if not ids:
+            break
+        n = _exec_delete(delete(model).where(pk_col.in_(ids)))
+        db.session.commit()
+        _add_counts(acc, {label: n})
+
+
+def delete_customer_bulk(user_id: int, chunk_size: int = CHUNK_SIZE, progress=None) -> dict | None:
+    """Trả về số dòng đã xoá theo bảng, hoặc None nếu không tìm thấy customer."""
+    progress = progress or _noop
+    if not db.session.get(Customer, user_id):
+        return None
+
+    acc: dict = {}
+    _delete_orders(Order.customer_id == user_id, chunk_size, progress, acc)
+
+    progress(step="customer_data")
+    _delete_by_pk_chunks(Notification, Notification.noti_id,
+                         Notification.customer_id == user_id, chunk_size, acc, "notification")
+    _delete_by_pk_chunks(OrderRating, OrderRating.orating_id,
+                         OrderRating.customer_id == user_id, chunk_size, acc, "order_rating")
+    cart_ids = select(Cart.cart_id).where(Cart.cus_id == user_id)
+    _delete_by_pk_chunks(CartItem, CartItem.cart_item_id,
+                         CartItem.cart_id.in_(cart_ids), chunk_size, acc, "cart_item")
+
+    _add_counts(acc, {
+        "cart": _exec_delete(delete(Cart).where(Cart.cus_id == user_id)),
+        "customer": _exec_delete(delete(Customer).where(Customer.user_id == user_id)),
+        "user": _exec_delete(delete(User).where(User.user_id == user_id)),
+    })
+    db.session.commit()
+    db.session.expunge_all()
+    progress(step="done")
+    return acc
+
+
+def delete_owner_bulk(user_id: int, chunk_size: int = CHUNK_SIZE, progress=None) -> dict | None:
+    """Xoá owner + nhà hàng + menu + giỏ hàng + đơn hàng của nhà hàng đó."""
+    progress = progress or _noop
+    user = db.session.get(User, user_id)
+    if not user or getattr(user.role, "name", user.role) != "RESTAURANT_OWNER":
+        return None
+
+    acc: dict = {}
+    res_id = db.session.scalar(select(Restaurant.restaurant_id).where(Restaurant.res_owner_id == user_id))
+
+    if res_id is not None:
+        _delete_orders(Order.restaurant_id == res_id, chunk_size, progress, acc)
+
+        progress(step="restaurant_data")
+        cart_ids = select(Cart.cart_id).where(Cart.res_id == res_id)
+        dish_ids = select(Dish.dish_id).where(Dish.res_id == res_id)
+        _delete_by_pk_chunks(CartItem, CartItem.cart_item_id,
+                             or_(CartItem.cart_id.in_(cart_ids), CartItem.dish_id.in_(dish_ids)),
+                             chunk_size, acc, "cart_item")
+        _add_counts(acc, {
+            "cart": _exec_delete(delete(Cart).where(Cart.res_id == res_id)),
+            "dish": _exec_delete(delete(Dish).where(Dish.res_id == res_id)),
+            "category": _exec_delete(delete(Category).where(Category.res_id == res_id)),
+            "payout_statement": _exec_delete(delete(PayoutStatement).where(PayoutStatement.restaurant_id == res_id)),
+            "restaurant": _exec_delete(delete(Restaurant).where(Restaurant.restaurant_id == res_id)),
+        })
+        db.session.commit()
+
+    _delete_by_pk_chunks(Notification, Notification.noti_id,
+                         Notification.owner_id == user_id, chunk_size, acc, "notification")
+    _add_counts(acc, {
+        "restaurant_owner": _exec_delete(delete(RestaurantOwner).where(RestaurantOwner.user_id == user_id)),
+        "user": _exec_delete(delete(User).where(User.user_id == user_id)),
+    })
+    db.session.commit()
+    db.session.expunge_all()
+    progress(step="done")
+    return acc
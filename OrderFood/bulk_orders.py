@@ -0,0 +1,74 @@
+# OrderFood/bulk_orders.py
+"""
+Thao tác hàng loạt trên đơn hàng (owner duyệt / huỷ, admin giao hàng xong).
+
+- Chuyển trạng thái qua order_machine.apply_many: khoá lô (SELECT ... FOR UPDATE, chỉ lấy cột)
+  rồi 1 câu UPDATE có điều kiện status IN (trạng thái hợp lệ) cho cả lô.
+- Mỗi lô ghi order_event bằng 1 câu INSERT ... SELECT; thông báo do dispatcher nền xử lý,
+  refund của lô huỷ được tạo ngay trong transaction (order_state_machine).
+- Không commit: route bọc bởi retry_on_deadlock commit 1 lần.
+- Kết quả trả về theo từng id: {"id", "ok", "status"} hoặc {"id", "ok": False, "error", "status"?}.
+"""
+from OrderFood.models import StatusOrder
+from OrderFood.order_state_machine import order_machine, ACCEPT, OWNER_CANCEL, COMPLETE
+
+BULK_ORDER_LIMIT = 200
+
+
+class BulkInputError(ValueError):
+    """Danh sách id không hợp lệ (rỗng / quá giới hạn)."""
+
+    def __init__(self, code: str):
+        super().__init__(code)
+        self.code = code
+
+
+def parse_order_ids(raw) -> list[int]:
+    """Lọc id hợp lệ, bỏ trùng, giữ thứ tự. Rỗng / quá BULK_ORDER_LIMIT -> BulkInputError."""
+    ids = []
+    for v in raw or []:
+        try:
+            oid = int(v)
+        except (TypeError, ValueError):
+            continue
+        if oid not in ids:
+            ids.append(oid)
+    if not ids:
+        raise BulkInputError("empty_ids")
+    if len(ids) > BULK_ORDER_LIMIT:
+        raise BulkInputError("too_many_ids")
+    return ids
+
+
+def _results(ids, found, moved, target: StatusOrder) -> list[dict]:
+    done = set(moved)
+    out = []
+    for oid in ids:
+        if oid not in found:
+            out.append({"id": oid, "ok": False, "error": "not_found"})
+        elif oid in done:
+            out.append({"id": oid, "ok": True, "status": target.value})
+        else:
+            out.append({"id": oid, "ok": False, "error": "invalid_status",
+                        "status": getattr(found[oid].status, "value", found[oid].status)})
+    return out
+
+
+# ========= Owner =========
+def approve_orders(restaurant_id: int, ids: list[int]):
+    """PAID -> ACCEPTED cho các đơn của nhà hàng. Trả về (số đơn cập nhật, kết quả từng đơn)."""
+    found, moved = order_machine.apply_many(ACCEPT, ids, restaurant_id=restaurant_id)
+    return len(moved), _results(ids, found, moved, StatusOrder.ACCEPTED)
+
+
+def cancel_orders_by_owner(restaurant_id: int, ids: list[int], reason: str | None = None):
+    """PAID/ACCEPTED -> CANCELED (canceled_by = owner); xếp hàng hoàn tiền trong transaction; event: noti cho khách."""
+    found, moved = order_machine.apply_many(OWNER_CANCEL, ids, restaurant_id=restaurant_id, reason=reason)
+    return len(moved), _results(ids, found, moved, StatusOrder.CANCELED)
+
+
+# ========= Admin (giao hàng) =========
+def complete_orders(admin_id: int, ids: list[int]):
+    """ACCEPTED -> COMPLETED, gán delivery_id; event: noti + email cho khách, bảng món hot."""
+    found, moved = order_machine.apply_many(COMPLETE, ids, values={"delivery_id": admin_id})
+    return len(moved), _results(ids, found, moved, StatusOrder.COMPLETED)
@@ -1,10 +1,11 @@
 from flask import Blueprint, jsonify, request
 from sqlalchemy import func
-from datetime import datetime
+from datetime import datetime, timedelta
 from zoneinfo import ZoneInfo
 
 from OrderFood import db
-from OrderFood.models import Order, Dish, CartItem, Payment
+from OrderFood.models import Order, OrderLine, Payment
+from OrderFood.trending import tracker, WINDOWS
 
 bp_stats = Blueprint("stats", __name__)
 
@@ -45,39 +46,69 @@ def revenue_summary(restaurant_id):
 # =============================
 # API donut chart: số lượng món ăn
 # =============================
+def _dish_stats_range(mode: str, today):
+    """Khoảng [start, end) theo mode -> lọc range trên order_line.created_date (dùng được index)."""
+    def month_start(y, m):
+        return datetime(y + (m - 1) // 12, (m - 1) % 12 + 1, 1)
+
+    year, month = today.year, today.month
+    if mode == "day":
+        start = datetime(year, month, today.day)
+        return start, start + timedelta(days=1)
+    if mode == "month":
+        return month_start(year, month), month_start(year, month + 1)
+    if mode == "custom_month":
+        m = request.args.get("month", month, type=int) or month
+        return month_start(year, m), month_start(year, m + 1)
+    if mode == "quarter":
+        q = request.args.get("quarter", (month - 1) // 3 + 1, type=int) or 1
+        return month_start(year, 3 * (q - 1) + 1), month_start(year, 3 * q + 1)
+    return None, None
+
+
 @bp_stats.route("/api/owner/<int:restaurant_id>/stats/dishes")
 def dish_stats(restaurant_id):
     mode = request.args.get("mode", "day")
     today = datetime.now(ZoneInfo("Asia/Ho_Chi_Minh")).date()
-    month = today.month
-    year = today.year
 
+    # order_line: bản chụp tên/số lượng lúc đặt, quét theo (restaurant_id, created_date)
     query = db.session.query(
-        Dish.name,
-        func.sum(CartItem.quantity).label("qty")
-    ).join(CartItem, CartItem.dish_id == Dish.dish_id) \
-     .join(Order, Order.cart_id == CartItem.cart_id) \
-     .filter(Order.restaurant_id == restaurant_id,
-             Order.status == "COMPLETED") 
+        OrderLine.dish_name,
+        func.sum(OrderLine.quantity).label("qty")
+    ).join(Order, Order.order_id == OrderLine.order_id) \
+     .filter(OrderLine.restaurant_id == restaurant_id,
+             Order.status == "COMPLETED")
 
-    if mode == "day":
-        query = query.filter(func.date(Order.created_date) == today)
-    elif mode == "month":
-        query = query.filter(func.extract("month", Order.created_date) == month,
-                             func.extract("year", Order.created_date) == year)
-    elif mode == "custom_month":
-        selected_month = int(request.args.get("month", month))
-        query = query.filter(func.extract("month", Order.created_date) == selected_month,
-                             func.extract("year", Order.created_date) == year)
-    elif mode == "quarter":
-        selected_quarter = int(request.args.get("quarter", (month - 1) // 3 + 1))
-        query = query.filter(func.extract("year", Order.created_date) == year,
-                             func.extract("quarter", Order.created_date) == selected_quarter)
+    start, end = _dish_stats_range(mode, today)
+    if start:
+        query = query.filter(OrderLine.created_date >= start, OrderLine.created_date < end)
 
-    data = query.group_by(Dish.name).all()
+    data = query.group_by(OrderLine.dish_name).all()
 
     return jsonify([{"dish": d[0], "quantity": int(d[1])} for d in data])
 
+# =============================
+# API top món đang hot (đọc từ sketch trong RAM, không query DB)
+# =============================
+def _trending_args():
+    window = request.args.get("window", "today")
+    if window not in WINDOWS:
+        window = "today"
+    k = max(1, min(request.args.get("k", 10, type=int), 50))
+    return window, k
+
+
+@bp_stats.route("/api/trending/dishes")
+def trending_dishes():
+    window, k = _trending_args()
+    return jsonify({"window": window, "items": tracker.top(window, None, k)})
+
+
+@bp_stats.route("/api/owner/<int:restaurant_id>/stats/trending")
+def trending_dishes_owner(restaurant_id):
+    window, k = _trending_args()
+    return jsonify({"window": window, "items": tracker.top(window, restaurant_id, k)})
+
 # =============================
 # API line chart: doanh thu theo ngày/tháng
 # =============================
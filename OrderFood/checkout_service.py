@@ -0,0 +1,232 @@
+# OrderFood/checkout_service.py
+"""
+Checkout VNPay theo idempotency key.
+
+- Trang giỏ hàng sinh 1 key / lần hiển thị (đổi key khi giỏ thay đổi), gửi kèm ?key=...
+- Cùng (user, key) bấm lại -> trả ngay URL thanh toán đã tạo (cache RAM, không chạm DB).
+- Giỏ được tính tiền bằng 1 câu JOIN cart_item + dish (không lazy-load từng món).
+- Đơn lưu bản chụp giá vào order_line khi tạo; bấm lại không ghi đè. Chỉ thay khi đơn
+  còn PENDING và khách quay lại với giỏ đã đổi (key mới). Đơn đã PAID thì bất biến.
+- Cùng key nhưng giỏ đã khác -> KEY_CONFLICT (client phải tải lại giỏ để lấy key mới).
+- Đơn đã bị huỷ (quá hạn / owner / admin) -> CANCELED, không báo nhầm là đã thanh toán.
+"""
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import insert, select, exists, update
+from sqlalchemy.exc import IntegrityError
+
+from OrderFood import db
+from OrderFood.models import Cart, CartItem, Dish, Order, OrderLine, Payment, StatusCart, StatusOrder, StatusPayment
+from OrderFood.order_events import record_events
+from OrderFood.order_state_machine import CREATE
+
+KEY_RE = re.compile(r"^[A-Za-z0-9_-]{8,64}$")
+PAY_URL_TTL = 15 * 60          # giây (VNPay hết hạn thanh toán ~15 phút)
+PAY_URL_CACHE_SIZE = 2000
+
+# Kết quả chuẩn bị checkout
+READY = "READY"
+EMPTY_CART = "EMPTY_CART"
+INVALID_TOTAL = "INVALID_TOTAL"
+ALREADY_PAID = "ALREADY_PAID"
+KEY_CONFLICT = "KEY_CONFLICT"
+CANCELED = "CANCELED"
+
+
+def valid_key(key: str | None) -> bool:
+    return bool(key and KEY_RE.match(key))
+
+
+# ========= Cache URL thanh toán =========
+_pay_urls: "OrderedDict[tuple, tuple[str, float]]" = OrderedDict()   # (user_id, key) -> (url, hết hạn)
+_pay_urls_lock = threading.Lock()
+
+
+def cached_pay_url(user_id: int, key: str) -> str | None:
+    with _pay_urls_lock:
+        hit = _pay_urls.get((user_id, key))
+        if not hit:
+            return None
+        url, expires = hit
+        if expires < time.monotonic():
+            _pay_urls.pop((user_id, key), None)
+            return None
+        return url
+
+
+def remember_pay_url(user_id: int, key: str, url: str) -> None:
+    with _pay_urls_lock:
+        _pay_urls[(user_id, key)] = (url, time.monotonic() + PAY_URL_TTL)
+        _pay_urls.move_to_end((user_id, key))
+        while len(_pay_urls) > PAY_URL_CACHE_SIZE:
+            _pay_urls.popitem(last=False)
+
+
+# ========= Tính tiền giỏ =========
+def price_active_cart(user_id: int, restaurant_id: int):
+    """
+    1 câu JOIN cart + cart_item + dish.
+    Trả về (cart_id, lines) với lines = [{"dish_id", "name", "price", "quantity", "note"}, ...].
+    """
+    rows = (db.session.query(Cart.cart_id, CartItem.dish_id, CartItem.quantity, CartItem.note,
+                             Dish.name, Dish.price)
+            .join(CartItem, CartItem.cart_id == Cart.cart_id)
+            .join(Dish, Dish.dish_id == CartItem.dish_id)
+            .filter(Cart.cus_id == user_id,
+                    Cart.res_id == restaurant_id,
+                    Cart.status == StatusCart.ACTIVE)
+            .order_by(CartItem.cart_item_id)
+            .all())
+    if not rows:
+        return None, []
+    lines = [{
+        "dish_id": r.dish_id,
+        "name": r.name,
+        "price": float(r.price or 0),
+        "quantity": int(r.quantity or 0),
+        "note": r.note or "",
+    } for r in rows]
+    return rows[0].cart_id, lines
+
+
+def lines_total(lines) -> float:
+    return sum(l["price"] * l["quantity"] for l in lines)
+
+
+def _fingerprint(lines) -> list:
+    return sorted((l["dish_id"], l["quantity"]) for l in lines)
+
+
+def snapshot_lines(order: Order) -> list:
+    return [{"dish_id": l.dish_id, "quantity": l.quantity} for l in order.lines]
+
+
+def _write_lines(order: Order, lines, replace: bool = False) -> None:
+    """Ghi bản chụp order_line (replace=True: thay bản cũ khi đơn PENDING được định giá lại)."""
+    if replace:
+        db.session.query(OrderLine).filter(OrderLine.order_id == order.order_id) \
+            .delete(synchronize_session=False)
+        db.session.expire(order, ["lines"])
+    created = order.created_date.replace(tzinfo=None) if order.created_date else None
+    db.session.add_all([OrderLine(
+        order_id=order.order_id,
+        restaurant_id=order.restaurant_id,
+        dish_id=l["dish_id"],
+        dish_name=l["name"],
+        unit_price=l["price"],
+        quantity=l["quantity"],
+        note=l["note"] or None,
+        created_date=created,
+    ) for l in lines])
+
+
+def _closed_result(order: Order) -> str:
+    # Đơn không còn PENDING: huỷ rồi thì báo huỷ, còn lại là đã thanh toán
+    return CANCELED if order.status == StatusOrder.CANCELED else ALREADY_PAID
+
+
+# ========= Checkout =========
+def prepare_checkout(user_id: int, restaurant_id: int, key: str, waiting_time: int, new_txn_ref):
+    """
+    Trả về (kết quả, order, payment). Không commit (retry_on_deadlock của route commit).
+    new_txn_ref(order_id) sinh mã giao dịch VNPay mới.
+    """
+    # Cùng key đã có đơn -> dùng lại nguyên trạng
+    order = (Order.query.filter(Order.idempotency_key == key, Order.customer_id == user_id).first()
+             if key else None)
+    if order and order.status != StatusOrder.PENDING:
+        return _closed_result(order), order, order.payment
+
+    cart_id, lines = price_active_cart(user_id, restaurant_id)
+    if order:
+        if lines and _fingerprint(lines) != _fingerprint(snapshot_lines(order)):
+            return KEY_CONFLICT, order, order.payment
+        return READY, order, order.payment
+
+    if not lines:
+        return EMPTY_CART, None, None
+    total_price = lines_total(lines)
+    if total_price <= 0:
+        return INVALID_TOTAL, None, None
+
+    # Đơn PENDING cũ của giỏ này (key cũ): giỏ không đổi -> dùng lại, đổi -> thay bản chụp + txn_ref
+    order = (Order.query.filter(Order.cart_id == cart_id)
+             .with_for_update()
+             .first())
+    if order and order.status != StatusOrder.PENDING:
+        # giỏ vẫn ACTIVE dù đơn đã đóng (đơn huỷ trước khi ADMIN_CANCEL tự đóng giỏ): đóng giỏ ở đây
+        # để lần sau get_active_cart tạo giỏ mới thay vì báo huỷ mãi
+        db.session.execute(update(Cart)
+                           .where(Cart.cart_id == cart_id, Cart.status != StatusCart.CHECKOUT)
+                           .values(status=StatusCart.CHECKOUT)
+                           .execution_options(synchronize_session=False))
+        return _closed_result(order), order, order.payment
+
+    try:
+        if order:
+            order.idempotency_key = key
+            if _fingerprint(lines) == _fingerprint(snapshot_lines(order)) and order.payment:
+                db.session.flush()
+                return READY, order, order.payment
+            order.total_price = total_price
+            order.waiting_time = waiting_time
+            _write_lines(order, lines, replace=True)
+        else:
+            order = Order(
+                customer_id=user_id,
+                restaurant_id=restaurant_id,
+                cart_id=cart_id,
+                status=StatusOrder.PENDING,
+                total_price=total_price,
+                waiting_time=waiting_time,
+                idempotency_key=key,
+            )
+            db.session.add(order)
+            db.session.flush()   # lấy order_id + created_date
+            _write_lines(order, lines)
+            record_events(CREATE, StatusOrder.PENDING, [order.order_id])
+
+        payment = order.payment
+        amount_vnp = int(total_price) * 100  # VNPay cần VND x 100
+        if not payment:
+            payment = Payment(order_id=order.order_id, status=StatusPayment.PENDING,
+                              txn_ref=new_txn_ref(order.order_id), amount=amount_vnp)
+            db.session.add(payment)
+        else:
+            payment.status = StatusPayment.PENDING
+            payment.txn_ref = new_txn_ref(order.order_id)
+            payment.amount = amount_vnp
+        db.session.flush()
+    except IntegrityError:
+        # request song song cùng key đã tạo đơn trước -> dùng đơn đó
+        db.session.rollback()
+        order = Order.query.filter(Order.idempotency_key == key, Order.customer_id == user_id).first()
+        if not order:
+            raise
+        return READY, order, order.payment
+
+    return READY, order, payment
+
+
+# ========= Đơn cũ (trước khi có order_line) =========
+def backfill_order_lines() -> int:
+    """
+    Sinh order_line cho các đơn chưa có từ cart_item + dish hiện tại (1 câu INSERT ... SELECT).
+    Chạy lại nhiều lần không sao (bỏ qua đơn đã có dòng).
+    """
+    src = (select(Order.order_id, Order.restaurant_id, Dish.dish_id, Dish.name, Dish.price,
+                  CartItem.quantity, CartItem.note, Order.created_date)
+           .join(CartItem, CartItem.cart_id == Order.cart_id)
+           .join(Dish, Dish.dish_id == CartItem.dish_id)
+           .where(Order.created_date.isnot(None),
+                  ~exists().where(OrderLine.order_id == Order.order_id)))
+    stmt = insert(OrderLine).from_select(
+        ["order_id", "restaurant_id", "dish_id", "dish_name", "unit_price", "quantity", "note", "created_date"],
+        src,
+    )
+    n = db.session.execute(stmt).rowcount or 0
+    db.session.commit()
+    return n
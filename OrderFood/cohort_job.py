@@ -0,0 +1,136 @@
+# OrderFood/cohort_job.py
+"""
+Batch job (chạy đêm) tính cohort / retention cho admin:
+- cohort      : tháng đăng ký của customer (user.created_date)
+- retention   : số customer có đơn COMPLETED ở tháng thứ k sau khi đăng ký
+- repeat rate : customer có >= 2 đơn COMPLETED
+- churn       : customer từng đặt nhưng đơn cuối đã quá CHURN_DAYS ngày
+
+Dữ liệu được đọc theo lô CHUNK_SIZE customer (keyset theo user_id), mỗi lô chỉ lấy
+cột cần thiết; kết quả gộp vào bộ đếm theo cohort rồi ghi đè 2 bảng tổng hợp
+cohort_summary / cohort_retention trong 1 transaction. Request của admin chỉ đọc 2 bảng này.
+"""
+from collections import defaultdict
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+from OrderFood.models import User, Order, Role, StatusOrder, CohortSummary, CohortRetention
+
+CHUNK_SIZE = 2000
+CHURN_DAYS = 30
+MAX_PERIOD = 24  # chỉ giữ retention 24 tháng đầu
+
+_TZ = ZoneInfo("Asia/Ho_Chi_Minh")
+
+
+def _month_idx(dt: datetime) -> int:
+    return dt.year * 12 + dt.month - 1
+
+
+def _month_label(idx: int) -> str:
+    return f"{idx // 12:04d}-{idx % 12 + 1:02d}"
+
+
+def _iter_customer_chunks(db, chunk_size: int):
+    """Trả về từng lô [(user_id, created_date)] theo user_id tăng dần."""
+    last_id = 0
+    while True:
+        rows = (db.session.query(User.user_id, User.created_date)
+                .filter(User.role == Role.CUSTOMER, User.user_id > last_id)
+                .order_by(User.user_id.asc())
+                .limit(chunk_size)
+                .all())
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1][0]
+
+
+def _orders_for_range(db, lo: int, hi: int):
+    """Ngày tạo các đơn COMPLETED của customer trong [lo, hi], gom theo customer."""
+    rows = (db.session.query(Order.customer_id, Order.created_date)
+            .filter(Order.customer_id.between(lo, hi),
+                    Order.status == StatusOrder.COMPLETED)
+            .all())
+    by_customer = defaultdict(list)
+    for cid, created in rows:
+        if created:
+            by_customer[cid].append(created)
+    return by_customer
+
+
+def compute_cohorts(db, now: datetime | None = None, chunk_size: int = CHUNK_SIZE):
+    """
+    Tính toàn bộ số liệu, trả về (summary, retention):
+    - summary  : {cohort_idx: [size, ordered, repeat, churned]}
+    - retention: {(cohort_idx, period): [active_customers, orders]}
+    """
+    now = (now or datetime.now(_TZ)).replace(tzinfo=None)
+    churn_before = now - timedelta(days=CHURN_DAYS)
+
+    summary = defaultdict(lambda: [0, 0, 0, 0])
+    retention = defaultdict(lambda: [0, 0])
+
+    for chunk in _iter_customer_chunks(db, chunk_size):
+        orders = _orders_for_range(db, chunk[0][0], chunk[-1][0])
+        for uid, signup in chunk:
+            if not signup:
+                continue
+            cohort = _month_idx(signup)
+            s = summary[cohort]
+            s[0] += 1
+
+            dates = orders.get(uid)
+            if not dates:
+                continue
+            s[1] += 1
+            if len(dates) >= 2:
+                s[2] += 1
+            if max(dates) < churn_before:
+                s[3] += 1
+
+            per_period = defaultdict(int)
+            for d in dates:
+                period = _month_idx(d) - cohort
+                if 0 <= period <= MAX_PERIOD:
+                    per_period[period] += 1
+            for period, n in per_period.items():
+                r = retention[(cohort, period)]
+                r[0] += 1
+                r[1] += n
+
+    return summary, retention
+
+
+def run_cohort_job():
+    """Entry point cho scheduler (cần app context)."""
+    from OrderFood import db
+
+    started = datetime.now(_TZ)
+    summary, retention = compute_cohorts(db, now=started)
+
+    computed_at = started.replace(tzinfo=None)
+    summary_rows = [
+        {"cohort": _month_label(c), "size": v[0], "ordered_customers": v[1],
+         "repeat_customers": v[2], "churned_customers": v[3], "computed_at": computed_at}
+        for c, v in sorted(summary.items())
+    ]
+    retention_rows = [
+        {"cohort": _month_label(c), "period": p, "active_customers": v[0], "orders": v[1]}
+        for (c, p), v in sorted(retention.items())
+    ]
+
+    try:
+        db.session.query(CohortRetention).delete()
+        db.session.query(CohortSummary).delete()
+        if summary_rows:
+            db.session.execute(CohortSummary.__table__.insert(), summary_rows)
+        if retention_rows:
+            db.session.execute(CohortRetention.__table__.insert(), retention_rows)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    print(f"[COHORT] {len(summary_rows)} cohort, {len(retention_rows)} dòng retention "
+          f"({(datetime.now(_TZ) - started).total_seconds():.1f}s)")
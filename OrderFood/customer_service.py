@@ -1,5 +1,6 @@
 # OrderFood/customer.py
 import re
+from uuid import uuid4
 
 from flask import Blueprint, render_template, request, session, abort, jsonify, redirect, url_for, flash
 from werkzeug.security import check_password_hash, generate_password_hash
@@ -8,9 +9,11 @@ from OrderFood import db
 from OrderFood.dao import customer_dao as dao_cus
 from OrderFood.models import (
     Restaurant, Dish, Category,
-    Cart, CartItem, Customer,
+    Cart, CartItem,
     Order, StatusOrder, StatusCart, Notification, OrderRating, User
 )
+from OrderFood.principal import current_principal
+from OrderFood.status_notifier import status_notifier, STATUS_LONG_POLL_SECONDS
 
 customer_bp = Blueprint("customer", __name__)
 
@@ -95,16 +98,16 @@ def cart(restaurant_id):
     if not user_id:
         return jsonify({"error": "Bạn chưa đăng nhập"}), 403
 
-    customer = Customer.query.filter_by(user_id=user_id).first()
-    if not customer:
+    principal = current_principal()
+    if not principal or not principal.is_customer:
         return jsonify({"error": "Bạn không phải là khách hàng"}), 403
 
-    cart = dao_cus.get_active_cart(customer.user_id, restaurant_id)
+    cart = dao_cus.get_active_cart(user_id, restaurant_id)
     cart_items = cart.items if cart else []
     total_price = sum(item.quantity * item.dish.price for item in cart_items) if cart_items else 0
     is_open = is_restaurant_open(Restaurant.query.filter_by(restaurant_id=restaurant_id).first())
     return render_template("/customer/cart.html", cart=cart, cart_items=cart_items, total_price=total_price
-                           , is_open=is_open)
+                           , is_open=is_open, checkout_key=uuid4().hex)
 
 # ========== CẬP NHẬT ITEM ==========
 @customer_bp.route("/api/cart/<int:item_id>", methods=["PUT"])
@@ -123,7 +126,7 @@ def update_cart_item(item_id):
 
     item.quantity = quantity
     item.note = note
-    db.session.commit()
+    db.session.flush()
 
     subtotal = item.quantity * item.dish.price
     total = sum(i.quantity * i.dish.price for i in item.cart.items)
@@ -145,7 +148,7 @@ def delete_cart_item(item_id):
     restaurant_id = item.cart.restaurant.restaurant_id if item.cart.restaurant else None
 
     db.session.delete(item)
-    db.session.commit()
+    db.session.flush()
 
     remaining_items = CartItem.query.join(Cart).filter(
         Cart.cus_id == user_id,
@@ -173,17 +176,22 @@ def my_orders():
     if not is_customer(session.get("role")):
         abort(403)
 
-    page = request.args.get("page", 1, type=int)
-    per_page = request.args.get("per_page", 10, type=int)
-    status_filter = (request.args.get("status") or "").strip().upper()
+    cursor = request.args.get("cursor")
+    per_page = max(5, min(request.args.get("per_page", 10, type=int), 50))
+    status_filter = dao_cus.normalize_status_filter(request.args.get("status"))
 
-    orders, total = dao_cus.list_customer_orders(uid, status_filter, page, per_page)
-    total_pages = (total + per_page - 1) // per_page
+    orders, next_cursor = dao_cus.list_customer_orders(uid, status_filter, cursor, per_page)
 
+    # infinite scroll: chỉ trả các dòng của trang tiếp theo
+    if request.args.get("partial"):
+        return render_template("customer/_order_rows.html", orders=orders, next_cursor=next_cursor, partial=True)
+
+    status_counts = dao_cus.cached_customer_status_counts(uid)
+    total = status_counts.get(status_filter, 0) if status_filter else sum(status_counts.values())
     return render_template(
         "customer/orders_list.html",
-        orders=orders, page=page, per_page=per_page,
-        total=total, total_pages=total_pages, status_filter=status_filter
+        orders=orders, per_page=per_page, cursor=cursor, next_cursor=next_cursor,
+        total=total, status_counts=status_counts, status_filter=status_filter
     )
 
 
@@ -292,27 +300,61 @@ def order_track(order_id):
     )
 
 
+@customer_bp.route("/api/order/<int:order_id>/status")
+def order_status(order_id):
+    """
+    Trạng thái gọn cho trang tracking. ?since=<version>: long-poll, trả về ngay khi trạng thái đổi
+    hoặc sau tối đa STATUS_LONG_POLL_SECONDS (changed=false).
+    """
+    uid = session.get("user_id")
+    if not uid:
+        return jsonify({"error": "unauthorized"}), 401
+
+    current = status_notifier.current(order_id)
+    if current is None:
+        return jsonify({"error": "not_found"}), 404
+    status, version, customer_id = current
+    if customer_id != uid and (session.get("role") or "").upper() != "ADMIN":
+        return jsonify({"error": "forbidden"}), 403
+
+    since = request.args.get("since", type=int)
+    if since is not None and since == version:
+        timeout = request.args.get("timeout", STATUS_LONG_POLL_SECONDS, type=float)
+        db.session.close()   # không giữ kết nối DB trong lúc chờ
+        waited = status_notifier.wait(order_id, since, max(0.0, min(timeout, STATUS_LONG_POLL_SECONDS)))
+        if waited:
+            status, version = waited
+
+    active_idx, last_label, is_completed = dao_cus.compute_track_state(status)
+    return jsonify({
+        "order_id": order_id,
+        "status": status,
+        "version": version,
+        "changed": since != version,
+        "active_idx": active_idx,
+        "last_label": last_label,
+        "is_completed": is_completed,
+    })
+
+
 @customer_bp.route("/profile", methods=["GET"])
 def profile_page():
-    uid = session.get("user_id")
-    role = session.get("role")
-    if not uid or not is_customer_or_owner(role):
+    p = current_principal()
+    if not p or not is_customer_or_owner(p.role):
         return redirect(url_for("login"))
 
-    user = User.query.get(uid)
-    return render_template("customer/profile.html", user=user, role=role)
+    return render_template("customer/profile.html", user=p.user, role=p.role)
 
 
 # === Cập nhật tên / địa chỉ ===
 PHONE_RE = re.compile(r'^0\d{9}$')
 @customer_bp.route("/profile", methods=["POST"])
 def profile_update():
-    uid = session.get("user_id")
-    role = session.get("role")
-    if not uid or not is_customer_or_owner(role):
+    p = current_principal()
+    if not p or not is_customer_or_owner(p.role):
         return redirect(url_for("login"))
 
-    user = User.query.get(uid)
+    user = p.user
     name    = (request.form.get("name") or "").strip()
     address = (request.form.get("address") or "").strip()
     phone   = (request.form.get("phone") or "").strip()
@@ -326,7 +368,7 @@ def profile_update():
         return redirect(url_for("customer.profile_page"))
 
     if phone:
-        exists = User.query.filter(User.phone == phone, User.user_id != uid).first()
+        exists = User.query.filter(User.phone == phone, User.user_id != p.user_id).first()
         if exists:
             flash("Số điện thoại này đã đăng ký", "warning")
             return redirect(url_for("customer.profile_page"))
@@ -334,7 +376,7 @@ def profile_update():
     user.name = name
     user.address = address
     user.phone = phone or None
-    db.session.commit()
+    db.session.flush()
     flash("Cập nhật hồ sơ thành công.", "success")
     return redirect(url_for("customer.profile_page"))
 
@@ -342,12 +384,11 @@ def profile_update():
 # === Đổi mật khẩu ===
 @customer_bp.route("/profile/password", methods=["POST"])
 def profile_change_password():
-    uid = session.get("user_id")
-    role = session.get("role")
-    if not uid or not is_customer_or_owner(role):
+    p = current_principal()
+    if not p or not is_customer_or_owner(p.role):
         return redirect(url_for("login"))
 
-    user = User.query.get(uid)
+    user = p.user
     old_pw = request.form.get("old_password") or ""
     new_pw = request.form.get("new_password") or ""
     confirm = request.form.get("confirm_password") or ""
@@ -366,16 +407,15 @@ def profile_change_password():
         return redirect(url_for("customer.profile"))
 
     user.password = generate_password_hash(new_pw)
-    db.session.commit()
+    db.session.flush()
     flash("Đổi mật khẩu thành công.", "success")
     return redirect(url_for("customer.profile"))
 import cloudinary.uploader
 
 @customer_bp.route("/profile/avatar", methods=["POST"])
 def profile_upload_avatar():
-    uid = session.get("user_id")
-    role = session.get("role")
-    if not uid or not is_customer_or_owner(role):
+    p = current_principal()
+    if not p or not is_customer_or_owner(p.role):
         return redirect(url_for("login"))
 
     file = request.files.get("avatar")
@@ -392,7 +432,7 @@ def profile_upload_avatar():
         result = cloudinary.uploader.upload(
             file,
             folder="orderfood/avatars",
-            public_id=f"user_{uid}",
+            public_id=f"user_{p.user_id}",
             overwrite=True,
             resource_type="image",
         )
@@ -400,9 +440,8 @@ def profile_upload_avatar():
         if not secure_url:
             raise RuntimeError("Upload không trả về URL")
 
-        user = User.query.get(uid)
-        user.avatar = secure_url
-        db.session.commit()
+        p.user.avatar = secure_url
+        db.session.flush()
         flash("Cập nhật ảnh đại diện thành công.", "success")
     except Exception as e:
         db.session.rollback()
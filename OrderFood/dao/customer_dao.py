@@ -1,7 +1,11 @@
 from __future__ import annotations
-from typing import List, Tuple, Optional
+import threading
+import time
+from typing import List, Tuple, Optional, Dict
 from sqlalchemy import func, or_
+from sqlalchemy.orm import selectinload
 from OrderFood import db, dao_index
+from OrderFood.dao import order_dao
 from OrderFood.models import (
     Restaurant, Dish, Category,
     Cart, Order, Notification, OrderRating,
@@ -47,15 +51,65 @@ def count_cart_items(cart: Optional[Cart]) -> int:
 
 
 # --------- Orders (customer scope) ----------
-def list_customer_orders(uid: int, status_filter: str, page: int, per_page: int) -> Tuple[List[Order], int]:
-    q = Order.query.filter_by(customer_id=uid).order_by(Order.created_date.desc())
-    if status_filter in ("PENDING", "PAID", "ACCEPT", "ACCEPTED", "CANCELED", "COMPLETED"):
-        if status_filter == "ACCEPT":
-            status_filter = "ACCEPTED"
-        q = q.filter(Order.status == getattr(StatusOrder, status_filter))
-    total = q.count()
-    orders = q.offset((page - 1) * per_page).limit(per_page).all()
-    return orders, total
+CUSTOMER_STATUS_FILTERS = ("PENDING", "PAID", "ACCEPTED", "CANCELED", "COMPLETED")
+
+
+def normalize_status_filter(status_filter: str) -> str:
+    status_filter = (status_filter or "").strip().upper()
+    if status_filter == "ACCEPT":
+        status_filter = "ACCEPTED"
+    return status_filter if status_filter in CUSTOMER_STATUS_FILTERS else ""
+
+
+def list_customer_orders(uid: int, status_filter: str, cursor: Optional[str] = None,
+                         per_page: int = 10) -> Tuple[List[Order], Optional[str]]:
+    """
+    1 trang đơn của khách (mới trước), keyset theo (created_date, order_id) -> trang sâu không chậm
+    như OFFSET, không COUNT mỗi trang. Nhà hàng + món nạp bằng selectinload (không lazy-load từng đơn).
+    """
+    q = (Order.query
+         .options(selectinload(Order.restaurant), selectinload(Order.lines))
+         .filter(Order.customer_id == uid))
+    status_filter = normalize_status_filter(status_filter)
+    if status_filter:
+        q = q.filter(Order.status == StatusOrder[status_filter])
+    q = order_dao.apply_keyset_desc(q, cursor)
+    return order_dao.fetch_page(q, per_page)
+
+
+# Số đơn theo trạng thái của khách: cache theo user, xoá khi có order_event của khách (consumer "cache")
+CUSTOMER_COUNTS_TTL = 300  # giây
+_customer_counts: Dict[int, Tuple[float, Dict[str, int]]] = {}
+_customer_counts_lock = threading.Lock()
+
+
+def count_customer_orders_by_status(uid: int) -> Dict[str, int]:
+    rows = (db.session.query(Order.status, func.count(Order.order_id))
+            .filter(Order.customer_id == uid)
+            .group_by(Order.status)
+            .all())
+    counts = {s: 0 for s in CUSTOMER_STATUS_FILTERS}
+    for status, n in rows:
+        counts[status.value] = int(n)
+    return counts
+
+
+def cached_customer_status_counts(uid: int) -> Dict[str, int]:
+    now = time.monotonic()
+    with _customer_counts_lock:
+        hit = _customer_counts.get(uid)
+        if hit and hit[0] > now:
+            return dict(hit[1])
+    counts = count_customer_orders_by_status(uid)
+    with _customer_counts_lock:
+        _customer_counts[uid] = (now + CUSTOMER_COUNTS_TTL, counts)
+    return dict(counts)
+
+
+def invalidate_customer_status_counts(uids) -> None:
+    with _customer_counts_lock:
+        for uid in uids:
+            _customer_counts.pop(uid, None)
 
 
 def get_order_for_customer_or_admin(order_id: int, uid: int, role_upper: str) -> Order:
@@ -84,7 +138,7 @@ def open_notification(noti_id: int, uid: int) -> int:
         from flask import abort
         abort(403)
     n.is_read = True
-    db.session.commit()
+    db.session.flush()
     return n.order_id
 
 
@@ -93,7 +147,6 @@ def mark_all_notifications_read(uid: int) -> None:
      .join(Order, Notification.order_id == Order.order_id)
      .filter(Order.customer_id == uid, Notification.is_read == False)
      .update({"is_read": True}, synchronize_session=False))
-    db.session.commit()
 
 
 # --------- Ratings ----------
@@ -108,7 +161,7 @@ def has_rated(order_id: int, uid: int) -> bool:
 
 def add_order_rating(order_id: int, uid: int, rating: int, comment: str) -> None:
     db.session.add(OrderRating(order_id=order_id, customer_id=uid, rating=rating, comment=comment))
-    db.session.commit()
+    db.session.flush()
 
 
 def update_restaurant_rating(restaurant_id: int) -> None:
@@ -125,7 +178,7 @@ def update_restaurant_rating(restaurant_id: int) -> None:
     res = Restaurant.query.get(restaurant_id)
     if res:
         res.rating_point = float(avg_rating or 0)
-        db.session.commit()
+        db.session.flush()
 
 
 # --------- Order track helpers ----------
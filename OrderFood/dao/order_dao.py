@@ -0,0 +1,188 @@
+# OrderFood/dao/order_dao.py
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple, Dict
+
+from sqlalchemy import func, or_, and_
+from sqlalchemy.orm import joinedload, selectinload
+
+from OrderFood import db
+from OrderFood.models import Order, Customer, Payment, StatusOrder
+
+# Trạng thái cần xử lý (mặc định cho bảng giao hàng)
+ACTIONABLE_STATUSES = (StatusOrder.PAID, StatusOrder.ACCEPTED)
+
+
+# --------- Filter helpers ----------
+def parse_date(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value.strip(), "%Y-%m-%d")
+    except ValueError:
+        return None
+
+
+def parse_statuses(values) -> List[StatusOrder]:
+    """Nhận list chuỗi (có thể 'A,B'), bỏ qua giá trị không hợp lệ, giữ thứ tự."""
+    statuses = []
+    for raw in values or []:
+        for s in (raw or "").split(","):
+            s = s.strip().upper()
+            if s in StatusOrder.__members__ and StatusOrder[s] not in statuses:
+                statuses.append(StatusOrder[s])
+    return statuses
+
+
+def parse_order_filters(args) -> Tuple[Optional[datetime], Optional[datetime], List[StatusOrder]]:
+    """
+    ?from=YYYY-MM-DD&to=YYYY-MM-DD (to tính trọn ngày)
+    ?status=A&status=B hoặc ?status=A,B
+    """
+    date_from = parse_date(args.get("from"))
+    date_to = parse_date(args.get("to"))
+    if date_to:
+        date_to = date_to + timedelta(days=1)
+    return date_from, date_to, parse_statuses(args.getlist("status"))
+
+
+def apply_order_filters(q, restaurant_id: Optional[int] = None,
+                        date_from: Optional[datetime] = None,
+                        date_to: Optional[datetime] = None,
+                        statuses: Optional[List[StatusOrder]] = None):
+    if restaurant_id is not None:
+        q = q.filter(Order.restaurant_id == restaurant_id)
+    if date_from:
+        q = q.filter(Order.created_date >= date_from)
+    if date_to:
+        q = q.filter(Order.created_date < date_to)
+    if statuses:
+        q = q.filter(Order.status.in_(statuses))
+    return q
+
+
+# --------- Keyset cursor (created_date, order_id) ----------
+def encode_cursor(order: Order) -> Optional[str]:
+    if not order or not order.created_date:
+        return None
+    return f"{order.created_date.strftime('%Y%m%d%H%M%S%f')}_{order.order_id}"
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[Tuple[datetime, int]]:
+    if not cursor:
+        return None
+    try:
+        ts, oid = cursor.split("_", 1)
+        return datetime.strptime(ts, "%Y%m%d%H%M%S%f"), int(oid)
+    except (ValueError, TypeError):
+        return None
+
+
+def apply_keyset_desc(q, cursor: Optional[str]):
+    """Trang sau = các đơn 'cũ hơn' cursor theo (created_date DESC, order_id DESC)."""
+    key = decode_cursor(cursor)
+    if key:
+        created, oid = key
+        q = q.filter(or_(Order.created_date < created,
+                         and_(Order.created_date == created, Order.order_id < oid)))
+    return q.order_by(Order.created_date.desc(), Order.order_id.desc())
+
+
+def fetch_page(q, per_page: int) -> Tuple[List[Order], Optional[str]]:
+    """Lấy per_page + 1 dòng để biết còn trang sau hay không (không cần COUNT)."""
+    rows = q.limit(per_page + 1).all()
+    next_cursor = encode_cursor(rows[per_page - 1]) if len(rows) > per_page else None
+    return rows[:per_page], next_cursor
+
+
+# --------- Delivery board (admin) ----------
+def list_delivery_orders(statuses: List[StatusOrder],
+                         restaurant_id: Optional[int] = None,
+                         date_from: Optional[datetime] = None,
+                         date_to: Optional[datetime] = None,
+                         cursor: Optional[str] = None,
+                         per_page: int = 50) -> Tuple[List[Order], Optional[str]]:
+    q = (Order.query
+         .options(joinedload(Order.customer).joinedload(Customer.user),
+                  joinedload(Order.restaurant)))
+    q = apply_order_filters(q, restaurant_id, date_from, date_to, statuses)
+    q = apply_keyset_desc(q, cursor)
+    return fetch_page(q, per_page)
+
+
+def count_orders_by_status(restaurant_id: Optional[int] = None,
+                           date_from: Optional[datetime] = None,
+                           date_to: Optional[datetime] = None) -> Dict[str, int]:
+    """1 câu GROUP BY status -> {"PAID": n, ...} (đủ mọi trạng thái, thiếu thì = 0)."""
+    q = db.session.query(Order.status, func.count(Order.order_id))
+    q = apply_order_filters(q, restaurant_id, date_from, date_to)
+    counts = {s.value: 0 for s in StatusOrder}
+    for status, n in q.group_by(Order.status).all():
+        counts[getattr(status, "value", status)] = int(n or 0)
+    return counts
+
+
+# --------- Cache số đơn theo trạng thái (tab owner) ----------
+# Xoá theo nhà hàng khi có order_event (consumer "cache"); TTL chỉ là lưới an toàn.
+STATUS_COUNTS_TTL = 60  # giây
+_status_counts: Dict[int, Tuple[float, Dict[str, int]]] = {}
+_status_counts_lock = threading.Lock()
+
+
+def cached_status_counts(restaurant_id: int) -> Dict[str, int]:
+    now = time.monotonic()
+    with _status_counts_lock:
+        hit = _status_counts.get(restaurant_id)
+        if hit and hit[0] > now:
+            return dict(hit[1])
+    counts = count_orders_by_status(restaurant_id)
+    with _status_counts_lock:
+        _status_counts[restaurant_id] = (now + STATUS_COUNTS_TTL, counts)
+    return dict(counts)
+
+
+def invalidate_status_counts(restaurant_ids) -> None:
+    with _status_counts_lock:
+        for rid in restaurant_ids:
+            _status_counts.pop(rid, None)
+
+
+# --------- Owner order board ----------
+def _owner_board_options():
+    # mỗi quan hệ 1 câu SELECT ... IN (...) cho cả trang, template không lazy-load từng đơn
+    return (selectinload(Order.customer).selectinload(Customer.user),
+            selectinload(Order.lines))
+
+
+def list_owner_actionable(restaurant_id: int) -> Dict[StatusOrder, List[Order]]:
+    """Đơn PAID / ACCEPTED của nhà hàng (cũ trước) trong 1 câu, tách theo trạng thái."""
+    rows = (Order.query
+            .options(*_owner_board_options())
+            .filter(Order.restaurant_id == restaurant_id, Order.status.in_(ACTIONABLE_STATUSES))
+            .order_by(Order.created_date.asc(), Order.order_id.asc())
+            .all())
+    out = {s: [] for s in ACTIONABLE_STATUSES}
+    for o in rows:
+        out[o.status].append(o)
+    return out
+
+
+def load_board_orders(order_ids) -> Dict[int, Order]:
+    """{order_id: Order} kèm khách + món (bảng đơn realtime dựng thẻ đơn không cần query thêm)."""
+    if not order_ids:
+        return {}
+    rows = Order.query.options(*_owner_board_options()).filter(Order.order_id.in_(list(order_ids))).all()
+    return {o.order_id: o for o in rows}
+
+
+def list_owner_history(restaurant_id: int, status: StatusOrder,
+                       cursor: Optional[str] = None,
+                       per_page: int = 20) -> Tuple[List[Order], Optional[str]]:
+    """1 trang đơn COMPLETED / CANCELED (mới trước), keyset theo (created_date, order_id)."""
+    q = Order.query.options(selectinload(Order.customer).selectinload(Customer.user))
+    if status == StatusOrder.CANCELED:
+        q = q.options(selectinload(Order.payment).selectinload(Payment.refunds))
+    q = apply_order_filters(q, restaurant_id, statuses=[status])
+    q = apply_keyset_desc(q, cursor)
+    return fetch_page(q, per_page)
@@ -1,5 +1,5 @@
-from sqlalchemy import desc, asc
-from typing import List, Optional
+from sqlalchemy import desc, asc, func, or_
+from typing import List, Optional, Tuple, Dict
 from OrderFood.models import db, User, Role
 
 
@@ -46,3 +46,45 @@ def get_all_user(limit: Optional[int] = None,
     if limit is not None:
         q = q.limit(limit)
     return q.all()
+
+
+def search_users(role: Optional[Role] = None,
+                 keyword: Optional[str] = None,
+                 cursor: Optional[int] = None,
+                 per_page: int = 50) -> Tuple[List[User], Optional[int]]:
+    """
+    Tìm user (không gồm admin) theo tiền tố email / SĐT (đều có index),
+    phân trang keyset theo user_id giảm dần.
+    - cursor: user_id cuối cùng của trang trước
+    Trả về (users, next_cursor) — next_cursor=None nếu hết.
+    """
+    q = db.session.query(User)
+    q = q.filter(User.role == role) if role else q.filter(User.role != Role.ADMIN)
+
+    kw = (keyword or "").strip().lower()
+    if kw:
+        # escape ký tự wildcard để LIKE 'kw%' vẫn dùng được index
+        kw_like = kw.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        if kw.isdigit():
+            q = q.filter(or_(User.phone.like(kw_like, escape="\\"), User.email.like(kw_like, escape="\\")))
+        else:
+            q = q.filter(User.email.like(kw_like, escape="\\"))
+
+    if cursor:
+        q = q.filter(User.user_id < cursor)
+
+    rows = q.order_by(desc(User.user_id)).limit(per_page + 1).all()
+    next_cursor = rows[per_page - 1].user_id if len(rows) > per_page else None
+    return rows[:per_page], next_cursor
+
+
+def count_users_by_role() -> Dict[str, int]:
+    """1 câu GROUP BY role -> {"CUSTOMER": n, "RESTAURANT_OWNER": m}."""
+    counts = {Role.CUSTOMER.value: 0, Role.RESTAURANT_OWNER.value: 0}
+    rows = (db.session.query(User.role, func.count(User.user_id))
+            .filter(User.role != Role.ADMIN)
+            .group_by(User.role)
+            .all())
+    for role, n in rows:
+        counts[getattr(role, "value", role)] = int(n or 0)
+    return counts
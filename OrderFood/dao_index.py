@@ -22,11 +22,10 @@ def create_user(name, email, phone, hashed_password, role: str):
     u = User(name=name, email=email, phone=phone, password=hashed_password, role=_norm_role(role))
     try:
         db.session.add(u)
-        db.session.commit()
+        db.session.flush()  # lấy user_id; commit ở cuối request
         if role.upper() == "RESTAURANT_OWNER":
-            owner = RestaurantOwner(user_id=u.user_id, tax=None)
-            db.session.add(owner)
-            db.session.commit()
+            db.session.add(RestaurantOwner(user_id=u.user_id, tax=None))
+            db.session.flush()
         return u
     except IntegrityError:
         db.session.rollback()
@@ -105,7 +104,7 @@ def add_cart_item(cart, dish_id, quantity=1, note=""):
     else:
         cart_item = CartItem(cart_id=cart.cart_id, dish_id=dish_id, quantity=quantity, note=note)
         db.session.add(cart_item)
-    db.session.commit()
+    db.session.flush()
     return cart_item
 
 def count_cart_items(cart):
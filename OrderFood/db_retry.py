@@ -0,0 +1,118 @@
+# OrderFood/db_retry.py
+"""
+Chạy lại cả unit of work khi MySQL báo deadlock / lock wait timeout.
+
+    @retry_on_deadlock("checkout_vnpay")
+    def checkout_vnpay(...):
+        ...
+
+- Lỗi retryable (1213 deadlock, 1205 lock wait timeout) -> rollback, chờ backoff
+  luỹ thừa có jitter (full jitter) rồi chạy lại toàn bộ hàm.
+- Hàm chạy xong: response < 400 -> commit ngay trong vòng retry (để deadlock lúc commit
+  cũng được thử lại); response >= 400 -> rollback.
+- Hết số lần thử -> ném lại lỗi gốc.
+- retry_metrics() trả về số lần chạy / thử lại / thất bại theo tên.
+"""
+import random
+import threading
+import time
+from functools import wraps
+
+from flask import current_app, g, has_app_context, has_request_context
+from sqlalchemy.exc import DBAPIError
+
+from OrderFood import db
+
+# MySQL: 1213 ER_LOCK_DEADLOCK, 1205 ER_LOCK_WAIT_TIMEOUT
+RETRYABLE_MYSQL_CODES = frozenset({1213, 1205})
+
+DEFAULT_ATTEMPTS = 4
+BASE_DELAY = 0.05   # giây
+MAX_DELAY = 1.0
+
+
+def is_retryable(exc: BaseException) -> bool:
+    if not isinstance(exc, DBAPIError) or exc.orig is None:
+        return False
+    args = getattr(exc.orig, "args", ())
+    return bool(args) and args[0] in RETRYABLE_MYSQL_CODES
+
+
+def _backoff(attempt: int, base: float, cap: float) -> float:
+    return random.uniform(0, min(cap, base * (2 ** (attempt - 1))))
+
+
+def _status_of(rv) -> int:
+    """Lấy status code từ giá trị trả về của view (Response / tuple / khác)."""
+    if isinstance(rv, tuple) and len(rv) > 1 and isinstance(rv[1], int):
+        return rv[1]
+    return getattr(rv, "status_code", 200)
+
+
+# ========= Metrics =========
+_metrics_lock = threading.Lock()
+_metrics: dict[str, dict] = {}
+
+
+def _incr(name: str, **fields) -> None:
+    with _metrics_lock:
+        m = _metrics.setdefault(name, {"calls": 0, "retries": 0, "recovered": 0, "exhausted": 0, "last_error": None})
+        for k, v in fields.items():
+            if isinstance(v, int) and isinstance(m.get(k), int):
+                m[k] += v
+            else:
+                m[k] = v
+
+
+def retry_metrics() -> dict:
+    with _metrics_lock:
+        return {k: dict(v) for k, v in _metrics.items()}
+
+
+def _log(msg, *args):
+    if has_app_context():
+        current_app.logger.warning(msg, *args)
+    else:
+        print("[DB-RETRY] " + (msg % args))
+
+
+# ========= Decorator =========
+def retry_on_deadlock(name: str | None = None, attempts: int = DEFAULT_ATTEMPTS,
+                      base_delay: float = BASE_DELAY, max_delay: float = MAX_DELAY):
+    def decorator(fn):
+        label = name or fn.__name__
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            _incr(label, calls=1)
+            attempt = 1
+            while True:
+                try:
+                    rv = fn(*args, **kwargs)
+                    if _status_of(rv) >= 400:
+                        db.session.rollback()
+                    else:
+                        db.session.commit()
+                    if attempt > 1:
+                        _incr(label, recovered=1)
+                    return rv
+                except DBAPIError as ex:
+                    db.session.rollback()
+                    if has_request_context():
+                        g.pop("_uow_callbacks", None)   # on_commit của lần chạy hỏng
+                    if not is_retryable(ex):
+                        raise
+                    err = f"{ex.orig.args[0]}: {ex.orig.args[1] if len(ex.orig.args) > 1 else ''}"[:255]
+                    if attempt >= attempts:
+                        _incr(label, exhausted=1, last_error=err)
+                        _log("%s: retryable error, giving up after %d attempts (%s)", label, attempt, err)
+                        raise
+                    _incr(label, retries=1, last_error=err)
+                    delay = _backoff(attempt, base_delay, max_delay)
+                    _log("%s: retryable error (%s), retry %d in %.3fs", label, err, attempt, delay)
+                    time.sleep(delay)
+                    attempt += 1
+
+        return wrapper
+
+    return decorator
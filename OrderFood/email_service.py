@@ -27,8 +27,17 @@ def send_mail(subject: str, recipients: list[str], body: str = "", html: str = "
         return False
 
 
+def queue_mail(subject: str, recipients: list[str], body: str = "", html: str = "") -> bool:
+    """
+    Đưa email vào outbox để worker gửi nền (không chờ SMTP).
+    Dòng outbox được commit cùng transaction của request gọi hàm này.
+    """
+    from OrderFood.mail_outbox import enqueue_mail
+    return enqueue_mail(subject, recipients, body=body, html=html) is not None
+
+
 # Ví dụ các hàm nghiệp vụ cụ thể
-def send_restaurant_status_email(to_email: str, restaurant_name: str, status: str, reason: str | None = None):
+def build_restaurant_status_email(restaurant_name: str, status: str, reason: str | None = None) -> tuple[str, str]:
     subject = f"[OrderFood] Cập nhật trạng thái nhà hàng: {restaurant_name}"
     reason_html = f"<p><b>Lý do:</b> {reason}</p>" if reason else ""
     html = f"""
@@ -39,4 +48,21 @@ def send_restaurant_status_email(to_email: str, restaurant_name: str, status: st
       <p>Trân trọng,<br>Đội ngũ OrderFood</p>
     </div>
     """
-    return send_mail(subject, [to_email], html=html)
+    return subject, html
+
+
+def send_restaurant_status_email(to_email: str, restaurant_name: str, status: str, reason: str | None = None):
+    subject, html = build_restaurant_status_email(restaurant_name, status, reason)
+    return queue_mail(subject, [to_email], html=html)
+
+
+def queue_restaurant_status_emails(targets, status: str, reason: str | None = None) -> int:
+    """targets: iterable (email, restaurant_name). Xếp hàng tất cả trong 1 lần."""
+    from OrderFood.mail_outbox import enqueue_many
+
+    def _mails():
+        for email, name in targets:
+            subject, html = build_restaurant_status_email(name, status, reason)
+            yield subject, [email], "", html
+
+    return enqueue_many(_mails())
@@ -0,0 +1,107 @@
+# OrderFood/export_service.py
+import csv
+import io
+from datetime import datetime
+
+from flask import Response, stream_with_context
+
+from OrderFood import db
+from OrderFood.dao.order_dao import parse_order_filters, apply_order_filters
+from OrderFood.models import Order, Restaurant, User, Payment, StatusOrder
+
+# Số dòng đọc mỗi lần từ server-side cursor (yield_per) và cũng là số dòng mỗi chunk gửi về client
+EXPORT_BATCH_SIZE = 500
+
+EXPORT_HEADER = [
+    "order_id", "created_date", "restaurant_id", "restaurant_name",
+    "customer_name", "customer_email", "status", "total_price",
+    "payment_status", "txn_ref",
+]
+
+
+def build_order_export_query(restaurant_id: int | None = None,
+                             date_from: datetime | None = None,
+                             date_to: datetime | None = None,
+                             statuses: list[StatusOrder] | None = None):
+    """
+    Query chỉ lấy cột (không load entity) + yield_per để DB trả về theo lô
+    qua server-side cursor -> bộ nhớ không phụ thuộc số đơn.
+    """
+    q = (db.session.query(
+            Order.order_id, Order.created_date,
+            Restaurant.restaurant_id, Restaurant.name,
+            User.name, User.email,
+            Order.status, Order.total_price,
+            Payment.status, Payment.txn_ref)
+         .join(Restaurant, Restaurant.restaurant_id == Order.restaurant_id)
+         .join(User, User.user_id == Order.customer_id)
+         .outerjoin(Payment, Payment.order_id == Order.order_id))
+
+    q = apply_order_filters(q, restaurant_id, date_from, date_to, statuses)
+    return q.order_by(Order.created_date.asc(), Order.order_id.asc()).yield_per(EXPORT_BATCH_SIZE)
+
+
+def _enum_value(v):
+    return getattr(v, "value", v) or ""
+
+
+def iter_order_csv(rows, batch_size: int = EXPORT_BATCH_SIZE):
+    """
+    Generator sinh CSV theo từng chunk. Dòng cuối là tổng doanh thu các đơn COMPLETED.
+    Có BOM để Excel đọc đúng tiếng Việt.
+    """
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+
+    def _flush():
+        data = buf.getvalue()
+        buf.seek(0)
+        buf.truncate(0)
+        return data
+
+    buf.write("\ufeff")
+    writer.writerow(EXPORT_HEADER)
+    yield _flush()
+
+    count = 0
+    revenue = 0.0
+    for (order_id, created_date, res_id, res_name, cus_name, cus_email,
+         status, total_price, pay_status, txn_ref) in rows:
+        status_str = _enum_value(status)
+        if status_str == StatusOrder.COMPLETED.value:
+            revenue += float(total_price or 0)
+        writer.writerow([
+            order_id,
+            created_date.strftime("%Y-%m-%d %H:%M:%S") if created_date else "",
+            res_id, res_name or "",
+            cus_name or "", cus_email or "",
+            status_str, int(total_price or 0),
+            _enum_value(pay_status), txn_ref or "",
+        ])
+        count += 1
+        if count % batch_size == 0:
+            yield _flush()
+
+    writer.writerow([])
+    writer.writerow(["total_orders", count])
+    writer.writerow(["completed_revenue", int(revenue)])
+    yield _flush()
+
+
+def csv_response(chunks, filename: str) -> Response:
+    """Trả về response streaming (không dựng toàn bộ file trong RAM)."""
+    return Response(
+        stream_with_context(chunks),
+        mimetype="text/csv",
+        headers={
+            "Content-Disposition": f'attachment; filename="{filename}"',
+            "Cache-Control": "no-store",
+        },
+    )
+
+
+def export_orders_csv(args, restaurant_id: int | None = None, prefix: str = "orders") -> Response:
+    date_from, date_to, statuses = parse_order_filters(args)
+    rows = build_order_export_query(restaurant_id, date_from, date_to, statuses)
+    filename = f"{prefix}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+    return csv_response(iter_order_csv(rows), filename)
@@ -55,11 +55,10 @@ def google_callback():
             role="CUSTOMER",  # mặc định khách hàng
         )
         db.session.add(user)
-        db.session.commit()
+        db.session.flush()   # lấy user_id
     else:
         if not user.name and display_name:
             user.name = display_name
-            db.session.commit()
 
     # ======= NEW: tạo Customer nếu thiếu =======
     try:
@@ -67,8 +66,9 @@ def google_callback():
         role_str = (getattr(user.role, "value", user.role) or "").upper()
         if role_str == "CUSTOMER":
             if not Customer.query.filter_by(user_id=user.user_id).first():
-                db.session.add(Customer(user_id=user.user_id))
-                db.session.commit()
+                # savepoint: lỗi ở đây không kéo theo user vừa tạo (unit of work commit cuối request)
+                with db.session.begin_nested():
+                    db.session.add(Customer(user_id=user.user_id))
     except Exception as ex:
         current_app.logger.exception("Failed to ensure Customer profile: %s", ex)
         # không chặn login, nhưng có thể cảnh báo nếu bạn muốn
@@ -1,5 +1,6 @@
 # index.py
 import os, traceback
+from uuid import uuid4
 from flask import render_template, request, redirect, url_for, flash, session, jsonify, current_app
 from werkzeug.security import generate_password_hash, check_password_hash
 from OrderFood import app, db
@@ -7,7 +8,9 @@ from OrderFood.customer_service import PHONE_RE, get_user_by_phone
 from OrderFood.dao import *
 from OrderFood.dao_index import get_restaurants_by_name, get_restaurants_by_dishes_name, get_star_display, \
     get_user_by_email, create_user, get_active_cart, add_cart_item, count_cart_items
-from OrderFood.models import Restaurant, Customer, Cart, StatusCart, Role
+from OrderFood.models import Restaurant, Cart, StatusCart, Role
+from OrderFood.principal import current_principal
+from OrderFood.db_retry import retry_on_deadlock, is_retryable
 
 # --- Helpers ---
 ENUM_UPPERCASE = True
@@ -165,6 +168,7 @@ def logout():
 
 # --- Cart API ---
 @app.route('/api/cart', methods=['POST'])
+@retry_on_deadlock("add_cart_item")
 def add_to_cart_route():
     try:
         data = request.get_json()
@@ -182,20 +186,22 @@ def add_to_cart_route():
         if not user_id:
             return jsonify({"error": "Bạn chưa đăng nhập"}), 403
 
-        customer = Customer.query.filter_by(user_id=user_id).first()
-        if not customer:
+        principal = current_principal()
+        if not principal or not principal.is_customer:
             return jsonify({"error": "Bạn không phải là khách hàng"}), 403
 
         cart = get_active_cart(user_id, restaurant_id)
         if not cart:
             cart = Cart(cus_id=user_id, res_id=restaurant_id, status=StatusCart.ACTIVE)
             db.session.add(cart)
-            db.session.commit()
+            db.session.flush()
 
         add_cart_item(cart, dish_id, quantity, note)
         total_items = count_cart_items(cart)
         return jsonify({"total_items": total_items})
     except Exception as e:
+        if is_retryable(e):
+            raise  # để retry_on_deadlock chạy lại cả thao tác thêm giỏ
         traceback.print_exc()
         return jsonify({"error": str(e)}), 500
 
@@ -205,15 +211,16 @@ def cart_route(restaurant_id):
     if not user_id:
         return jsonify({"error": "Bạn chưa đăng nhập"}), 403
 
-    customer = Customer.query.filter_by(user_id=user_id).first()
-    if not customer:
+    principal = current_principal()
+    if not principal or not principal.is_customer:
         return jsonify({"error": "Bạn không phải là khách hàng"}), 403
 
     cart = get_active_cart(user_id, restaurant_id)
     cart_items = cart.items if cart else []
     total_price = sum(item.quantity * item.dish.price for item in cart_items) if cart_items else 0
 
-    return render_template("/customer/cart.html", cart=cart, cart_items=cart_items, total_price=total_price)
+    return render_template("/customer/cart.html", cart=cart, cart_items=cart_items, total_price=total_price,
+                           checkout_key=uuid4().hex)
 # deploy thì bỏ nguyên cái if này đi
 
 if __name__ == "__main__":
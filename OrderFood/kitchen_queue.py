@@ -0,0 +1,131 @@
+# OrderFood/kitchen_queue.py
+"""
+Hàng đợi bếp theo nhà hàng: đơn PAID / ACCEPTED sắp theo hạn (created_date + waiting_time phút).
+
+- Giữ trong RAM của process: mỗi nhà hàng 1 list đã sắp (deadline, order_id) + dict order_id -> entry.
+- Nạp từ DB lần đầu nhà hàng được hỏi (1 câu SELECT chỉ lấy cột), sau đó cập nhật bằng order_event
+  (consumer local "kitchen" của dispatcher) -> owner poll vài giây / lần không tốn câu query nào.
+- KITCHEN_QUEUE_REFRESH_SECONDS: nạp lại định kỳ làm lưới an toàn (event bị lỡ, process khác chưa kịp poll...).
+"""
+import os
+import threading
+import time
+from bisect import insort
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+from OrderFood import db
+from OrderFood.models import Order, StatusOrder
+from OrderFood.order_events import dispatcher
+from OrderFood.order_state_machine import PAY, ACCEPT, COMPLETE, OWNER_CANCEL, ADMIN_CANCEL, EXPIRE
+
+_TZ = ZoneInfo("Asia/Ho_Chi_Minh")
+
+KITCHEN_QUEUE_REFRESH_SECONDS = float(os.getenv("KITCHEN_QUEUE_REFRESH_SECONDS", "300"))
+KITCHEN_STATUSES = (StatusOrder.PAID, StatusOrder.ACCEPTED)
+
+
+def _now():
+    return datetime.now(_TZ).replace(tzinfo=None)
+
+
+def _deadline(created_date, waiting_time) -> datetime:
+    return (created_date or _now()) + timedelta(minutes=int(waiting_time or 0))
+
+
+class _Board:
+    __slots__ = ("entries", "order", "loaded_at")
+
+    def __init__(self, rows, loaded_at: float):
+        self.entries: dict[int, dict] = {}
+        self.order: list[tuple] = []          # (deadline, order_id), luôn đã sắp
+        self.loaded_at = loaded_at
+        for r in rows:
+            self.put(r)
+
+    def put(self, row) -> None:
+        self.drop(row.order_id)
+        entry = {
+            "order_id": row.order_id,
+            "status": row.status.value,
+            "total_price": row.total_price,
+            "created_date": row.created_date,
+            "deadline": _deadline(row.created_date, row.waiting_time),
+        }
+        self.entries[row.order_id] = entry
+        insort(self.order, (entry["deadline"], row.order_id))
+
+    def drop(self, order_id: int) -> None:
+        entry = self.entries.pop(order_id, None)
+        if entry is not None:
+            self.order.remove((entry["deadline"], order_id))
+
+
+def _columns():
+    return (Order.order_id, Order.restaurant_id, Order.status, Order.total_price,
+            Order.created_date, Order.waiting_time)
+
+
+class KitchenQueue:
+    def __init__(self, refresh_seconds: float = KITCHEN_QUEUE_REFRESH_SECONDS):
+        self.refresh_seconds = refresh_seconds
+        self._boards: dict[int, _Board] = {}
+        self._lock = threading.Lock()
+
+    def _load(self, restaurant_id: int) -> _Board:
+        rows = (db.session.query(*_columns())
+                .filter(Order.restaurant_id == restaurant_id, Order.status.in_(KITCHEN_STATUSES))
+                .all())
+        return _Board(rows, time.monotonic())
+
+    def snapshot(self, restaurant_id: int) -> list[dict]:
+        """Đơn của nhà hàng theo hạn tăng dần, kèm seconds_left (âm = đã quá hạn, chờ job huỷ)."""
+        with self._lock:
+            board = self._boards.get(restaurant_id)
+            fresh = board is not None and time.monotonic() - board.loaded_at < self.refresh_seconds
+        if not fresh:
+            board = self._load(restaurant_id)
+            with self._lock:
+                self._boards[restaurant_id] = board
+
+        now = _now()
+        with self._lock:
+            items = [dict(board.entries[oid]) for _, oid in board.order]
+        for it in items:
+            it["seconds_left"] = int((it["deadline"] - now).total_seconds())
+            it["deadline"] = it["deadline"].isoformat()
+            it["created_date"] = it["created_date"].isoformat() if it["created_date"] else None
+        return items
+
+    def apply(self, events) -> None:
+        """Cập nhật các nhà hàng đã nạp. PAY / ACCEPT đọc lại trạng thái hiện tại -> áp lại event vẫn đúng."""
+        with self._lock:
+            loaded = set(self._boards)
+        events = [e for e in events if e.restaurant_id in loaded]
+        if not events:
+            return
+
+        refresh = {e.order_id for e in events if e.transition in (PAY, ACCEPT)}
+        rows = {}
+        if refresh:
+            rows = {r.order_id: r for r in db.session.query(*_columns())
+                    .filter(Order.order_id.in_(refresh)).all()}
+
+        with self._lock:
+            for e in events:
+                board = self._boards.get(e.restaurant_id)
+                if board is None:
+                    continue
+                row = rows.get(e.order_id)
+                if row is not None and row.status in KITCHEN_STATUSES:
+                    board.put(row)
+                else:
+                    board.drop(e.order_id)
+
+
+kitchen_queue = KitchenQueue()
+
+
+@dispatcher.register("kitchen", transitions=[PAY, ACCEPT, COMPLETE, OWNER_CANCEL, ADMIN_CANCEL, EXPIRE], local=True)
+def _on_order_events(events):
+    kitchen_queue.apply(events)
@@ -0,0 +1,186 @@
+# OrderFood/live_board.py
+"""
+Bảng đơn realtime cho chủ nhà hàng qua WebSocket (thư viện `websockets`).
+
+- 1 server WebSocket chạy trong thread riêng (event loop asyncio riêng) ở LIVE_WS_PORT.
+- Xác thực bằng cookie session của Flask (cùng SECRET_KEY), chỉ owner đã có nhà hàng; kiểm tra Origin.
+- LiveBroker giữ {restaurant_id: set(connection)}. Consumer local "live" của dispatcher order_event
+  dựng thẻ đơn 1 lần / lô (1 câu SELECT + selectinload) rồi broadcast cùng 1 chuỗi JSON cho mọi owner
+  của nhà hàng -> vài nghìn kết nối không tốn thêm query nào, trang không cần tải lại.
+- Sự kiện: order-created, order-paid, order-accepted, order-completed, order-cancelled, order-expired.
+"""
+import asyncio
+import json
+import os
+import threading
+from http.cookies import SimpleCookie
+from urllib.parse import urlsplit
+
+from websockets.asyncio.server import serve, broadcast
+
+from OrderFood import db
+from OrderFood.models import Restaurant
+from OrderFood.order_events import dispatcher
+from OrderFood.order_state_machine import (
+    CREATE, PAY, ACCEPT, COMPLETE, OWNER_CANCEL, ADMIN_CANCEL, EXPIRE, EXPIRE_MESSAGE,
+)
+
+LIVE_WS_ENABLED = os.getenv("LIVE_WS_ENABLED", "true").lower() == "true"
+LIVE_WS_HOST = os.getenv("LIVE_WS_HOST", "0.0.0.0")
+LIVE_WS_PORT = int(os.getenv("LIVE_WS_PORT", "5001"))
+LIVE_WS_PUBLIC_URL = os.getenv("LIVE_WS_PUBLIC_URL")   # vd: wss://example.com/ws (khi đứng sau proxy)
+
+EVENT_TYPES = {
+    CREATE: "order-created",
+    PAY: "order-paid",
+    ACCEPT: "order-accepted",
+    COMPLETE: "order-completed",
+    OWNER_CANCEL: "order-cancelled",
+    ADMIN_CANCEL: "order-cancelled",
+    EXPIRE: "order-expired",
+}
+
+
+def public_url(request) -> str:
+    """URL WebSocket cho trình duyệt: LIVE_WS_PUBLIC_URL, ngược lại cùng host với trang, cổng LIVE_WS_PORT."""
+    if LIVE_WS_PUBLIC_URL:
+        return LIVE_WS_PUBLIC_URL
+    scheme = "wss" if request.scheme == "https" else "ws"
+    return f"{scheme}://{request.host.split(':')[0]}:{LIVE_WS_PORT}/"
+
+
+def order_card(order, transition: str, data: dict) -> dict:
+    card = {
+        "order_id": order.order_id,
+        "status": order.status.value,
+        "customer_name": order.customer.user.name if order.customer and order.customer.user else "",
+        "total_price": order.total_price,
+        "items": [{"name": line.dish_name, "quantity": line.quantity} for line in order.lines],
+    }
+    if transition == OWNER_CANCEL:
+        card["reason"] = (data.get("reason") or "").strip() or "Nhà hàng huỷ đơn"
+    elif transition == ADMIN_CANCEL:
+        card["reason"] = "Khách hàng đã hủy đơn"
+    elif transition == EXPIRE:
+        card["reason"] = EXPIRE_MESSAGE
+    return card
+
+
+class LiveBroker:
+    def __init__(self):
+        self._subs: dict[int, set] = {}
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._thread = None
+        self._app = None
+
+    # ----- broker (an toàn khi gọi từ thread khác) -----
+    def has_subscribers(self, restaurant_id: int) -> bool:
+        return bool(self._subs.get(restaurant_id))
+
+    def connections(self) -> int:
+        return sum(len(s) for s in list(self._subs.values()))
+
+    def publish(self, restaurant_id: int, message: dict) -> None:
+        if self._loop is None or not self.has_subscribers(restaurant_id):
+            return
+        text = json.dumps(message, ensure_ascii=False, default=str)
+        self._loop.call_soon_threadsafe(self._broadcast, restaurant_id, text)
+
+    def _broadcast(self, restaurant_id: int, text: str) -> None:
+        # không chờ từng client; client chậm (buffer đầy) bị bỏ qua thay vì làm chậm cả nhà hàng
+        broadcast(self._subs.get(restaurant_id, ()), text)
+
+    # ----- server -----
+    def start(self, app) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._app = app
+        self._thread = threading.Thread(target=self._run, name="live-board-ws", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        try:
+            asyncio.run(self._serve())
+        except OSError as ex:
+            # process khác (vd: reloader) đã giữ cổng
+            print(f"[LIVE] websocket server not started: {ex}")
+
+    async def _serve(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        async with serve(self._handler, LIVE_WS_HOST, LIVE_WS_PORT) as server:
+            print(f"[LIVE] websocket server on :{LIVE_WS_PORT}")
+            await server.serve_forever()
+
+    def _restaurant_for(self, headers) -> int | None:
+        """Cookie session Flask -> restaurant_id của owner (None nếu không hợp lệ)."""
+        app = self._app
+        cookie = SimpleCookie(headers.get("Cookie", ""))
+        morsel = cookie.get(app.config.get("SESSION_COOKIE_NAME", "session"))
+        serializer = app.session_interface.get_signing_serializer(app)
+        if morsel is None or serializer is None:
+            return None
+        try:
+            sess = serializer.loads(morsel.value,
+                                    max_age=int(app.permanent_session_lifetime.total_seconds()))
+        except Exception:
+            return None
+        if (sess.get("role") or "").lower() != "restaurant_owner" or not sess.get("user_id"):
+            return None
+        with app.app_context():
+            try:
+                return (db.session.query(Restaurant.restaurant_id)
+                        .filter(Restaurant.res_owner_id == sess["user_id"])
+                        .scalar())
+            finally:
+                db.session.remove()
+
+    @staticmethod
+    def _same_origin(headers) -> bool:
+        origin = headers.get("Origin")
+        if not origin:
+            return True
+        return urlsplit(origin).hostname == (headers.get("Host") or "").split(":")[0]
+
+    async def _handler(self, ws) -> None:
+        headers = ws.request.headers
+        if not self._same_origin(headers):
+            await ws.close(1008, "origin")
+            return
+        rid = await asyncio.to_thread(self._restaurant_for, headers)
+        if not rid:
+            await ws.close(1008, "forbidden")
+            return
+
+        self._subs.setdefault(rid, set()).add(ws)
+        try:
+            await ws.send(json.dumps({"type": "hello", "restaurant_id": rid}))
+            async for _ in ws:      # client không gửi gì; chỉ chờ đóng kết nối
+                pass
+        finally:
+            subs = self._subs.get(rid)
+            if subs is not None:
+                subs.discard(ws)
+                if not subs:
+                    self._subs.pop(rid, None)
+
+
+live_broker = LiveBroker()
+
+
+@dispatcher.register("live", transitions=list(EVENT_TYPES), local=True)
+def _on_order_events(events):
+    from OrderFood.dao.order_dao import load_board_orders
+
+    events = [e for e in events if live_broker.has_subscribers(e.restaurant_id)]
+    if not events:
+        return
+    orders = load_board_orders({e.order_id for e in events})
+    for e in events:
+        order = orders.get(e.order_id)
+        if order is None:
+            continue
+        live_broker.publish(e.restaurant_id, {
+            "type": EVENT_TYPES[e.transition],
+            "event_id": e.event_id,
+            "order": order_card(order, e.transition, e.data),
+        })
@@ -0,0 +1,296 @@
+# OrderFood/mail_outbox.py
+"""
+Hàng đợi email (outbox) gửi nền.
+
+- Request chỉ gọi enqueue_mail(): thêm 1 dòng mail_outbox vào session (commit cùng nghiệp vụ)
+  rồi đánh thức worker -> không chờ SMTP.
+- MailOutboxWorker (1 thread điều phối + ThreadPoolExecutor MAIL_WORKERS luồng):
+  nhận lô mail bằng UPDATE có điều kiện (claim_token), mỗi luồng mở 1 kết nối SMTP
+  và gửi cả lô qua kết nối đó.
+- Lỗi -> thử lại với backoff luỹ thừa (+ jitter), quá MAIL_MAX_ATTEMPTS -> FAILED.
+- mail_metrics() trả về số liệu gửi + độ sâu hàng đợi.
+
+Test local không cần Gmail: chạy SMTP debug server, ví dụ
+    python -m aiosmtpd -n -l localhost:1025
+rồi đặt MAIL_SERVER=localhost, MAIL_PORT=1025, MAIL_USE_TLS=false.
+"""
+import os
+import random
+import smtplib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from uuid import uuid4
+from zoneinfo import ZoneInfo
+
+from flask_mail import Message
+from sqlalchemy import func, or_, and_
+
+from OrderFood import db, mail
+from OrderFood.models import MailOutbox, StatusMail
+
+_TZ = ZoneInfo("Asia/Ho_Chi_Minh")
+
+MAIL_WORKERS = int(os.getenv("MAIL_WORKERS", "2"))
+MAIL_BATCH_SIZE = int(os.getenv("MAIL_BATCH_SIZE", "20"))
+MAIL_MAX_ATTEMPTS = int(os.getenv("MAIL_MAX_ATTEMPTS", "5"))
+MAIL_POLL_SECONDS = float(os.getenv("MAIL_POLL_SECONDS", "15"))
+MAIL_BACKOFF_BASE = 30          # giây, lần thử thứ n chờ ~ BASE * 2^(n-1)
+MAIL_BACKOFF_MAX = 60 * 60
+MAIL_LOCK_TIMEOUT = timedelta(minutes=10)  # mail SENDING quá lâu (worker chết) -> nhận lại
+
+# Lỗi kết nối -> mở lại kết nối SMTP cho phần còn lại của lô
+_CONNECTION_ERRORS = (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, ConnectionError, TimeoutError)
+
+
+def _now():
+    return datetime.now(_TZ).replace(tzinfo=None)
+
+
+# ========= Metrics =========
+_metrics_lock = threading.Lock()
+_metrics = {
+    "sent": 0,
+    "failed": 0,
+    "retried": 0,
+    "batches": 0,
+    "connections": 0,
+    "last_batch_seconds": None,
+    "last_error": None,
+}
+
+
+def _incr(**fields):
+    with _metrics_lock:
+        for k, v in fields.items():
+            if isinstance(v, int) and isinstance(_metrics.get(k), int):
+                _metrics[k] += v
+            else:
+                _metrics[k] = v
+
+
+def mail_metrics() -> dict:
+    with _metrics_lock:
+        data = dict(_metrics)
+    rows = db.session.query(MailOutbox.status, func.count(MailOutbox.mail_id)).group_by(MailOutbox.status).all()
+    data["queue"] = {s.value: 0 for s in StatusMail}
+    for status, n in rows:
+        data["queue"][getattr(status, "value", status)] = int(n or 0)
+    data["workers"] = MAIL_WORKERS
+    return data
+
+
+# ========= Enqueue =========
+def enqueue_mail(subject: str, recipients: list[str], body: str = "", html: str = "") -> MailOutbox | None:
+    """
+    Thêm mail vào outbox (chưa commit — commit cùng transaction của nghiệp vụ).
+    Worker được đánh thức sau khi request commit xong.
+    """
+    recipients = [r.strip() for r in (recipients or []) if r and r.strip()]
+    if not recipients:
+        return None
+    row = MailOutbox(
+        recipients=",".join(recipients),
+        subject=subject[:255],
+        body=body or None,
+        html=html or None,
+        status=StatusMail.PENDING,
+        next_attempt_at=_now(),
+    )
+    db.session.add(row)
+    _request_wake()
+    return row
+
+
+def enqueue_many(mails) -> int:
+    """
+    Thêm nhiều mail một lần: mails là iterable (subject, recipients, body, html).
+    Chỉ đánh thức worker 1 lần. Trả về số mail đã xếp hàng.
+    """
+    now = _now()
+    rows = []
+    for subject, recipients, body, html in mails:
+        recipients = [r.strip() for r in (recipients or []) if r and r.strip()]
+        if not recipients:
+            continue
+        rows.append(MailOutbox(
+            recipients=",".join(recipients),
+            subject=subject[:255],
+            body=body or None,
+            html=html or None,
+            status=StatusMail.PENDING,
+            next_attempt_at=now,
+        ))
+    if rows:
+        db.session.add_all(rows)
+        _request_wake()
+    return len(rows)
+
+
+def _request_wake():
+    """Đánh thức worker sau khi request commit để không gửi trước khi dữ liệu có trong DB."""
+    from OrderFood.unit_of_work import on_commit
+    on_commit(worker.wake)
+
+
+# ========= Worker =========
+def _backoff_seconds(attempts: int) -> float:
+    delay = min(MAIL_BACKOFF_BASE * (2 ** max(attempts - 1, 0)), MAIL_BACKOFF_MAX)
+    return delay * random.uniform(0.8, 1.2)
+
+
+def _claim_batch(limit: int) -> list[MailOutbox]:
+    """Nhận lô mail đến hạn bằng UPDATE có điều kiện -> an toàn khi nhiều worker/process."""
+    now = _now()
+    due = or_(
+        and_(MailOutbox.status == StatusMail.PENDING, MailOutbox.next_attempt_at <= now),
+        and_(MailOutbox.status == StatusMail.SENDING, MailOutbox.locked_at < now - MAIL_LOCK_TIMEOUT),
+    )
+    ids = [r[0] for r in (db.session.query(MailOutbox.mail_id)
+                          .filter(due)
+                          .order_by(MailOutbox.next_attempt_at, MailOutbox.mail_id)
+                          .limit(limit)
+                          .all())]
+    if not ids:
+        return []
+    token = uuid4().hex
+    (db.session.query(MailOutbox)
+     .filter(MailOutbox.mail_id.in_(ids), due)
+     .update({"status": StatusMail.SENDING, "claim_token": token, "locked_at": now},
+             synchronize_session=False))
+    db.session.commit()
+    return MailOutbox.query.filter_by(claim_token=token).all()
+
+
+def _to_message(row: MailOutbox, sender) -> Message:
+    return Message(
+        subject=row.subject,
+        recipients=row.recipients.split(","),
+        body=row.body if not row.html else None,
+        html=row.html or None,
+        sender=sender,
+    )
+
+
+def _send_batch(app, ids: list[int]) -> None:
+    """Gửi 1 lô qua 1 kết nối SMTP (mở lại nếu bị ngắt giữa chừng)."""
+    with app.app_context():
+        started = time.monotonic()
+        rows = MailOutbox.query.filter(MailOutbox.mail_id.in_(ids)).all()
+        sender = app.config.get("MAIL_DEFAULT_SENDER")
+        pending = list(rows)
+        try:
+            while pending:
+                connected = False
+                try:
+                    with mail.connect() as conn:
+                        connected = True
+                        _incr(connections=1)
+                        while pending:
+                            row = pending[0]
+                            try:
+                                conn.send(_to_message(row, sender))
+                            except _CONNECTION_ERRORS:
+                                raise
+                            except Exception as ex:
+                                _mark_retry(row, ex)
+                            else:
+                                _mark_sent(row)
+                            pending.pop(0)
+                except Exception as ex:
+                    if connected and isinstance(ex, _CONNECTION_ERRORS) and pending:
+                        # mất kết nối giữa chừng: mail đang gửi dở tính 1 lần thử,
+                        # phần còn lại gửi qua kết nối mới
+                        _mark_retry(pending.pop(0), ex)
+                        continue
+                    # không kết nối được SMTP -> cả lô chờ thử lại
+                    for row in pending:
+                        _mark_retry(row, ex)
+                    pending = []
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            app.logger.exception("mail outbox batch failed")
+        finally:
+            _incr(batches=1, last_batch_seconds=round(time.monotonic() - started, 3))
+            db.session.remove()
+
+
+def _mark_sent(row: MailOutbox) -> None:
+    row.status = StatusMail.SENT
+    row.attempts = (row.attempts or 0) + 1
+    row.sent_at = _now()
+    row.claim_token = None
+    row.locked_at = None
+    row.last_error = None
+    _incr(sent=1)
+
+
+def _mark_retry(row: MailOutbox, ex: Exception) -> None:
+    row.attempts = (row.attempts or 0) + 1
+    row.last_error = f"{type(ex).__name__}: {ex}"[:255]
+    row.claim_token = None
+    row.locked_at = None
+    if row.attempts >= MAIL_MAX_ATTEMPTS:
+        row.status = StatusMail.FAILED
+        _incr(failed=1, last_error=row.last_error)
+    else:
+        row.status = StatusMail.PENDING
+        row.next_attempt_at = _now() + timedelta(seconds=_backoff_seconds(row.attempts))
+        _incr(retried=1, last_error=row.last_error)
+
+
+class MailOutboxWorker:
+    """Thread điều phối: chờ wake() hoặc hết MAIL_POLL_SECONDS, rồi chia lô cho thread pool."""
+
+    def __init__(self, workers: int = MAIL_WORKERS, batch_size: int = MAIL_BATCH_SIZE):
+        self.workers = workers
+        self.batch_size = batch_size
+        self._event = threading.Event()
+        self._thread = None
+        self._pool = None
+        self._app = None
+
+    def start(self, app) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._app = app
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="mail-outbox")
+        self._thread = threading.Thread(target=self._loop, name="mail-outbox-dispatcher", daemon=True)
+        self._thread.start()
+        print("[MAIL] outbox worker started")
+
+    def wake(self) -> None:
+        self._event.set()
+
+    def _loop(self) -> None:
+        while True:
+            self._event.wait(MAIL_POLL_SECONDS)
+            self._event.clear()
+            try:
+                self.drain()
+            except Exception:
+                self._app.logger.exception("mail outbox dispatcher failed")
+
+    def drain(self) -> int:
+        """Gửi hết mail đến hạn; trả về số mail đã nhận xử lý."""
+        handled = 0
+        with self._app.app_context():
+            try:
+                while True:
+                    rows = _claim_batch(self.batch_size * self.workers)
+                    if not rows:
+                        break
+                    ids = [r.mail_id for r in rows]
+                    handled += len(ids)
+                    chunks = [ids[i:i + self.batch_size] for i in range(0, len(ids), self.batch_size)]
+                    futures = [self._pool.submit(_send_batch, self._app, c) for c in chunks]
+                    for f in futures:
+                        f.result()
+            finally:
+                db.session.remove()
+        return handled
+
+
+worker = MailOutboxWorker()
@@ -0,0 +1,40 @@
+"""order.idempotency_key cho checkout VNPay idempotent
+
+Revision ID: 0001_order_idempotency_key
+Revises:
+Create Date: 2026-10-19 15:36:02
+
+Bảng `order` có sẵn từ db.create_all() (create_all không thêm cột vào bảng đã có).
+DB mới tạo bằng create_all đã có cột -> bỏ qua.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0001_order_idempotency_key'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def _columns(table):
+    return {c["name"] for c in sa.inspect(op.get_bind()).get_columns(table)}
+
+
+def _has_unique(table, column):
+    insp = sa.inspect(op.get_bind())
+    uniques = [u["column_names"] for u in insp.get_unique_constraints(table)]
+    uniques += [i["column_names"] for i in insp.get_indexes(table) if i.get("unique")]
+    return [column] in uniques
+
+
+def upgrade():
+    if "idempotency_key" not in _columns("order"):
+        op.add_column("order", sa.Column("idempotency_key", sa.String(64), nullable=True))
+    if not _has_unique("order", "idempotency_key"):
+        op.create_unique_constraint("uq_order_idempotency_key", "order", ["idempotency_key"])
+
+
+def downgrade():
+    op.drop_column("order", "idempotency_key")
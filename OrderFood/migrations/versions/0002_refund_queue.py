@@ -0,0 +1,81 @@
+"""refund: cột hàng đợi hoàn tiền + StatusRefund.PROCESSING
+
+Revision ID: 0002_refund_queue
+Revises: 0001_order_idempotency_key
+Create Date: 2026-10-19 15:38:48
+
+Thêm amount, attempts, next_attempt_at, claim_token, locked_at, last_error, gateway_ref
+(refund_queue.py) và nới ENUM status_refund_enum trên MySQL. Cột / index đã có thì bỏ qua.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002_refund_queue'
+down_revision = '0001_order_idempotency_key'
+branch_labels = None
+depends_on = None
+
+OLD_STATUS = ("REQUESTED", "COMPLETED", "FAILED")
+NEW_STATUS = ("REQUESTED", "PROCESSING", "COMPLETED", "FAILED")
+
+COLUMNS = [
+    sa.Column("amount", sa.Integer(), nullable=True),
+    sa.Column("attempts", sa.Integer(), nullable=False, server_default="0"),
+    sa.Column("next_attempt_at", sa.DateTime(), nullable=True),
+    sa.Column("claim_token", sa.String(32), nullable=True),
+    sa.Column("locked_at", sa.DateTime(), nullable=True),
+    sa.Column("last_error", sa.String(255), nullable=True),
+    sa.Column("gateway_ref", sa.String(64), nullable=True),
+]
+
+
+def _columns(table):
+    return {c["name"] for c in sa.inspect(op.get_bind()).get_columns(table)}
+
+
+def _indexes(table):
+    return {i["name"] for i in sa.inspect(op.get_bind()).get_indexes(table)}
+
+
+def _alter_status(old, new):
+    if op.get_bind().dialect.name != "mysql":
+        return
+    op.alter_column("refund", "status",
+                    existing_type=sa.Enum(*old, name="status_refund_enum"),
+                    type_=sa.Enum(*new, name="status_refund_enum"),
+                    existing_nullable=False)
+
+
+def upgrade():
+    _alter_status(OLD_STATUS, NEW_STATUS)
+
+    existing = _columns("refund")
+    for col in COLUMNS:
+        if col.name not in existing:
+            op.add_column("refund", col.copy())
+
+    # refund cũ: số tiền lấy từ payment, đến hạn xử lý ngay
+    op.execute("UPDATE refund r JOIN payment p ON p.payment_id = r.payment_id "
+               "SET r.amount = p.amount WHERE r.amount IS NULL"
+               if op.get_bind().dialect.name == "mysql" else
+               "UPDATE refund SET amount = (SELECT amount FROM payment "
+               "WHERE payment.payment_id = refund.payment_id) WHERE amount IS NULL")
+    op.execute("UPDATE refund SET next_attempt_at = created_at "
+               "WHERE next_attempt_at IS NULL AND status = 'REQUESTED'")
+
+    indexes = _indexes("refund")
+    if "ix_refund_claim_token" not in indexes:
+        op.create_index("ix_refund_claim_token", "refund", ["claim_token"])
+    if "ix_refund_status_next" not in indexes:
+        op.create_index("ix_refund_status_next", "refund", ["status", "next_attempt_at"])
+
+
+def downgrade():
+    op.drop_index("ix_refund_status_next", table_name="refund")
+    op.drop_index("ix_refund_claim_token", table_name="refund")
+    for col in reversed(COLUMNS):
+        op.drop_column("refund", col.name)
+    op.execute("UPDATE refund SET status = 'REQUESTED' WHERE status = 'PROCESSING'")
+    _alter_status(NEW_STATUS, OLD_STATUS)
@@ -0,0 +1,35 @@
+"""payment: vnp_TransactionNo + vnp_PayDate cho API hoàn tiền
+
+Revision ID: 0003_payment_vnp_transaction
+Revises: 0002_refund_queue
+Create Date: 2026-10-19 15:38:48
+
+Payment đã PAID trước revision này không có 2 giá trị -> refund gửi TransactionNo rỗng và
+ngày = payment.created_at (như trước); đối soát lại với VNPay nếu bị từ chối.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003_payment_vnp_transaction'
+down_revision = '0002_refund_queue'
+branch_labels = None
+depends_on = None
+
+
+def _columns(table):
+    return {c["name"] for c in sa.inspect(op.get_bind()).get_columns(table)}
+
+
+def upgrade():
+    existing = _columns("payment")
+    if "vnp_transaction_no" not in existing:
+        op.add_column("payment", sa.Column("vnp_transaction_no", sa.String(32), nullable=True))
+    if "vnp_pay_date" not in existing:
+        op.add_column("payment", sa.Column("vnp_pay_date", sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    op.drop_column("payment", "vnp_pay_date")
+    op.drop_column("payment", "vnp_transaction_no")
@@ -0,0 +1,30 @@
+"""event_checkpoint: các khoảng event_id bị bỏ qua, chờ transaction commit muộn
+
+Revision ID: 0004_event_checkpoint_gaps
+Revises: 0003_payment_vnp_transaction
+Create Date: 2026-10-19 17:02:11
+
+Lỗ bị bỏ qua trước revision này không được ghi lại -> không đọc lại được.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0004_event_checkpoint_gaps'
+down_revision = '0003_payment_vnp_transaction'
+branch_labels = None
+depends_on = None
+
+
+def _columns(table):
+    return {c["name"] for c in sa.inspect(op.get_bind()).get_columns(table)}
+
+
+def upgrade():
+    if "gaps" not in _columns("event_checkpoint"):
+        op.add_column("event_checkpoint", sa.Column("gaps", sa.JSON(), nullable=True))
+
+
+def downgrade():
+    op.drop_column("event_checkpoint", "gaps")
@@ -0,0 +1,41 @@
+"""order: index ghép cho phân trang keyset (created_date, order_id)
+
+Revision ID: 0005_order_keyset_indexes
+Revises: 0004_event_checkpoint_gaps
+Create Date: 2026-10-19 18:20:41
+
+create_all không thêm index vào bảng `order` đã có. Thiếu index thì truy vấn keyset / bảng đơn
+của admin, owner và lịch sử đơn của khách quét cả bảng + filesort.
+Index đã có (DB tạo mới bằng create_all) thì bỏ qua.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0005_order_keyset_indexes'
+down_revision = '0004_event_checkpoint_gaps'
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ("ix_order_status_created", ["status", "created_date", "order_id"]),
+    ("ix_order_restaurant_created", ["restaurant_id", "created_date", "order_id"]),
+    ("ix_order_customer_created", ["customer_id", "created_date", "order_id"]),    # lịch sử đơn của khách
+]
+
+
+def _indexes(table):
+    return {i["name"] for i in sa.inspect(op.get_bind()).get_indexes(table)}
+
+
+def upgrade():
+    existing = _indexes("order")
+    for name, columns in INDEXES:
+        if name not in existing:
+            op.create_index(name, "order", columns)
+
+
+def downgrade():
+    for name, _ in reversed(INDEXES):
+        op.drop_index(name, table_name="order")
@@ -49,10 +49,18 @@ class StatusPayment(Enum):
 
 class StatusRefund(Enum):
     REQUESTED = "REQUESTED"
+    PROCESSING = "PROCESSING"
     COMPLETED = "COMPLETED"
     FAILED = "FAILED"
 
 
+class StatusMail(Enum):
+    PENDING = "PENDING"
+    SENDING = "SENDING"
+    SENT = "SENT"
+    FAILED = "FAILED"
+
+
 # =========================
 # USER + ROLES
 # =========================
@@ -242,6 +250,15 @@ class Order(db.Model):
     )
     canceled_by = db.Column(SAEnum(Role, name="order_canceled_by_enum"), nullable=True)
 
+    # checkout idempotent: key do client gửi (bản chụp giá các món nằm ở order_line)
+    idempotency_key = db.Column(db.String(64), nullable=True, unique=True)
+
+    __table_args__ = (
+        # keyset phân trang theo (created_date, order_id) + filter status / nhà hàng
+        Index("ix_order_status_created", "status", "created_date", "order_id"),
+        Index("ix_order_restaurant_created", "restaurant_id", "created_date", "order_id"),
+        Index("ix_order_customer_created", "customer_id", "created_date", "order_id"),
+    )
 
     customer = db.relationship("Customer", backref=db.backref("orders", cascade="all, delete-orphan"))
     restaurant = db.relationship("Restaurant", backref=db.backref("orders", cascade="all, delete-orphan"))
@@ -266,6 +283,34 @@ class Order(db.Model):
         return datetime.now(timezone.utc) >= et
 
 
+class OrderLine(db.Model):
+    """
+    Bản chụp món của đơn lúc checkout (tên, giá, số lượng) — không phụ thuộc cart / dish hiện tại.
+    created_date chép từ order để thống kê theo nhà hàng + khoảng thời gian chỉ quét 1 bảng.
+    """
+    __tablename__ = "order_line"
+
+    order_line_id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    order_id = db.Column(db.Integer, db.ForeignKey("order.order_id", ondelete="CASCADE"), nullable=False)
+    restaurant_id = db.Column(db.Integer, db.ForeignKey("restaurant.restaurant_id"), nullable=False)
+    dish_id = db.Column(db.Integer, db.ForeignKey("dish.dish_id", ondelete="SET NULL"), nullable=True)
+    dish_name = db.Column(db.String(255), nullable=False)
+    unit_price = db.Column(db.Float, nullable=False)
+    quantity = db.Column(db.Integer, nullable=False, default=1)
+    note = db.Column(db.String(255))
+    created_date = db.Column(db.DateTime, nullable=False)
+
+    __table_args__ = (
+        Index("ix_order_line_order", "order_id"),
+        Index("ix_order_line_restaurant_created", "restaurant_id", "created_date", "dish_id"),
+    )
+
+    order = db.relationship("Order", backref=db.backref("lines", cascade="all, delete-orphan",
+                                                        order_by="OrderLine.order_line_id"))
+
+    @property
+    def subtotal(self) -> float:
+        return (self.unit_price or 0) * (self.quantity or 0)
 
 
 class Notification(db.Model):
@@ -321,8 +366,9 @@ class Payment(db.Model):
         default=lambda: datetime.now(ZoneInfo("Asia/Ho_Chi_Minh"))
     )
 
-
-
+    # VNPay trả về khi xác nhận thanh toán (return / IPN) — API hoàn tiền cần 2 giá trị này
+    vnp_transaction_no = db.Column(db.String(32), nullable=True)  # vnp_TransactionNo
+    vnp_pay_date = db.Column(db.DateTime, nullable=True)          # vnp_PayDate (GMT+7)
 
     order = db.relationship("Order", backref=db.backref("payment", uselist=False))
 
@@ -336,8 +382,15 @@ class Refund(db.Model):
     status = db.Column(SAEnum(StatusRefund, name="status_refund_enum"),
                        nullable=False, default=StatusRefund.REQUESTED)
     reason = db.Column(db.String(255))
+    amount = db.Column(db.Integer, nullable=True)  # VND * 100 (như payment.amount)
 
-
+    # hàng đợi xử lý hoàn tiền (refund_queue.py)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=True)
+    claim_token = db.Column(db.String(32), nullable=True, index=True)
+    locked_at = db.Column(db.DateTime, nullable=True)
+    last_error = db.Column(db.String(255), nullable=True)
+    gateway_ref = db.Column(db.String(64), nullable=True)
 
     created_at =  db.Column(
         db.DateTime,
@@ -345,4 +398,132 @@ class Refund(db.Model):
     )
     completed_at = db.Column(db.DateTime)
 
+    __table_args__ = (
+        Index("ix_refund_status_next", "status", "next_attempt_at"),
+    )
+
     payment = db.relationship("Payment", backref=db.backref("refunds", cascade="all, delete-orphan"))
+
+
+# =========================
+# MAIL OUTBOX (hàng đợi email gửi nền)
+# =========================
+class MailOutbox(db.Model):
+    __tablename__ = "mail_outbox"
+
+    mail_id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    recipients = db.Column(db.String(500), nullable=False)  # phân tách bằng dấu phẩy
+    subject = db.Column(db.String(255), nullable=False)
+    body = db.Column(db.Text)
+    html = db.Column(db.Text)
+
+    status = db.Column(SAEnum(StatusMail, name="status_mail_enum"), nullable=False, default=StatusMail.PENDING)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False,
+                                default=lambda: datetime.now(ZoneInfo("Asia/Ho_Chi_Minh")))
+    claim_token = db.Column(db.String(32), nullable=True, index=True)
+    locked_at = db.Column(db.DateTime, nullable=True)
+    last_error = db.Column(db.String(255))
+
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(ZoneInfo("Asia/Ho_Chi_Minh")))
+    sent_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index("ix_mail_outbox_status_next", "status", "next_attempt_at"),
+    )
+
+
+# =========================
+# ORDER EVENT OUTBOX (ghi cùng transaction đổi trạng thái đơn, dispatcher nền xử lý)
+# =========================
+class OrderEvent(db.Model):
+    __tablename__ = "order_event"
+
+    event_id = db.Column(db.BigInteger, primary_key=True, autoincrement=True)
+    order_id = db.Column(db.Integer, nullable=False, index=True)   # không FK: event giữ lại khi xoá đơn
+    restaurant_id = db.Column(db.Integer, nullable=False)
+    customer_id = db.Column(db.Integer, nullable=True)
+    transition = db.Column(db.String(32), nullable=False)          # order_state_machine: accept, complete, ...
+    status = db.Column(db.String(16), nullable=False)              # trạng thái sau khi chuyển
+    payload = db.Column(db.JSON, nullable=True)                    # vd: {"reason": "..."}
+    created_at = db.Column(db.DateTime, nullable=False,
+                           default=lambda: datetime.now(ZoneInfo("Asia/Ho_Chi_Minh")))
+
+    @property
+    def data(self) -> dict:
+        return self.payload or {}
+
+
+class EventCheckpoint(db.Model):
+    """Vị trí đã xử lý tới (event_id) của từng consumer."""
+    __tablename__ = "event_checkpoint"
+
+    consumer = db.Column(db.String(64), primary_key=True)
+    last_event_id = db.Column(db.BigInteger, nullable=False, default=0)
+    gaps = db.Column(db.JSON, nullable=True)   # [[lo, hi, lần đầu thấy], ...] id bỏ qua, chờ commit muộn
+    updated_at = db.Column(db.DateTime, default=lambda: datetime.now(ZoneInfo("Asia/Ho_Chi_Minh")))
+
+
+class OrderDailyRollup(db.Model):
+    """Số đơn theo ngày / nhà hàng, cộng dồn từ order_event (consumer "rollup")."""
+    __tablename__ = "order_daily_rollup"
+
+    day = db.Column(db.Date, primary_key=True)
+    restaurant_id = db.Column(db.Integer, primary_key=True)
+    paid_orders = db.Column(db.Integer, nullable=False, default=0)
+    accepted_orders = db.Column(db.Integer, nullable=False, default=0)
+    completed_orders = db.Column(db.Integer, nullable=False, default=0)
+    canceled_orders = db.Column(db.Integer, nullable=False, default=0)
+    completed_revenue = db.Column(db.Float, nullable=False, default=0)
+
+
+# =========================
+# ANALYTICS (bảng tổng hợp, do batch job ghi)
+# =========================
+class CohortSummary(db.Model):
+    __tablename__ = "cohort_summary"
+
+    # cohort = tháng đăng ký, dạng "YYYY-MM"
+    cohort = db.Column(db.String(7), primary_key=True)
+    size = db.Column(db.Integer, nullable=False, default=0)
+    ordered_customers = db.Column(db.Integer, nullable=False, default=0)
+    repeat_customers = db.Column(db.Integer, nullable=False, default=0)
+    churned_customers = db.Column(db.Integer, nullable=False, default=0)
+    computed_at = db.Column(db.DateTime, default=lambda: datetime.now(ZoneInfo("Asia/Ho_Chi_Minh")))
+
+
+class CohortRetention(db.Model):
+    __tablename__ = "cohort_retention"
+
+    cohort = db.Column(db.String(7), primary_key=True)
+    # số tháng kể từ tháng đăng ký (0 = chính tháng đăng ký)
+    period = db.Column(db.SmallInteger, primary_key=True, autoincrement=False)
+    active_customers = db.Column(db.Integer, nullable=False, default=0)
+    orders = db.Column(db.Integer, nullable=False, default=0)
+
+
+# =========================
+# PAYOUT (đối soát trả tiền cho nhà hàng theo kỳ)
+# =========================
+class PayoutStatement(db.Model):
+    __tablename__ = "payout_statement"
+
+    statement_id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    restaurant_id = db.Column(db.Integer, db.ForeignKey("restaurant.restaurant_id"), nullable=False)
+    period_start = db.Column(db.Date, nullable=False)
+    period_end = db.Column(db.Date, nullable=False)          # không bao gồm
+    completed_orders = db.Column(db.Integer, nullable=False, default=0)
+    gross_revenue = db.Column(db.Float, nullable=False, default=0)
+    refunded_orders = db.Column(db.Integer, nullable=False, default=0)
+    refunded_amount = db.Column(db.Float, nullable=False, default=0)
+    commission_rate = db.Column(db.Float, nullable=False, default=0)
+    commission = db.Column(db.Float, nullable=False, default=0)
+    net_payout = db.Column(db.Float, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(ZoneInfo("Asia/Ho_Chi_Minh")))
+
+    __table_args__ = (
+        UniqueConstraint("restaurant_id", "period_start", "period_end", name="uq_payout_restaurant_period"),
+        Index("ix_payout_period", "period_start", "period_end"),
+    )
+
+    restaurant = db.relationship("Restaurant")
@@ -5,7 +5,7 @@ from datetime import datetime, timezone
 from zoneinfo import ZoneInfo
 
 from flask import Blueprint, jsonify, session, request, url_for, abort
-from sqlalchemy import select, desc
+from sqlalchemy import select, desc, insert
 
 from OrderFood import db
 from OrderFood.models import Notification, Restaurant, Order
@@ -54,7 +54,36 @@ def _add_noti(order_id: int, message: str, *, customer_id: int | None, owner_id:
         create_at=_now(),
     )
     db.session.add(n)
-    db.session.commit()
+    db.session.flush()  # commit cùng nghiệp vụ (unit of work cuối request)
+
+
+def add_notis_bulk(rows) -> int:
+    """
+    Thêm nhiều thông báo bằng 1 câu INSERT (executemany), không tạo object ORM.
+    rows: [{"order_id", "message", "customer_id", "owner_id"}, ...]
+    """
+    now = _now()
+    payload = [{
+        "order_id": r["order_id"],
+        "message": r["message"][:255],
+        "customer_id": r.get("customer_id"),
+        "owner_id": r.get("owner_id"),
+        "is_read": False,
+        "create_at": now,
+    } for r in rows]
+    if payload:
+        db.session.execute(insert(Notification), payload)
+    return len(payload)
+
+
+def owner_cancel_message(order_id: int, reason: str | None) -> str:
+    reason = (reason or "").strip()
+    if reason:
+        return f'Đơn hàng #{order_id} của bạn bị hủy bởi phía nhà hàng với lý do "{reason}".'
+    return f"Đơn hàng #{order_id} của bạn bị hủy bởi phía nhà hàng."
+
+
+COMPLETED_MESSAGE = "Đơn hàng đã được giao thành công"
 
 
 # ========= Pushers (gọi từ nghiệp vụ) =========
@@ -70,7 +99,7 @@ def push_owner_noti_on_paid(order: Order) -> None:
 def push_customer_noti_on_completed(order: Order) -> None:
     """Khi đơn COMPLETED -> noti cho CUSTOMER."""
     if order.customer_id:
-        _add_noti(order.order_id, "Đơn hàng đã được giao thành công",
+        _add_noti(order.order_id, COMPLETED_MESSAGE,
                   customer_id=order.customer_id, owner_id=None)
 
 
@@ -87,12 +116,8 @@ def push_customer_noti_on_owner_cancel(order: Order, reason: str) -> None:
     """Khi chủ nhà hàng hủy đơn -> noti cho CUSTOMER kèm lý do."""
     if not order or not order.customer_id:
         return
-    reason = (reason or "").strip()
-    if reason:
-        msg = f'Đơn hàng #{order.order_id} của bạn bị hủy bởi phía nhà hàng với lý do "{reason}".'
-    else:
-        msg = f"Đơn hàng #{order.order_id} của bạn bị hủy bởi phía nhà hàng."
-    _add_noti(order.order_id, msg, customer_id=order.customer_id, owner_id=None)
+    _add_noti(order.order_id, owner_cancel_message(order.order_id, reason),
+              customer_id=order.customer_id, owner_id=None)
 
 
 # ========= Blueprint API =========
@@ -158,7 +183,6 @@ def notifications_mark_read():
         q = q.filter(Notification.customer_id == uid)
 
     updated = q.update({"is_read": True}, synchronize_session=False)
-    db.session.commit()
     return jsonify({"ok": True, "updated": int(updated or 0)})
 
 
@@ -174,7 +198,6 @@ def notifications_mark_read_one(noti_id: int):
 
     if not n.is_read:
         n.is_read = True
-        db.session.commit()
     return jsonify({"ok": True})
 
 
@@ -190,5 +213,4 @@ def notifications_mark_all_read():
         q = q.filter_by(customer_id=uid)
 
     updated = q.update({"is_read": True}, synchronize_session=False)
-    db.session.commit()
     return jsonify({"ok": True, "updated": int(updated or 0)})
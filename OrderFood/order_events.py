@@ -0,0 +1,435 @@
+# OrderFood/order_events.py
+"""
+Outbox order_event: mọi lần đổi trạng thái đơn ghi 1 dòng event trong CÙNG transaction.
+
+- record_events(): 1 câu INSERT ... SELECT từ bảng order (lấy luôn restaurant_id, customer_id),
+  gọi từ order_state_machine. Request chỉ UPDATE đơn + INSERT event rồi trả về.
+- OrderEventDispatcher (1 thread nền): đọc order_event theo lô cho từng consumer đã đăng ký,
+  gọi handler rồi lưu checkpoint (event_checkpoint.last_event_id) trong cùng transaction
+  với dữ liệu handler ghi -> handler lỗi thì cả lô được đọc lại ở lần sau, consumer khác không bị ảnh hưởng.
+- Checkpoint được khoá (SELECT ... FOR UPDATE) khi xử lý -> nhiều process chạy dispatcher không xử lý trùng.
+- Consumer local=True (cấu trúc trong RAM: cache, hàng đợi bếp...) giữ vị trí trong RAM của từng process,
+  bắt đầu từ event mới nhất lúc khởi động -> mọi process đều nhận đủ event, không ghi checkpoint.
+- event_id là auto increment nhưng transaction commit không theo thứ tự id: gặp "lỗ" (id còn thiếu)
+  mới hơn ORDER_EVENT_GAP_SECONDS thì dừng lô ở trước lỗ, đợi transaction kia commit.
+  Lỗ cũ hơn thì đi tiếp nhưng ghi lại khoảng id (event_checkpoint.gaps; consumer local giữ trong RAM)
+  và đọc lại ở mỗi lô: event commit muộn vẫn được giao (trễ, không theo thứ tự). Quá
+  ORDER_EVENT_GAP_MAX_SECONDS mà vẫn trống thì coi như rollback / id bị nhảy và bỏ hẳn.
+
+Consumer mặc định: notifications, rollup (order_daily_rollup), email (mail_outbox),
+cache (số đơn theo trạng thái của nhà hàng / khách), trending (bảng món hot trong RAM).
+"""
+import os
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+from sqlalchemy import func, insert, literal, or_, select
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.exc import IntegrityError
+
+from OrderFood import db
+from OrderFood.models import (
+    Order, OrderEvent, EventCheckpoint, OrderDailyRollup, Restaurant, User,
+)
+
+_TZ = ZoneInfo("Asia/Ho_Chi_Minh")
+
+ORDER_EVENT_BATCH_SIZE = int(os.getenv("ORDER_EVENT_BATCH_SIZE", "200"))
+ORDER_EVENT_POLL_SECONDS = float(os.getenv("ORDER_EVENT_POLL_SECONDS", "5"))
+ORDER_EVENT_GAP_SECONDS = float(os.getenv("ORDER_EVENT_GAP_SECONDS", "10"))
+ORDER_EVENT_GAP_MAX_SECONDS = float(os.getenv("ORDER_EVENT_GAP_MAX_SECONDS", "900"))
+ORDER_EVENT_MAX_GAPS = 200    # số khoảng lỗ tối đa theo dõi / consumer (cũ nhất bị bỏ trước)
+
+
+def _now():
+    return datetime.now(_TZ).replace(tzinfo=None)
+
+
+# ========= Metrics =========
+_metrics_lock = threading.Lock()
+_metrics = {
+    "events": 0,
+    "batches": 0,
+    "failures": 0,
+    "late_events": 0,
+    "gaps_expired": 0,
+    "last_batch_seconds": None,
+    "last_error": None,
+}
+
+
+def _incr(**fields):
+    with _metrics_lock:
+        for k, v in fields.items():
+            if isinstance(v, int) and isinstance(_metrics.get(k), int):
+                _metrics[k] += v
+            else:
+                _metrics[k] = v
+
+
+def event_metrics() -> dict:
+    with _metrics_lock:
+        data = dict(_metrics)
+    head = db.session.query(func.max(OrderEvent.event_id)).scalar() or 0
+    checkpoints = {r.consumer: r for r in db.session.query(EventCheckpoint.consumer, EventCheckpoint.last_event_id,
+                                                            EventCheckpoint.gaps)}
+    data["head"] = int(head)
+    data["consumers"] = {}
+    for name, c in dispatcher.consumers.items():
+        if c.local:
+            pos, gaps = dispatcher.positions.get(name, head), dispatcher.gaps.get(name)
+        else:
+            cp = checkpoints.get(name)
+            pos, gaps = (cp.last_event_id, cp.gaps) if cp else (0, None)
+        data["consumers"][name] = {"checkpoint": int(pos or 0), "lag": int(head) - int(pos or 0),
+                                   "gaps": len(gaps or []), "local": c.local}
+    return data
+
+
+# ========= Ghi event (trong transaction của nghiệp vụ) =========
+def record_events(transition: str, status, order_ids, data: dict | None = None) -> int:
+    """1 câu INSERT ... SELECT cho cả lô. Không commit; dispatcher được đánh thức sau commit."""
+    order_ids = list(order_ids or [])
+    if not order_ids:
+        return 0
+    src = (select(Order.order_id, Order.restaurant_id, Order.customer_id,
+                  literal(transition), literal(getattr(status, "value", status)),
+                  literal(data or None, type_=OrderEvent.payload.type), literal(_now()))
+           .where(Order.order_id.in_(order_ids)))
+    n = db.session.execute(
+        insert(OrderEvent).from_select(
+            ["order_id", "restaurant_id", "customer_id", "transition", "status", "payload", "created_at"], src)
+    ).rowcount or 0
+
+    from OrderFood.unit_of_work import on_commit
+    on_commit(dispatcher.wake)
+    return n
+
+
+# ========= Dispatcher =========
+class Consumer:
+    __slots__ = ("name", "fn", "transitions", "after_commit", "local")
+
+    def __init__(self, name: str, fn, transitions=None, after_commit=None, local: bool = False):
+        self.name = name
+        self.fn = fn                                   # fn(events: list[OrderEvent]), không commit
+        self.transitions = frozenset(transitions) if transitions else None
+        self.after_commit = after_commit               # gọi sau khi lô commit (vd: đánh thức worker)
+        self.local = local                             # vị trí giữ trong RAM của process
+
+
+def _contiguous(rows, last_id: int, now: datetime) -> tuple[list, list]:
+    """
+    Cắt lô ở "lỗ" event_id còn mới (transaction chưa commit). Lỗ cũ hơn ORDER_EVENT_GAP_SECONDS thì
+    đi tiếp, trả về kèm các khoảng (lo, hi) đã bỏ qua để kiểm tra lại sau.
+    """
+    out, skipped = [], []
+    expected = last_id + 1
+    for r in rows:
+        if r.event_id != expected:
+            if r.created_at and r.created_at > now - timedelta(seconds=ORDER_EVENT_GAP_SECONDS):
+                break
+            skipped.append((expected, r.event_id - 1))
+        out.append(r)
+        expected = r.event_id + 1
+    return out, skipped
+
+
+def _update_gaps(gaps, late_ids, skipped, now: datetime) -> tuple[list, list]:
+    """
+    gaps: [[lo, hi, lần đầu thấy (ISO)], ...]. Bỏ các id đã tới muộn (tách khoảng nếu cần),
+    bỏ khoảng quá ORDER_EVENT_GAP_MAX_SECONDS, thêm khoảng mới bỏ qua.
+    Trả về (gaps mới, các khoảng hết hạn).
+    """
+    late_ids = sorted(late_ids)
+    expire = now - timedelta(seconds=ORDER_EVENT_GAP_MAX_SECONDS)
+    out, expired = [], []
+    for lo, hi, since in gaps or []:
+        start = lo
+        for i in late_ids:
+            if start <= i <= hi:
+                if i > start:
+                    out.append([start, i - 1, since])
+                start = i + 1
+        if start > hi:
+            continue
+        if datetime.fromisoformat(since) < expire:
+            expired.append((start, hi))
+        else:
+            out.append([start, hi, since])
+    out.extend([lo, hi, now.isoformat()] for lo, hi in skipped)
+    if len(out) > ORDER_EVENT_MAX_GAPS:
+        expired.extend((lo, hi) for lo, hi, _ in out[:-ORDER_EVENT_MAX_GAPS])
+        out = out[-ORDER_EVENT_MAX_GAPS:]
+    return out, expired
+
+
+class OrderEventDispatcher:
+    """Thread nền: chờ wake() hoặc hết ORDER_EVENT_POLL_SECONDS, chạy lần lượt từng consumer."""
+
+    def __init__(self, batch_size: int = ORDER_EVENT_BATCH_SIZE):
+        self.batch_size = batch_size
+        self.consumers: dict[str, Consumer] = {}
+        self.positions: dict[str, int] = {}            # vị trí của consumer local
+        self.gaps: dict[str, list] = {}                # khoảng lỗ đang chờ của consumer local
+        self._event = threading.Event()
+        self._thread = None
+        self._app = None
+
+    def register(self, name: str, transitions=None, after_commit=None, local: bool = False):
+        """@dispatcher.register("email", transitions=[COMPLETE]) -> fn(events)."""
+        def decorator(fn):
+            self.consumers[name] = Consumer(name, fn, transitions, after_commit, local)
+            return fn
+        return decorator
+
+    def start(self, app) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._app = app
+        self._thread = threading.Thread(target=self._loop, name="order-event-dispatcher", daemon=True)
+        self._thread.start()
+        print("[EVENT] dispatcher started")
+
+    def wake(self) -> None:
+        self._event.set()
+
+    def _loop(self) -> None:
+        while True:
+            self._event.wait(ORDER_EVENT_POLL_SECONDS)
+            self._event.clear()
+            try:
+                self.drain()
+            except Exception:
+                self._app.logger.exception("order event dispatcher failed")
+
+    def drain(self) -> int:
+        """Chạy mọi consumer tới hết event hiện có; trả về tổng số event đã xử lý."""
+        handled = 0
+        with self._app.app_context():
+            try:
+                for c in list(self.consumers.values()):
+                    while True:
+                        n = self._run_batch(c)
+                        handled += n
+                        if n < self.batch_size:
+                            break
+            finally:
+                db.session.remove()
+        return handled
+
+    def _checkpoint(self, name: str) -> EventCheckpoint:
+        cp = db.session.get(EventCheckpoint, name, with_for_update=True)
+        if cp is None:
+            try:
+                db.session.add(EventCheckpoint(consumer=name, last_event_id=0, updated_at=_now()))
+                db.session.commit()
+            except IntegrityError:
+                db.session.rollback()   # process khác vừa tạo
+            cp = db.session.get(EventCheckpoint, name, with_for_update=True, populate_existing=True)
+        return cp
+
+    def _read(self, last_id: int, gaps) -> tuple[list, list, list, list]:
+        """Trả về (event tới muộn trong các lỗ, lô mới liền mạch, gaps mới, khoảng hết hạn)."""
+        now = _now()
+        rows = (OrderEvent.query
+                .filter(OrderEvent.event_id > last_id)
+                .order_by(OrderEvent.event_id)
+                .limit(self.batch_size)
+                .all())
+        rows, skipped = _contiguous(rows, int(last_id), now)
+        late = []
+        if gaps:
+            late = (OrderEvent.query
+                    .filter(or_(*(OrderEvent.event_id.between(lo, hi) for lo, hi, _ in gaps)))
+                    .order_by(OrderEvent.event_id)
+                    .limit(self.batch_size)
+                    .all())
+        new_gaps, expired = _update_gaps(gaps, [r.event_id for r in late], skipped, now)
+        return late, rows, new_gaps, expired
+
+    def _run_local(self, c: Consumer) -> tuple[list, list, list]:
+        if c.name not in self.positions:
+            # process mới khởi động: cấu trúc trong RAM tự nạp từ DB, chỉ cần event từ giờ trở đi
+            self.positions[c.name] = int(db.session.query(func.max(OrderEvent.event_id)).scalar() or 0)
+        late, rows, gaps, expired = self._read(self.positions[c.name], self.gaps.get(c.name))
+        events = late + rows
+        mine = [r for r in events if c.transitions is None or r.transition in c.transitions]
+        if mine:
+            c.fn(mine)
+        db.session.rollback()
+        if rows:
+            self.positions[c.name] = rows[-1].event_id
+        self.gaps[c.name] = gaps
+        return events, mine, expired
+
+    def _run_batch(self, c: Consumer) -> int:
+        started = time.monotonic()
+        try:
+            if c.local:
+                events, mine, expired = self._run_local(c)
+            else:
+                cp = self._checkpoint(c.name)
+                late, rows, gaps, expired = self._read(cp.last_event_id, cp.gaps)
+                events = late + rows
+                if not events and not expired and gaps == (cp.gaps or []):
+                    db.session.rollback()
+                    return 0
+
+                mine = [r for r in events if c.transitions is None or r.transition in c.transitions]
+                if mine:
+                    c.fn(mine)
+                if rows:
+                    cp.last_event_id = rows[-1].event_id
+                cp.gaps = gaps or None
+                cp.updated_at = _now()
+                db.session.commit()
+        except Exception as ex:
+            db.session.rollback()
+            _incr(failures=1, last_error=f"{c.name}: {type(ex).__name__}: {ex}"[:255])
+            self._app.logger.exception("order event consumer %s failed", c.name)
+            return 0
+
+        if expired:
+            _incr(gaps_expired=len(expired))
+            self._app.logger.warning("order event consumer %s gave up on event_id gaps %s", c.name, expired)
+        if not events:
+            return 0
+        if len(events) > len(rows):
+            _incr(late_events=len(events) - len(rows))
+        if mine and c.after_commit:
+            try:
+                c.after_commit()
+            except Exception:
+                self._app.logger.exception("order event consumer %s after_commit failed", c.name)
+        _incr(events=len(mine), batches=1, last_batch_seconds=round(time.monotonic() - started, 3))
+        return len(rows)
+
+
+dispatcher = OrderEventDispatcher()
+
+
+# ========= Consumers =========
+from OrderFood.order_state_machine import (   # noqa: E402  (order_state_machine import record_events)
+    PAY, ACCEPT, COMPLETE, OWNER_CANCEL, ADMIN_CANCEL, EXPIRE, EXPIRE_MESSAGE,
+)
+
+
+def _owners(events) -> dict[int, int]:
+    """{restaurant_id: owner user_id} cho cả lô trong 1 câu."""
+    rids = {e.restaurant_id for e in events}
+    return dict(db.session.query(Restaurant.restaurant_id, Restaurant.res_owner_id)
+                .filter(Restaurant.restaurant_id.in_(rids)).all())
+
+
+def _notification_rows(e, owner_id):
+    from OrderFood.notifications import owner_cancel_message, COMPLETED_MESSAGE
+
+    def to_customer(msg):
+        return [{"order_id": e.order_id, "message": msg, "customer_id": e.customer_id, "owner_id": None}] \
+            if e.customer_id else []
+
+    def to_owner(msg):
+        return [{"order_id": e.order_id, "message": msg, "customer_id": None, "owner_id": owner_id}] \
+            if owner_id else []
+
+    if e.transition == PAY:
+        return to_owner("Bạn có 1 đơn hàng cần xác nhận")
+    if e.transition == COMPLETE:
+        return to_customer(COMPLETED_MESSAGE)
+    if e.transition == OWNER_CANCEL:
+        return to_customer(owner_cancel_message(e.order_id, e.data.get("reason")))
+    if e.transition == ADMIN_CANCEL:
+        return to_owner(f"Đơn hàng #{e.order_id} của bạn bị hủy bởi phía khách hàng.")
+    if e.transition == EXPIRE:
+        return to_customer(EXPIRE_MESSAGE) + to_owner(EXPIRE_MESSAGE)
+    return []
+
+
+@dispatcher.register("notifications", transitions=[PAY, COMPLETE, OWNER_CANCEL, ADMIN_CANCEL, EXPIRE])
+def _notify(events):
+    from OrderFood.notifications import add_notis_bulk
+
+    owners = _owners(events)
+    rows = []
+    for e in events:
+        rows.extend(_notification_rows(e, owners.get(e.restaurant_id)))
+    add_notis_bulk(rows)
+
+
+_ROLLUP_COLUMNS = {
+    PAY: "paid_orders",
+    ACCEPT: "accepted_orders",
+    COMPLETE: "completed_orders",
+    OWNER_CANCEL: "canceled_orders",
+    ADMIN_CANCEL: "canceled_orders",
+    EXPIRE: "canceled_orders",
+}
+
+
+@dispatcher.register("rollup", transitions=list(_ROLLUP_COLUMNS))
+def _rollup(events):
+    """Cộng dồn vào order_daily_rollup theo (ngày xảy ra event, nhà hàng): 1 câu upsert / lô."""
+    completed = [e.order_id for e in events if e.transition == COMPLETE]
+    revenue = dict(db.session.query(Order.order_id, Order.total_price)
+                   .filter(Order.order_id.in_(completed)).all()) if completed else {}
+
+    acc = defaultdict(lambda: defaultdict(float))
+    for e in events:
+        key = (e.created_at.date(), e.restaurant_id)
+        acc[key][_ROLLUP_COLUMNS[e.transition]] += 1
+        if e.transition == COMPLETE:
+            acc[key]["completed_revenue"] += float(revenue.get(e.order_id) or 0)
+
+    cols = ("paid_orders", "accepted_orders", "completed_orders", "canceled_orders", "completed_revenue")
+    rows = [{"day": day, "restaurant_id": rid, **{c: v.get(c, 0) for c in cols}}
+            for (day, rid), v in acc.items()]
+    stmt = mysql_insert(OrderDailyRollup).values(rows)
+    stmt = stmt.on_duplicate_key_update({c: getattr(OrderDailyRollup, c) + stmt.inserted[c] for c in cols})
+    db.session.execute(stmt)
+
+
+@dispatcher.register("cache", local=True)
+def _invalidate_cache(events):
+    from OrderFood.dao.order_dao import invalidate_status_counts
+    from OrderFood.dao.customer_dao import invalidate_customer_status_counts
+    invalidate_status_counts({e.restaurant_id for e in events})
+    invalidate_customer_status_counts({e.customer_id for e in events if e.customer_id})
+
+
+def _wake_mail():
+    from OrderFood.mail_outbox import worker
+    worker.wake()
+
+
+@dispatcher.register("email", transitions=[COMPLETE, OWNER_CANCEL, EXPIRE], after_commit=_wake_mail)
+def _email(events):
+    from OrderFood.mail_outbox import enqueue_many
+    from OrderFood.notifications import owner_cancel_message, COMPLETED_MESSAGE
+
+    emails = dict(db.session.query(User.user_id, User.email)
+                  .filter(User.user_id.in_({e.customer_id for e in events if e.customer_id})).all())
+    mails = []
+    for e in events:
+        to = emails.get(e.customer_id)
+        if not to:
+            continue
+        if e.transition == COMPLETE:
+            mails.append((f"Đơn hàng #{e.order_id} đã giao thành công", [to], COMPLETED_MESSAGE, ""))
+        elif e.transition == OWNER_CANCEL:
+            mails.append((f"Đơn hàng #{e.order_id} đã bị hủy", [to],
+                          owner_cancel_message(e.order_id, e.data.get("reason"))
+                          + "\nNếu đã thanh toán, tiền sẽ được hoàn về tài khoản của bạn.", ""))
+        else:
+            mails.append((f"Đơn hàng #{e.order_id} đã bị hủy", [to],
+                          EXPIRE_MESSAGE + ".\nNếu đã thanh toán, tiền sẽ được hoàn về tài khoản của bạn.", ""))
+    enqueue_many(mails)
+
+
+@dispatcher.register("trending", transitions=[COMPLETE], local=True)
+def _trending(events):
+    from OrderFood.trending import record_completed_orders
+    record_completed_orders([e.order_id for e in events])
@@ -0,0 +1,136 @@
+# OrderFood/order_state_machine.py
+"""
+Máy trạng thái đơn hàng: bảng chuyển trạng thái khai báo 1 chỗ + UPDATE có điều kiện.
+
+    order_machine.apply(ACCEPT, order_id, restaurant_id=rid)          -> True nếu chuyển được
+    order_machine.apply_many(OWNER_CANCEL, ids, restaurant_id=rid, reason="...")
+
+- Mỗi lần chuyển là 1 câu
+      UPDATE order SET status=:to, ... WHERE order_id=:id AND status IN (:from) [AND restaurant_id=:rid]
+  rowcount quyết định kết quả: 2 request chạy song song thì chỉ 1 bên thắng, không cần đọc trước.
+- apply_many (thao tác hàng loạt) khoá lô bằng SELECT ... FOR UPDATE (chỉ lấy cột) để trả kết quả
+  theo từng id, rồi cũng chỉ 1 câu UPDATE cho cả lô.
+- Chuyển thành công -> ghi order_event (order_events.record_events, 1 câu INSERT ... SELECT)
+  trong cùng transaction. Thông báo, email, thống kê... do dispatcher nền xử lý. Không commit.
+- Huỷ đơn (OWNER_CANCEL / ADMIN_CANCEL / EXPIRE) xếp hàng hoàn tiền ngay trong transaction đó
+  (refund_queue.enqueue_refunds) — không đi qua outbox, vì event bị bỏ qua là mất tiền của khách.
+- Huỷ đơn còn PENDING (ADMIN_CANCEL) đóng luôn giỏ của đơn (CHECKOUT): giỏ chưa thanh toán vẫn
+  ACTIVE thì checkout lần sau lại gặp đơn đã huỷ của giỏ đó và khách không đặt lại được.
+"""
+from sqlalchemy import select, update
+
+from OrderFood import db
+from OrderFood.models import Order, Cart, StatusOrder, StatusCart, Role
+
+# Tên transition
+CREATE = "create"               # checkout tạo đơn PENDING (ghi event trực tiếp, không qua bảng chuyển)
+PAY = "pay"                     # VNPay xác nhận thanh toán
+ACCEPT = "accept"               # nhà hàng duyệt
+COMPLETE = "complete"           # admin giao hàng xong
+OWNER_CANCEL = "owner_cancel"   # nhà hàng huỷ
+ADMIN_CANCEL = "admin_cancel"   # admin huỷ theo yêu cầu khách
+EXPIRE = "expire"               # quá thời gian chờ xác nhận (job)
+
+EXPIRE_MESSAGE = "Đơn hàng bị hủy do quá thời gian xác nhận"
+
+# Lý do hoàn tiền mặc định theo transition huỷ (khi người huỷ không nhập lý do)
+REFUND_REASONS = {
+    OWNER_CANCEL: "Nhà hàng huỷ đơn",
+    ADMIN_CANCEL: "Huỷ đơn theo yêu cầu khách hàng",
+    EXPIRE: EXPIRE_MESSAGE,
+}
+
+
+class Transition:
+    __slots__ = ("name", "sources", "target", "values")
+
+    def __init__(self, name: str, sources, target: StatusOrder, values: dict | None = None):
+        self.name = name
+        self.sources = tuple(sources)
+        self.target = target
+        self.values = values or {}
+
+
+TRANSITIONS = {t.name: t for t in (
+    Transition(PAY, (StatusOrder.PENDING,), StatusOrder.PAID),
+    Transition(ACCEPT, (StatusOrder.PAID,), StatusOrder.ACCEPTED),
+    Transition(COMPLETE, (StatusOrder.ACCEPTED,), StatusOrder.COMPLETED),
+    Transition(OWNER_CANCEL, (StatusOrder.PAID, StatusOrder.ACCEPTED), StatusOrder.CANCELED,
+               {"canceled_by": Role.RESTAURANT_OWNER}),
+    Transition(ADMIN_CANCEL, (StatusOrder.PENDING, StatusOrder.PAID, StatusOrder.ACCEPTED), StatusOrder.CANCELED,
+               {"canceled_by": Role.CUSTOMER}),
+    Transition(EXPIRE, (StatusOrder.PAID,), StatusOrder.CANCELED,
+               {"canceled_by": Role.RESTAURANT_OWNER}),
+)}
+
+
+class OrderStateMachine:
+    def __init__(self, transitions: dict[str, Transition] = TRANSITIONS):
+        self.transitions = transitions
+
+    def can(self, name: str, status) -> bool:
+        """Kiểm tra (không chạm DB) status hiện tại có được chuyển theo `name` không."""
+        if isinstance(status, str):
+            status = StatusOrder[status]
+        return status in self.transitions[name].sources
+
+    # ----- chuyển trạng thái -----
+    def _update(self, t: Transition, ids, restaurant_id: int | None, values: dict | None):
+        stmt = update(Order).where(Order.order_id.in_(ids), Order.status.in_(t.sources))
+        if restaurant_id is not None:
+            stmt = stmt.where(Order.restaurant_id == restaurant_id)
+        stmt = stmt.values(status=t.target, **t.values, **(values or {}))
+        return db.session.execute(stmt.execution_options(synchronize_session=False)).rowcount or 0
+
+    def apply(self, name: str, order_id: int, *, restaurant_id: int | None = None,
+              values: dict | None = None, **data) -> bool:
+        """
+        1 câu UPDATE có điều kiện. False = đơn không tồn tại / không thuộc nhà hàng / sai trạng thái
+        (người gọi tự đọc lại nếu cần phân biệt). Object Order đã nạp trong session không được làm mới.
+        """
+        t = self.transitions[name]
+        if not self._update(t, [order_id], restaurant_id, values):
+            return False
+        self._emit(t, [order_id], data)
+        return True
+
+    def apply_many(self, name: str, ids: list[int], *, restaurant_id: int | None = None,
+                   values: dict | None = None, **data):
+        """
+        Khoá lô, chuyển các đơn hợp lệ bằng 1 câu UPDATE.
+        Trả về (found: {id: row(order_id, status, customer_id, restaurant_id)}, moved: [id]).
+        """
+        t = self.transitions[name]
+        q = (db.session.query(Order.order_id, Order.status, Order.customer_id, Order.restaurant_id)
+             .filter(Order.order_id.in_(ids)))
+        if restaurant_id is not None:
+            q = q.filter(Order.restaurant_id == restaurant_id)
+        found = {r.order_id: r for r in q.with_for_update().all()}
+        moved = [oid for oid in ids if oid in found and found[oid].status in t.sources]
+        if moved:
+            self._update(t, moved, restaurant_id, values)
+            self._emit(t, moved, data)
+        return found, moved
+
+    def _emit(self, t: Transition, ids, data: dict) -> None:
+        from OrderFood.order_events import record_events
+        record_events(t.name, t.target, ids, data)
+        if t.target == StatusOrder.CANCELED and StatusOrder.PENDING in t.sources:
+            _close_carts(ids)
+        if t.name in REFUND_REASONS:
+            from OrderFood.refund_queue import enqueue_refunds
+            reason = (data.get("reason") or "").strip() or REFUND_REASONS[t.name]
+            enqueue_refunds(ids, reason)
+
+
+def _close_carts(ids) -> None:
+    db.session.execute(
+        update(Cart)
+        .where(Cart.cart_id.in_(select(Order.cart_id).where(Order.order_id.in_(ids))),
+               Cart.status != StatusCart.CHECKOUT)
+        .values(status=StatusCart.CHECKOUT)
+        .execution_options(synchronize_session=False)
+    )
+
+
+order_machine = OrderStateMachine()
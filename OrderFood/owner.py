@@ -1,13 +1,21 @@
 # OrderFood/owner.py
 from flask import Blueprint, render_template, session, redirect, url_for, request, jsonify
-from OrderFood.models import User, Restaurant, Dish, Category, StatusOrder, StatusCart, Refund, Payment, StatusRefund, \
-    Role, Order, StatusRes
+from OrderFood.models import Restaurant, Dish, Category, StatusOrder, StatusCart, Refund, Payment, StatusRefund, \
+    Order, StatusRes, PayoutStatement
 from OrderFood.dao_index import *
 from OrderFood import db
 from datetime import datetime
 from sqlalchemy import func
 
-from OrderFood.notifications import push_customer_noti_on_owner_cancel
+from OrderFood.bulk_orders import parse_order_ids, BulkInputError, BULK_ORDER_LIMIT, approve_orders, \
+    cancel_orders_by_owner
+from OrderFood.dao import order_dao
+from OrderFood.export_service import export_orders_csv
+from OrderFood.principal import current_principal, reset_principal
+from OrderFood.db_retry import retry_on_deadlock
+from OrderFood.order_state_machine import order_machine, ACCEPT, OWNER_CANCEL
+from OrderFood.kitchen_queue import kitchen_queue
+from OrderFood import live_board
 
 owner_bp = Blueprint("owner", __name__, url_prefix="/owner")
 
@@ -15,20 +23,25 @@ owner_bp = Blueprint("owner", __name__, url_prefix="/owner")
 def is_owner(role):
     return (role or "").lower() == "restaurant_owner"
 
+ORDER_TABS = ("pending", "approved", "cancelled", "completed")
+
+def _owner_with_restaurant():
+    """Principal của owner đã có nhà hàng (1 câu JOIN / request), ngược lại None."""
+    p = current_principal()
+    if not p or not p.restaurant_id:
+        return None
+    return p
+
 # ================= Owner Home =================
 
 @owner_bp.route("/")
 def owner_home():
     if not is_owner(session.get("role")):
         return redirect(url_for("login"))
-    user_id = session.get("user_id")
-    if not user_id:
+    p = current_principal()
+    if not p:
         return redirect(url_for("login"))
-    user = User.query.get(user_id)
-    restaurant = None
-    if user and user.restaurant_owner:
-        restaurant = user.restaurant_owner.restaurant
-    return render_template("owner_home.html", restaurant=restaurant)
+    return render_template("owner_home.html", restaurant=p.restaurant)
 
 # ================= Menu =================
 @owner_bp.route("/menu")
@@ -41,22 +54,21 @@ def get_menu():
         dishes = load_menu_owner(user_id)
     else:
         dishes = get_dishes_by_name(user_id, keyword)
-    user = User.query.get(user_id)
-    restaurant = user.restaurant_owner.restaurant
+    p = current_principal()
+    restaurant = p.restaurant if p else None
     categories = get_categories_by_owner_id(user_id)
     return render_template("owner/menu.html", dishes=dishes, categories=categories, restaurant=restaurant)
 
 @owner_bp.route("/add_dish", methods=["POST"])
 def add_dish():
-    user_id = session.get("user_id")
-    user = User.query.get(user_id)
-    if not user_id:
+    if not session.get("user_id"):
         return redirect(url_for("login"))
 
-    if not user or not user.restaurant_owner or not user.restaurant_owner.restaurant:
+    p = _owner_with_restaurant()
+    if not p:
         return jsonify({"success": False, "error": "Bạn chưa có nhà hàng"})
 
-    res_id = user.restaurant_owner.restaurant.restaurant_id
+    res_id = p.restaurant_id
 
     name = request.form.get("name").strip()
     price = request.form.get("price")
@@ -77,7 +89,7 @@ def add_dish():
             if not category:
                 category = Category(name=category_name, res_id=res_id)
                 db.session.add(category)
-                db.session.commit()
+                db.session.flush()
             category_id = category.category_id
     else:
         category_id = int(selected_category) if selected_category else None
@@ -91,7 +103,7 @@ def add_dish():
         image=image_url
     )
     db.session.add(new_dish)
-    db.session.commit()
+    db.session.flush()
 
     category_name_for_json = ""
     if category_id:
@@ -142,7 +154,7 @@ def edit_dish(dish_id):
         if image_url:
             dish.image = image_url
 
-        db.session.commit()
+        db.session.flush()
 
         return jsonify({
             "success": True,
@@ -168,7 +180,7 @@ def delete_dish(dish_id):
             return jsonify({"success": False, "error": "Món ăn không tồn tại"}), 404
 
         db.session.delete(dish)
-        db.session.commit()
+        db.session.flush()
         return jsonify({"success": True, "message": f"Đã xoá món ăn {dish.name}"})
     except Exception as e:
         db.session.rollback()
@@ -177,74 +189,145 @@ def delete_dish(dish_id):
 # ================= Orders =================
 @owner_bp.route("/orders")
 def manage_orders():
-    user_id = session.get("user_id")
-    user = User.query.get(user_id)
-
-    if not user_id:
+    if not session.get("user_id"):
         return redirect(url_for("login"))
 
-    if not user or not user.restaurant_owner or not user.restaurant_owner.restaurant:
+    p = _owner_with_restaurant()
+    if not p:
         return jsonify({"success": False, "error": "Bạn chưa có nhà hàng"})
 
-    res_id = user.restaurant_owner.restaurant.restaurant_id
+    res_id = p.restaurant_id
+
+    # Tab đang mở; cursor chỉ áp dụng cho tab lịch sử đang mở
+    tab = request.args.get("tab")
+    if tab not in ORDER_TABS:
+        tab = "pending"
+    cursor = request.args.get("cursor")
+    per_page = max(10, min(request.args.get("per_page", 20, type=int), 100))
+
+    actionable = order_dao.list_owner_actionable(res_id)
+    cancelled_orders, cancelled_next = order_dao.list_owner_history(
+        res_id, StatusOrder.CANCELED, cursor if tab == "cancelled" else None, per_page)
+    completed_orders, completed_next = order_dao.list_owner_history(
+        res_id, StatusOrder.COMPLETED, cursor if tab == "completed" else None, per_page)
+    status_counts = order_dao.cached_status_counts(res_id)
 
-    pending_orders = Order.query.filter_by(restaurant_id=res_id, status=StatusOrder.PAID).all()
-    approved_orders = Order.query.filter_by(restaurant_id=res_id, status=StatusOrder.ACCEPTED).all()
-    cancelled_orders = Order.query.filter_by(restaurant_id=res_id, status=StatusOrder.CANCELED).all()
-    completed_orders = Order.query.filter_by(restaurant_id=res_id, status=StatusOrder.COMPLETED).all()
-    restaurant = user.restaurant_owner.restaurant
+    restaurant = p.restaurant
     return render_template("owner/manage_orders.html",
-                           pending_orders=pending_orders,
-                           approved_orders=approved_orders,
+                           pending_orders=actionable[StatusOrder.PAID],
+                           approved_orders=actionable[StatusOrder.ACCEPTED],
                            cancelled_orders=cancelled_orders,
                            completed_orders=completed_orders,
+                           cancelled_next=cancelled_next,
+                           completed_next=completed_next,
+                           status_counts=status_counts,
+                           active_tab=tab,
+                           cursor=cursor,
                            res_id=res_id,
+                           live_ws_url=live_board.public_url(request) if live_board.LIVE_WS_ENABLED else None,
                            restaurant=restaurant)
 
+@owner_bp.route("/orders/export.csv")
+def export_orders():
+    """Xuất CSV đơn hàng của nhà hàng (filter: from, to, status)."""
+    user_id = session.get("user_id")
+    if not user_id or not is_owner(session.get("role")):
+        return redirect(url_for("login"))
+
+    p = _owner_with_restaurant()
+    if not p:
+        return jsonify({"success": False, "error": "Bạn chưa có nhà hàng"}), 400
+    res_id = p.restaurant_id
+
+    return export_orders_csv(request.args, restaurant_id=res_id, prefix=f"orders_res{res_id}")
+
+
+@owner_bp.route("/api/kitchen-queue")
+def get_kitchen_queue():
+    """Đơn PAID / ACCEPTED theo hạn xác nhận gần nhất trước (đọc từ RAM, không query mỗi lần poll)."""
+    if not is_owner(session.get("role")):
+        return jsonify({"error": "forbidden"}), 403
+    p = _owner_with_restaurant()
+    if not p:
+        return jsonify({"success": False, "error": "Bạn chưa có nhà hàng"}), 400
+
+    items = kitchen_queue.snapshot(p.restaurant_id)
+    return jsonify({"success": True, "items": items, "count": len(items)})
+
+
+@owner_bp.route("/api/payouts")
+def list_payouts():
+    """Các kỳ payout của nhà hàng (mới nhất trước)."""
+    user_id = session.get("user_id")
+    if not user_id or not is_owner(session.get("role")):
+        return jsonify({"error": "forbidden"}), 403
+
+    p = _owner_with_restaurant()
+    if not p:
+        return jsonify({"success": False, "error": "Bạn chưa có nhà hàng"}), 400
+
+    limit = max(1, min(request.args.get("limit", 12, type=int), 60))
+    rows = (PayoutStatement.query
+            .filter(PayoutStatement.restaurant_id == p.restaurant_id)
+            .order_by(PayoutStatement.period_start.desc())
+            .limit(limit)
+            .all())
+    return jsonify({"success": True, "items": [{
+        "period_start": r.period_start.isoformat(),
+        "period_end": r.period_end.isoformat(),
+        "completed_orders": r.completed_orders,
+        "gross_revenue": r.gross_revenue,
+        "refunded_orders": r.refunded_orders,
+        "refunded_amount": r.refunded_amount,
+        "commission_rate": r.commission_rate,
+        "commission": r.commission,
+        "net_payout": r.net_payout,
+    } for r in rows]})
+
+def _transition_error(order_id: int, res_id: int, message: str):
+    """UPDATE có điều kiện không chuyển được đơn -> đọc lại để phân biệt 404 / sai trạng thái."""
+    exists = db.session.query(Order.order_id).filter(Order.order_id == order_id,
+                                                     Order.restaurant_id == res_id).first()
+    if not exists:
+        return jsonify({"error": "Đơn hàng không tồn tại"}), 404
+    return jsonify({"error": message}), 400
+
+
 @owner_bp.route("/orders/<int:order_id>/approve", methods=["POST"])
+@retry_on_deadlock("approve_order")
 def approve_order(order_id):
-    order = Order.query.get_or_404(order_id)
-    if isinstance(order.status, str):
-        if order.status == StatusOrder.PAID.value:
-            order.status = StatusOrder.ACCEPTED
-        else:
-            return jsonify({"error": "Đơn hàng không ở trạng thái PAID"}), 400
-    else:
-        if order.status == StatusOrder.PAID:
-            order.status = StatusOrder.ACCEPTED
-        else:
-            return jsonify({"error": "Đơn hàng không ở trạng thái PAID"}), 400
+    p = _owner_with_restaurant()
+    if not p:
+        return jsonify({"error": "forbidden"}), 403
+
+    # PAID -> ACCEPTED (1 câu UPDATE có điều kiện, chỉ đơn của nhà hàng mình)
+    if not order_machine.apply(ACCEPT, order_id, restaurant_id=p.restaurant_id):
+        return _transition_error(order_id, p.restaurant_id, "Đơn hàng không ở trạng thái PAID")
 
-    db.session.commit()
+    order = db.session.get(Order, order_id, populate_existing=True)
     return jsonify({
         "order_id": order.order_id,
         "status": getattr(order.status, "value", order.status),
         "customer_name": order.customer.user.name,
         "total_price": order.total_price,
-        "items": [{"name": item.dish.name, "quantity": item.quantity} for item in order.cart.items]
+        "items": [{"name": line.dish_name, "quantity": line.quantity} for line in order.lines]
     })
 
 @owner_bp.route("/orders/<int:order_id>/cancel", methods=["POST"])
+@retry_on_deadlock("cancel_order")
 def cancel_order(order_id):
-    order = Order.query.get_or_404(order_id)
+    p = _owner_with_restaurant()
+    if not p:
+        return jsonify({"error": "forbidden"}), 403
+
     data = request.get_json(silent=True) or {}
     reason = (data.get("reason") or "").strip()
 
-    # Chỉ cho phép hủy khi đang PAID hoặc ACCEPTED (tùy bạn, có thể nới lỏng)
-    allowed = {StatusOrder.PAID, StatusOrder.ACCEPTED}
-    curr = order.status if not isinstance(order.status, str) else StatusOrder[order.status]
-    if curr not in allowed:
-        return jsonify({"error": "Chỉ hủy đơn ở trạng thái PAID/ACCEPTED"}), 400
-
-    # Cập nhật trạng thái + đánh dấu người hủy
-    order.status = StatusOrder.CANCELED
-    order.canceled_by = Role.RESTAURANT_OWNER
-    db.session.add(order)
-    db.session.commit()
-
-    # Gửi thông báo cho KH
-    push_customer_noti_on_owner_cancel(order, reason)
+    # PAID/ACCEPTED -> CANCELED + xếp hàng hoàn tiền (cùng transaction); event: noti cho KH
+    if not order_machine.apply(OWNER_CANCEL, order_id, restaurant_id=p.restaurant_id, reason=reason):
+        return _transition_error(order_id, p.restaurant_id, "Chỉ hủy đơn ở trạng thái PAID/ACCEPTED")
 
+    order = db.session.get(Order, order_id, populate_existing=True)
     return jsonify({
         "order_id": order.order_id,
         "status": order.status.value,
@@ -253,6 +336,36 @@ def cancel_order(order_id):
     })
 
 
+@owner_bp.route("/orders/bulk/<action>", methods=["POST"])
+@retry_on_deadlock("bulk_owner_orders")
+def bulk_orders(action):
+    """
+    Duyệt / huỷ nhiều đơn một lần.
+    Body JSON: {"order_ids": [1, 2, 3], "reason": "..."} (reason chỉ dùng khi huỷ)
+    -> 1 câu UPDATE cho cả lô, noti thêm 1 lần, trả kết quả theo từng id.
+    """
+    if not session.get("user_id") or not is_owner(session.get("role")):
+        return jsonify({"error": "forbidden"}), 403
+    if action not in ("approve", "cancel"):
+        return jsonify({"error": "invalid_action"}), 400
+
+    p = _owner_with_restaurant()
+    if not p:
+        return jsonify({"error": "Bạn chưa có nhà hàng"}), 400
+
+    data = request.get_json(silent=True) or {}
+    try:
+        ids = parse_order_ids(data.get("order_ids"))
+    except BulkInputError as e:
+        return jsonify({"error": e.code, "limit": BULK_ORDER_LIMIT}), 400
+
+    if action == "approve":
+        updated, results = approve_orders(p.restaurant_id, ids)
+    else:
+        updated, results = cancel_orders_by_owner(p.restaurant_id, ids, (data.get("reason") or "").strip())
+    return jsonify({"ok": True, "updated": updated, "results": results})
+
+
 # ================= Restaurant Management =================
 @owner_bp.route("/restaurant", methods=["GET"])
 def manage_restaurant():
@@ -260,12 +373,12 @@ def manage_restaurant():
     if not user_id or not is_owner(session.get("role")):
         return redirect(url_for("login"))
 
-    user = User.query.get(user_id)
-    if not user or not user.restaurant_owner or not user.restaurant_owner.restaurant:
+    p = _owner_with_restaurant()
+    if not p:
         return "Bạn chưa có nhà hàng", 400
 
-    restaurant = user.restaurant_owner.restaurant
-    owner = user.restaurant_owner
+    restaurant = p.restaurant
+    owner = p.owner
 
     return render_template("owner/manage_res.html", restaurant=restaurant, owner=owner)
 
@@ -276,12 +389,12 @@ def update_restaurant():
     if not user_id or not is_owner(session.get("role")):
         return jsonify({"success": False, "error": "Chưa đăng nhập"}), 401
 
-    user = User.query.get(user_id)
-    if not user or not user.restaurant_owner or not user.restaurant_owner.restaurant:
+    p = _owner_with_restaurant()
+    if not p:
         return jsonify({"success": False, "error": "Bạn chưa có nhà hàng"}), 400
 
-    restaurant = user.restaurant_owner.restaurant
-    owner = user.restaurant_owner
+    restaurant = p.restaurant
+    owner = p.owner
 
     data = request.get_json() or {}
 
@@ -292,7 +405,7 @@ def update_restaurant():
         restaurant.close_hour = data.get("close_hour", restaurant.close_hour)
         restaurant.is_open = data.get("is_open", restaurant.is_open)
         owner.tax = data.get("tax", owner.tax)
-        db.session.commit()
+        db.session.flush()
         return jsonify({"success": True})
     except Exception as e:
         db.session.rollback()
@@ -309,8 +422,8 @@ def res_register():
             return jsonify({"success": False, "error": "Chưa đăng nhập"}), 401
 
         # Check đã có restaurant chưa
-        existing = Restaurant.query.filter_by(res_owner_id=user_id).first()
-        if existing:
+        p = current_principal()
+        if p and p.restaurant_id:
             return jsonify({"success": False, "error": "Bạn đã đăng ký nhà hàng rồi"}), 400
 
         name = request.form.get("name")
@@ -343,6 +456,7 @@ def res_register():
         )
 
         db.session.add(restaurant)
-        db.session.commit()
+        db.session.flush()
+        reset_principal()
 
         return jsonify({"success": True, "restaurant_id": restaurant.restaurant_id})
@@ -0,0 +1,163 @@
+# OrderFood/payment_service.py
+"""
+Xác nhận thanh toán VNPay — dùng chung cho /vnpay_return (trình duyệt) và /vnpay_ipn (server).
+
+Hai request có thể tới cùng lúc cho cùng txn_ref, nên không đọc-sửa-ghi trên object ORM mà dùng
+UPDATE có điều kiện:
+
+    UPDATE payment SET status='PAID' WHERE payment_id=:id AND status NOT IN ('PAID', 'REFUND')
+
+rowcount = 1 -> request này là request "thắng", chuyển order sang PAID (order_state_machine, noti owner);
+rowcount = 0 -> đã được xác nhận (hoặc đã hoàn tiền) trước đó -> không làm gì thêm.
+
+Tiền về sau khi đơn đã bị huỷ (admin huỷ / hết hạn lúc đơn còn PENDING): payment vẫn ghi PAID nhưng
+xếp refund ngay trong cùng transaction, giỏ hàng giữ nguyên, trả về REFUNDING thay vì CONFIRMED.
+
+Request thắng lưu kèm vnp_TransactionNo + vnp_PayDate của VNPay lên payment (refund_gateway dùng lại).
+
+txn_ref đã xác nhận được nhớ trong RAM (CONFIRMED_CACHE_SIZE) để IPN gửi lại trả lời ngay
+mà không cần chạm DB.
+"""
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+from sqlalchemy import update
+
+from OrderFood import db
+from OrderFood.models import Order, Cart, Payment, StatusOrder, StatusPayment, StatusCart
+from OrderFood.order_state_machine import order_machine, PAY
+from OrderFood.refund_queue import enqueue_refunds
+from OrderFood.unit_of_work import on_commit
+
+# Kết quả xác nhận
+CONFIRMED = "CONFIRMED"                  # vừa chuyển sang PAID (lần đầu)
+ALREADY_CONFIRMED = "ALREADY_CONFIRMED"  # đã PAID từ trước (return/IPN lặp lại)
+NOT_FOUND = "NOT_FOUND"
+INVALID_AMOUNT = "INVALID_AMOUNT"
+NOT_SUCCESS = "NOT_SUCCESS"              # VNPay báo giao dịch không thành công
+REFUNDING = "REFUNDING"                  # tiền về nhưng đơn đã bị huỷ -> đã xếp hoàn tiền
+
+LATE_PAYMENT_REASON = "Thanh toán sau khi đơn đã bị huỷ"
+
+CONFIRMED_CACHE_SIZE = 5000
+
+_confirmed: "OrderedDict[str, int]" = OrderedDict()   # txn_ref -> order_id
+_confirmed_lock = threading.Lock()
+
+
+def _cached_order_id(txn_ref: str) -> int | None:
+    with _confirmed_lock:
+        order_id = _confirmed.get(txn_ref)
+        if order_id is not None:
+            _confirmed.move_to_end(txn_ref)
+        return order_id
+
+
+def _remember(txn_ref: str, order_id: int) -> None:
+    with _confirmed_lock:
+        _confirmed[txn_ref] = order_id
+        _confirmed.move_to_end(txn_ref)
+        while len(_confirmed) > CONFIRMED_CACHE_SIZE:
+            _confirmed.popitem(last=False)
+
+
+def _parse_amount(raw) -> int:
+    try:
+        return int(raw or 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+def _parse_pay_date(raw) -> datetime | None:
+    # vnp_PayDate: yyyyMMddHHmmss, giờ GMT+7 (lưu naive như các cột DateTime khác)
+    try:
+        return datetime.strptime(str(raw), "%Y%m%d%H%M%S") if raw else None
+    except ValueError:
+        return None
+
+
+def confirm_vnpay_payment(txn_ref: str, vnp_amount, response_code: str,
+                          transaction_no: str | None = None, pay_date=None) -> tuple[str, int | None]:
+    """
+    Trả về (kết quả, order_id). Không commit — commit theo unit of work / retry_on_deadlock của route.
+    transaction_no / pay_date: vnp_TransactionNo / vnp_PayDate từ VNPay (reconcile không có -> None).
+    """
+    if not txn_ref:
+        return NOT_FOUND, None
+
+    cached = _cached_order_id(txn_ref)
+    if cached is not None:
+        return ALREADY_CONFIRMED, cached
+
+    row = (db.session.query(Payment.payment_id, Payment.order_id, Payment.amount, Payment.status,
+                            Payment.vnp_transaction_no, Order.cart_id, Order.status)
+           .join(Order, Order.order_id == Payment.order_id)
+           .filter(Payment.txn_ref == txn_ref)
+           .first())
+    if not row:
+        return NOT_FOUND, None
+    payment_id, order_id, amount, status, stored_no, cart_id, order_status = row
+
+    vnp_amount = _parse_amount(vnp_amount)
+    if vnp_amount and vnp_amount != int(amount):
+        return INVALID_AMOUNT, order_id
+
+    if response_code != "00":
+        # không hạ trạng thái của payment đã thanh toán / hoàn tiền
+        db.session.execute(
+            update(Payment)
+            .where(Payment.payment_id == payment_id,
+                   Payment.status.notin_((StatusPayment.PAID, StatusPayment.REFUND, StatusPayment.PENDING)))
+            .values(status=StatusPayment.PENDING)
+            .execution_options(synchronize_session=False)
+        )
+        return NOT_SUCCESS, order_id
+
+    gateway = {"vnp_transaction_no": (transaction_no or None) and str(transaction_no)[:32],
+               "vnp_pay_date": _parse_pay_date(pay_date)}
+
+    if status in (StatusPayment.PAID, StatusPayment.REFUND):
+        if status == StatusPayment.PAID and gateway["vnp_transaction_no"] and not stored_no:
+            # đã PAID qua đường khác (reconcile) -> bổ sung mã giao dịch VNPay cho hoàn tiền
+            db.session.execute(
+                update(Payment)
+                .where(Payment.payment_id == payment_id, Payment.vnp_transaction_no.is_(None))
+                .values(**gateway)
+                .execution_options(synchronize_session=False)
+            )
+        if order_status == StatusOrder.CANCELED:
+            # return/IPN lặp lại của khoản trả muộn: enqueue bỏ qua payment đã có refund
+            enqueue_refunds([order_id], LATE_PAYMENT_REASON)
+            return REFUNDING, order_id
+        _remember(txn_ref, order_id)
+        return ALREADY_CONFIRMED, order_id
+
+    values = {"status": StatusPayment.PAID}
+    values.update({k: v for k, v in gateway.items() if v is not None})
+    won = db.session.execute(
+        update(Payment)
+        .where(Payment.payment_id == payment_id,
+               Payment.status.notin_((StatusPayment.PAID, StatusPayment.REFUND)))
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if not won:
+        on_commit(lambda: _remember(txn_ref, order_id))
+        return ALREADY_CONFIRMED, order_id
+
+    # Chỉ PENDING -> PAID (không kéo lùi đơn đã ACCEPTED/COMPLETED/CANCELED); noti owner qua event
+    if not order_machine.apply(PAY, order_id):
+        current = db.session.query(Order.status).filter(Order.order_id == order_id).scalar()
+        if current == StatusOrder.CANCELED:
+            enqueue_refunds([order_id], LATE_PAYMENT_REASON)
+            return REFUNDING, order_id
+    db.session.execute(
+        update(Cart)
+        .where(Cart.cart_id == cart_id)
+        .values(status=StatusCart.CHECKOUT)
+        .execution_options(synchronize_session=False)
+    )
+
+    on_commit(lambda: _remember(txn_ref, order_id))
+    return CONFIRMED, order_id
@@ -0,0 +1,201 @@
+# OrderFood/payout_job.py
+"""
+Đối soát trả tiền cho nhà hàng theo kỳ (mặc định: tháng trước).
+
+- Danh sách restaurant_id được chia thành các khoảng liên tiếp [lo, hi] (~PAYOUT_SLICES_PER_WORKER
+  khoảng / worker) và chạy trên ProcessPoolExecutor PAYOUT_WORKERS process (mặc định = số core).
+- Mỗi process (forkserver / spawn) chạy payout_worker.settle_slice — module ngoài package OrderFood
+  nên không chạy create_app() — tự mở engine riêng, đọc đơn COMPLETED trong kỳ của khoảng nhà hàng
+  mình dạng stream (yield_per, chỉ 2 cột) và 1 câu GROUP BY cho refund COMPLETED trong kỳ
+  -> bộ nhớ không phụ thuộc số đơn.
+- Process cha gộp kết quả, tính hoa hồng, ghi đè payout_statement của kỳ trong 1 transaction
+  và xuất file CSV vào PAYOUT_EXPORT_DIR.
+
+Công thức: net_payout = gross_revenue - commission. Refund là tiền của đơn bị huỷ (không nằm trong
+gross_revenue) nên chỉ được báo cáo, không trừ thêm.
+"""
+import csv
+import io
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, datetime, timedelta
+from zoneinfo import ZoneInfo
+
+from sqlalchemy import delete, insert
+
+from OrderFood.models import Restaurant, PayoutStatement
+from payout_worker import settle_slice, empty_stats
+
+_TZ = ZoneInfo("Asia/Ho_Chi_Minh")
+
+PAYOUT_COMMISSION_RATE = float(os.getenv("PAYOUT_COMMISSION_RATE", "0.1"))
+PAYOUT_WORKERS = int(os.getenv("PAYOUT_WORKERS", "0")) or (os.cpu_count() or 1)
+PAYOUT_SLICES_PER_WORKER = 4
+PAYOUT_EXPORT_DIR = os.getenv("PAYOUT_EXPORT_DIR")
+
+EXPORT_HEADER = [
+    "restaurant_id", "restaurant_name", "period_start", "period_end",
+    "completed_orders", "gross_revenue", "refunded_orders", "refunded_amount",
+    "commission_rate", "commission", "net_payout",
+]
+
+
+def previous_month(today: date | None = None) -> tuple[date, date]:
+    """[ngày 1 tháng trước, ngày 1 tháng này)."""
+    today = today or datetime.now(_TZ).date()
+    end = today.replace(day=1)
+    start = (end - timedelta(days=1)).replace(day=1)
+    return start, end
+
+
+def parse_period(value: str | None) -> tuple[date, date]:
+    """'YYYY-MM' -> (ngày 1 tháng đó, ngày 1 tháng sau). Rỗng -> tháng trước."""
+    if not value:
+        return previous_month()
+    start = datetime.strptime(value, "%Y-%m").date()
+    end = (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return start, end
+
+
+def partition(ids: list[int], parts: int) -> list[tuple[int, int]]:
+    """Chia ids (tăng dần) thành tối đa `parts` khoảng liên tiếp (lo, hi) gần đều nhau."""
+    ids = sorted(ids)
+    if not ids:
+        return []
+    parts = max(1, min(parts, len(ids)))
+    size, extra = divmod(len(ids), parts)
+    out, i = [], 0
+    for p in range(parts):
+        n = size + (1 if p < extra else 0)
+        out.append((ids[i], ids[i + n - 1]))
+        i += n
+    return out
+
+
+def compute_statement(stats: dict, rate: float) -> dict:
+    """stats: completed_orders / gross_revenue / refunded_orders / refunded_amount -> thêm hoa hồng + net."""
+    gross = round(float(stats.get("gross_revenue") or 0), 2)
+    commission = round(gross * rate, 2)
+    return {
+        "completed_orders": int(stats.get("completed_orders") or 0),
+        "gross_revenue": gross,
+        "refunded_orders": int(stats.get("refunded_orders") or 0),
+        "refunded_amount": round(float(stats.get("refunded_amount") or 0), 2),
+        "commission_rate": rate,
+        "commission": commission,
+        "net_payout": round(gross - commission, 2),
+    }
+
+
+# ========= Process pool =========
+def _pool(workers: int):
+    """
+    ProcessPool forkserver (không có thì spawn): process con không kế thừa app, kết nối DB hay thread
+    scheduler của process cha. Hàm chạy bên trong (payout_worker.settle_slice) không import OrderFood.
+    """
+    if workers <= 1:
+        return None
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        ctx = multiprocessing.get_context("forkserver")
+        ctx.set_forkserver_preload(["payout_worker"])
+    else:
+        ctx = multiprocessing.get_context("spawn")
+    return ProcessPoolExecutor(max_workers=workers, mp_context=ctx)
+
+
+# ========= Job =========
+def _export_path(app, start: date, end: date) -> str:
+    folder = PAYOUT_EXPORT_DIR or os.path.join(app.instance_path, "payouts")
+    return os.path.join(folder, f"payout_{start:%Y%m%d}_{end:%Y%m%d}.csv")
+
+
+def export_path(app, start: date, end: date) -> str | None:
+    path = _export_path(app, start, end)
+    return path if os.path.exists(path) else None
+
+
+def _write_export(path: str, rows: list[dict]) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    with io.open(tmp, "w", newline="", encoding="utf-8-sig") as f:
+        w = csv.writer(f)
+        w.writerow(EXPORT_HEADER)
+        for r in rows:
+            w.writerow([r[k] for k in EXPORT_HEADER])
+    os.replace(tmp, path)
+
+
+def run_payout_job(period_start: date | None = None, period_end: date | None = None,
+                   workers: int | None = None, progress=None) -> dict:
+    """Tính + ghi payout_statement của kỳ [period_start, period_end). Cần app context."""
+    from flask import current_app
+    from OrderFood import db
+
+    if not period_start or not period_end:
+        period_start, period_end = previous_month()
+    start = datetime.combine(period_start, datetime.min.time())
+    end = datetime.combine(period_end, datetime.min.time())
+    workers = workers or PAYOUT_WORKERS
+    rate = PAYOUT_COMMISSION_RATE
+
+    restaurants = dict(db.session.query(Restaurant.restaurant_id, Restaurant.name).all())
+    slices = partition(list(restaurants), workers * PAYOUT_SLICES_PER_WORKER)
+    db_uri = db.engine.url.render_as_string(hide_password=False)
+    db.session.remove()   # không mang kết nối đang mở sang process con
+
+    stats: dict[int, dict] = {}
+    done = 0
+    pool = _pool(workers)
+    if progress:
+        progress(done=0, total=len(slices))
+    try:
+        if pool is None:
+            for lo, hi in slices:
+                stats.update(settle_slice(db_uri, lo, hi, start, end))
+                done += 1
+                if progress:
+                    progress(done=done, total=len(slices))
+        else:
+            futures = [pool.submit(settle_slice, db_uri, lo, hi, start, end) for lo, hi in slices]
+            for f in as_completed(futures):
+                stats.update(f.result())
+                done += 1
+                if progress:
+                    progress(done=done, total=len(slices))
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    now = datetime.now(_TZ).replace(tzinfo=None)
+    rows = []
+    for rid in sorted(restaurants):
+        row = compute_statement(stats.get(rid) or empty_stats(), rate)
+        row.update(restaurant_id=rid, period_start=period_start, period_end=period_end, created_at=now)
+        rows.append(row)
+
+    try:
+        db.session.execute(delete(PayoutStatement).where(PayoutStatement.period_start == period_start,
+                                                         PayoutStatement.period_end == period_end))
+        if rows:
+            db.session.execute(insert(PayoutStatement), rows)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    path = _export_path(current_app, period_start, period_end)
+    _write_export(path, [dict(r, restaurant_name=restaurants[r["restaurant_id"]]) for r in rows])
+
+    summary = {
+        "period_start": period_start.isoformat(),
+        "period_end": period_end.isoformat(),
+        "restaurants": len(rows),
+        "slices": len(slices),
+        "workers": workers if pool is not None else 1,
+        "gross_revenue": round(sum(r["gross_revenue"] for r in rows), 2),
+        "net_payout": round(sum(r["net_payout"] for r in rows), 2),
+        "export": os.path.basename(path),
+    }
+    print(f"[PAYOUT] {summary}")
+    return summary
@@ -0,0 +1,93 @@
+# OrderFood/principal.py
+"""
+Người dùng hiện tại (principal) — nạp 1 lần / request bằng 1 câu JOIN
+user + customer + restaurant_owner + restaurant, cache trên flask.g.
+
+Thay cho chuỗi User.query.get(uid) -> user.restaurant_owner -> .restaurant
+(3 lazy load) lặp lại ở hầu hết route.
+"""
+from flask import g, session
+
+from OrderFood import db
+from OrderFood.models import User, Customer, RestaurantOwner, Restaurant
+
+_MISSING = object()
+
+
+class Principal:
+    __slots__ = ("user_id", "role", "name", "is_customer", "owner_id", "restaurant_id", "restaurant_status")
+
+    def __init__(self, user_id, role, name, is_customer, owner_id, restaurant_id, restaurant_status):
+        self.user_id = user_id
+        self.role = role                      # chuỗi thường: customer / restaurant_owner / admin
+        self.name = name
+        self.is_customer = is_customer        # có dòng trong bảng customer
+        self.owner_id = owner_id              # = user_id nếu có dòng restaurant_owner
+        self.restaurant_id = restaurant_id
+        self.restaurant_status = restaurant_status
+
+    @property
+    def is_owner(self) -> bool:
+        return self.role == "restaurant_owner"
+
+    @property
+    def is_admin(self) -> bool:
+        return self.role == "admin"
+
+    @property
+    def has_restaurant(self) -> bool:
+        return self.restaurant_id is not None
+
+    @property
+    def user(self):
+        """User đã nằm trong identity map (nạp cùng câu JOIN) -> không query thêm."""
+        return db.session.get(User, self.user_id)
+
+    @property
+    def restaurant(self):
+        """Restaurant đã nằm trong identity map (nạp cùng câu JOIN) -> không query thêm."""
+        if self.restaurant_id is None:
+            return None
+        return db.session.get(Restaurant, self.restaurant_id)
+
+    @property
+    def owner(self):
+        if self.owner_id is None:
+            return None
+        return db.session.get(RestaurantOwner, self.owner_id)
+
+
+def _load(user_id: int) -> Principal | None:
+    row = (db.session.query(User, Customer.user_id, RestaurantOwner, Restaurant)
+           .outerjoin(Customer, Customer.user_id == User.user_id)
+           .outerjoin(RestaurantOwner, RestaurantOwner.user_id == User.user_id)
+           .outerjoin(Restaurant, Restaurant.res_owner_id == User.user_id)
+           .filter(User.user_id == user_id)
+           .first())
+    if not row:
+        return None
+    user, customer_id, owner, restaurant = row
+    return Principal(
+        user_id=user.user_id,
+        role=(getattr(user.role, "value", user.role) or "").lower(),
+        name=user.name,
+        is_customer=customer_id is not None,
+        owner_id=owner.user_id if owner else None,
+        restaurant_id=restaurant.restaurant_id if restaurant else None,
+        restaurant_status=getattr(restaurant.status, "value", restaurant.status) if restaurant else None,
+    )
+
+
+def current_principal() -> Principal | None:
+    """Principal của request hiện tại (None nếu chưa đăng nhập / user không tồn tại)."""
+    p = g.get("principal", _MISSING)
+    if p is _MISSING:
+        uid = session.get("user_id")
+        p = _load(uid) if uid else None
+        g.principal = p
+    return p
+
+
+def reset_principal() -> None:
+    """Gọi khi dữ liệu user/restaurant vừa đổi trong cùng request (vd: đăng ký nhà hàng)."""
+    g.pop("principal", None)
@@ -0,0 +1,166 @@
+# OrderFood/reconcile.py
+"""
+Đối soát bảng payment với file settlement (CSV) của VNPay.
+
+    flask --app OrderFood reconcile-payments settlement.csv --report diff.csv [--fix]
+
+- Đọc CSV dạng stream (csv.reader), xử lý theo lô RECONCILE_BATCH_SIZE dòng:
+  mỗi lô 1 câu SELECT ... WHERE txn_ref IN (...) trên index unique của payment.txn_ref.
+- Phân loại: MATCHED / MISSING (không có txn_ref bên mình) / AMOUNT_MISMATCH / STATUS_MISMATCH.
+- Chỉ giữ bộ đếm + ghi dòng lệch ra report ngay -> bộ nhớ không đổi dù file hàng triệu dòng.
+- --fix: giao dịch VNPay báo thành công nhưng bên mình chưa PAID (và số tiền khớp)
+  -> xác nhận lại qua confirm_vnpay_payment (cùng đường với IPN), commit theo lô.
+"""
+import csv
+import io
+from itertools import islice
+
+import click
+
+from OrderFood import db
+from OrderFood.models import Payment, StatusPayment
+from OrderFood.payment_service import confirm_vnpay_payment, CONFIRMED, ALREADY_CONFIRMED, REFUNDING
+
+RECONCILE_BATCH_SIZE = 1000
+
+MATCHED = "MATCHED"
+MISSING = "MISSING"
+AMOUNT_MISMATCH = "AMOUNT_MISMATCH"
+STATUS_MISMATCH = "STATUS_MISMATCH"
+
+# Tên cột chấp nhận (không phân biệt hoa thường)
+TXN_REF_COLUMNS = ("vnp_txnref", "txn_ref", "txnref", "ma_gd_merchant")
+AMOUNT_COLUMNS = ("vnp_amount", "amount", "so_tien")
+STATUS_COLUMNS = ("vnp_transactionstatus", "status", "trang_thai")
+
+_PAID_VALUES = {"00", "SUCCESS", "PAID", "THANH_CONG"}
+_REFUND_VALUES = {"02", "REFUND", "REFUNDED", "HOAN_TIEN"}
+
+REPORT_HEADER = ["txn_ref", "result", "gateway_amount", "our_amount", "gateway_status", "our_status", "fixed"]
+
+
+def _pick(header: list[str], names) -> int:
+    lowered = [h.strip().lower() for h in header]
+    for n in names:
+        if n in lowered:
+            return lowered.index(n)
+    raise click.UsageError(f"CSV thiếu cột ({' / '.join(names)})")
+
+
+def _gateway_status(raw: str) -> StatusPayment:
+    v = (raw or "").strip().upper()
+    if v in _PAID_VALUES:
+        return StatusPayment.PAID
+    if v in _REFUND_VALUES:
+        return StatusPayment.REFUND
+    return StatusPayment.PENDING
+
+
+def _parse_amount(raw: str, multiplier: int) -> int | None:
+    try:
+        return int(round(float((raw or "").replace(",", "").strip()) * multiplier))
+    except ValueError:
+        return None
+
+
+def classify(gw_amount, gw_status: StatusPayment, ours) -> str:
+    """ours = (amount, status) từ bảng payment, hoặc None."""
+    if ours is None:
+        return MISSING
+    amount, status = ours
+    if gw_amount is None or int(amount) != gw_amount:
+        return AMOUNT_MISMATCH
+    if status != gw_status:
+        return STATUS_MISMATCH
+    return MATCHED
+
+
+def _iter_batches(rows, size: int):
+    while True:
+        batch = list(islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+
+def reconcile_stream(stream, report=None, apply_fixes: bool = False,
+                     batch_size: int = RECONCILE_BATCH_SIZE, amount_multiplier: int = 100) -> dict:
+    """
+    stream: file text mở sẵn (CSV có header). report: file text để ghi các dòng lệch (tuỳ chọn).
+    amount_multiplier: settlement tính VND -> x100 cho khớp payment.amount.
+    """
+    reader = csv.reader(stream)
+    header = next(reader, None)
+    if not header:
+        raise click.UsageError("File settlement rỗng")
+    i_ref, i_amt, i_st = _pick(header, TXN_REF_COLUMNS), _pick(header, AMOUNT_COLUMNS), _pick(header, STATUS_COLUMNS)
+
+    writer = csv.writer(report) if report is not None else None
+    if writer:
+        writer.writerow(REPORT_HEADER)
+
+    counts = {"rows": 0, MATCHED: 0, MISSING: 0, AMOUNT_MISMATCH: 0, STATUS_MISMATCH: 0, "fixed": 0, "skipped": 0}
+
+    for batch in _iter_batches(reader, batch_size):
+        parsed = []
+        for row in batch:
+            if len(row) <= max(i_ref, i_amt, i_st) or not row[i_ref].strip():
+                counts["skipped"] += 1
+                continue
+            parsed.append((row[i_ref].strip(), _parse_amount(row[i_amt], amount_multiplier), row[i_st]))
+        if not parsed:
+            continue
+
+        refs = list({p[0] for p in parsed})
+        ours = {ref: (amount, status) for ref, amount, status in
+                db.session.query(Payment.txn_ref, Payment.amount, Payment.status)
+                .filter(Payment.txn_ref.in_(refs))}
+
+        for ref, gw_amount, raw_status in parsed:
+            counts["rows"] += 1
+            gw_status = _gateway_status(raw_status)
+            result = classify(gw_amount, gw_status, ours.get(ref))
+            counts[result] += 1
+            if result == MATCHED:
+                continue
+
+            fixed = False
+            if (apply_fixes and result == STATUS_MISMATCH and gw_status == StatusPayment.PAID
+                    and ours[ref][1] != StatusPayment.REFUND):
+                outcome, _ = confirm_vnpay_payment(ref, gw_amount, "00")
+                # REFUNDING: đơn đã huỷ -> payment PAID + refund đã xếp hàng, cũng là đã xử lý xong
+                fixed = outcome in (CONFIRMED, ALREADY_CONFIRMED, REFUNDING)
+                counts["fixed"] += int(fixed)
+
+            if writer:
+                our_amount, our_status = ours.get(ref, (None, None))
+                writer.writerow([ref, result, gw_amount, our_amount, gw_status.value,
+                                 getattr(our_status, "value", our_status) or "", int(fixed)])
+
+        if apply_fixes:
+            db.session.commit()
+        # không giữ object ORM giữa các lô
+        db.session.expunge_all()
+
+    return counts
+
+
+def init_app(app):
+    @app.cli.command("reconcile-payments")
+    @click.argument("settlement", type=click.Path(exists=True, dir_okay=False))
+    @click.option("--report", type=click.Path(dir_okay=False), default=None, help="Ghi các dòng lệch ra CSV.")
+    @click.option("--fix", is_flag=True, help="Xác nhận lại giao dịch VNPay đã thành công mà mình chưa PAID.")
+    @click.option("--batch-size", type=int, default=RECONCILE_BATCH_SIZE, show_default=True)
+    @click.option("--amount-unit", type=click.Choice(["vnd", "vnp"]), default="vnd", show_default=True,
+                  help="vnd: số tiền VND (x100 khi so sánh), vnp: đã nhân 100 như vnp_Amount.")
+    def reconcile_payments(settlement, report, fix, batch_size, amount_unit):
+        """Đối soát payment với file settlement VNPay."""
+        multiplier = 100 if amount_unit == "vnd" else 1
+        with io.open(settlement, newline="", encoding="utf-8-sig") as src:
+            if report:
+                with io.open(report, "w", newline="", encoding="utf-8") as out:
+                    counts = reconcile_stream(src, out, fix, batch_size, multiplier)
+            else:
+                counts = reconcile_stream(src, None, fix, batch_size, multiplier)
+        for k, v in counts.items():
+            click.echo(f"{k:>16}: {v}")
@@ -0,0 +1,163 @@
+# OrderFood/refund_gateway.py
+"""
+Client hoàn tiền (pluggable) cho refund_queue.
+
+- RefundGateway.refund_batch(requests) -> {refund_id: RefundResult}
+- VnpayRefundClient: gọi API merchant_webapi của VNPay (command=refund), 1 request / giao dịch,
+  dùng chung 1 requests.Session cho cả lô.
+- FakeVnpayRefundClient: giả lập VNPay ở local (độ trễ + tỉ lệ lỗi cấu hình được) để test pipeline.
+
+Chọn client qua REFUND_GATEWAY=fake|vnpay (mặc định fake nếu chưa cấu hình VNP_TMN_CODE),
+hoặc gắn client tuỳ ý vào app.extensions["refund_gateway"].
+"""
+import hashlib
+import hmac
+import os
+import random
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime
+from uuid import uuid4
+from zoneinfo import ZoneInfo
+
+_TZ = ZoneInfo("Asia/Ho_Chi_Minh")
+
+VNP_REFUND_URL = os.getenv("VNP_REFUND_URL", "https://sandbox.vnpayment.vn/merchant_webapi/api/transaction")
+REFUND_HTTP_TIMEOUT = float(os.getenv("REFUND_HTTP_TIMEOUT", "10"))
+
+
+class RefundRequest:
+    __slots__ = ("refund_id", "txn_ref", "amount", "transaction_date", "reason", "transaction_no")
+
+    def __init__(self, refund_id, txn_ref, amount, transaction_date, reason, transaction_no=None):
+        self.refund_id = refund_id
+        self.txn_ref = txn_ref
+        self.amount = amount                      # VND * 100
+        self.transaction_date = transaction_date  # vnp_PayDate đã lưu (đơn cũ: lúc tạo payment)
+        self.reason = reason
+        self.transaction_no = transaction_no      # vnp_TransactionNo VNPay trả khi thanh toán
+
+
+class RefundResult:
+    __slots__ = ("ok", "gateway_ref", "error", "retryable")
+
+    def __init__(self, ok: bool, gateway_ref: str | None = None, error: str | None = None, retryable: bool = True):
+        self.ok = ok
+        self.gateway_ref = gateway_ref
+        self.error = error
+        self.retryable = retryable
+
+
+class RefundGateway(ABC):
+    name = "base"
+
+    @abstractmethod
+    def refund_batch(self, requests: list[RefundRequest]) -> dict[int, RefundResult]:
+        """Gửi cả lô; trả về {refund_id: RefundResult} (thiếu key = coi như lỗi tạm thời)."""
+
+
+# ========= Fake (local) =========
+class FakeVnpayRefundClient(RefundGateway):
+    """Giả lập API hoàn tiền VNPay: trễ `latency` giây / lô, lỗi tạm thời với xác suất `fail_rate`."""
+    name = "fake"
+
+    def __init__(self, latency: float | None = None, fail_rate: float | None = None):
+        self.latency = float(os.getenv("REFUND_FAKE_LATENCY", "0.2")) if latency is None else latency
+        self.fail_rate = float(os.getenv("REFUND_FAKE_FAIL_RATE", "0")) if fail_rate is None else fail_rate
+        self.calls = 0
+
+    def refund_batch(self, requests):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        out = {}
+        for r in requests:
+            if not r.txn_ref or not r.amount or r.amount <= 0:
+                out[r.refund_id] = RefundResult(False, error="94: invalid refund request", retryable=False)
+            elif random.random() < self.fail_rate:
+                out[r.refund_id] = RefundResult(False, error="99: gateway temporarily unavailable")
+            else:
+                out[r.refund_id] = RefundResult(True, gateway_ref=f"FAKE{uuid4().hex[:12].upper()}")
+        return out
+
+
+# ========= VNPay =========
+# Mã lỗi VNPay không nên thử lại (sai dữ liệu / giao dịch không hợp lệ)
+_VNP_FINAL_ERRORS = {"02", "03", "04", "13", "91", "93", "94", "95", "97"}
+
+
+class VnpayRefundClient(RefundGateway):
+    name = "vnpay"
+
+    def __init__(self, tmn_code: str, hash_secret: str, url: str = VNP_REFUND_URL, created_by: str = "system"):
+        self.tmn_code = tmn_code
+        self.hash_secret = hash_secret
+        self.url = url
+        self.created_by = created_by
+
+    def _sign(self, fields: list[str]) -> str:
+        data = "|".join(str(f) for f in fields)
+        return hmac.new(self.hash_secret.encode("utf-8"), data.encode("utf-8"), hashlib.sha512).hexdigest()
+
+    def _payload(self, r: RefundRequest) -> dict:
+        now = datetime.now(_TZ).strftime("%Y%m%d%H%M%S")
+        tx_date = (r.transaction_date or datetime.now(_TZ)).strftime("%Y%m%d%H%M%S")
+        p = {
+            "vnp_RequestId": uuid4().hex[:32],
+            "vnp_Version": "2.1.0",
+            "vnp_Command": "refund",
+            "vnp_TmnCode": self.tmn_code,
+            "vnp_TransactionType": "02",   # hoàn toàn phần
+            "vnp_TxnRef": r.txn_ref,
+            "vnp_Amount": int(r.amount),
+            "vnp_TransactionNo": r.transaction_no or "",
+            "vnp_TransactionDate": tx_date,
+            "vnp_CreateBy": self.created_by,
+            "vnp_CreateDate": now,
+            "vnp_IpAddr": "127.0.0.1",
+            "vnp_OrderInfo": (r.reason or f"Hoan tien {r.txn_ref}")[:255],
+        }
+        p["vnp_SecureHash"] = self._sign([
+            p["vnp_RequestId"], p["vnp_Version"], p["vnp_Command"], p["vnp_TmnCode"],
+            p["vnp_TransactionType"], p["vnp_TxnRef"], p["vnp_Amount"], p["vnp_TransactionNo"],
+            p["vnp_TransactionDate"], p["vnp_CreateBy"], p["vnp_CreateDate"], p["vnp_IpAddr"],
+            p["vnp_OrderInfo"],
+        ])
+        return p
+
+    def refund_batch(self, requests):
+        import requests as http
+
+        out = {}
+        with http.Session() as s:
+            for r in requests:
+                try:
+                    resp = s.post(self.url, json=self._payload(r), timeout=REFUND_HTTP_TIMEOUT)
+                    resp.raise_for_status()
+                    data = resp.json()
+                except Exception as ex:
+                    out[r.refund_id] = RefundResult(False, error=f"{type(ex).__name__}: {ex}"[:255])
+                    continue
+                code = str(data.get("vnp_ResponseCode", ""))
+                if code == "00":
+                    out[r.refund_id] = RefundResult(True, gateway_ref=str(data.get("vnp_TransactionNo") or ""))
+                else:
+                    out[r.refund_id] = RefundResult(
+                        False,
+                        error=f"{code}: {data.get('vnp_Message', '')}"[:255],
+                        retryable=code not in _VNP_FINAL_ERRORS,
+                    )
+        return out
+
+
+def default_gateway(app) -> RefundGateway:
+    gw = app.extensions.get("refund_gateway")
+    if gw is not None:
+        return gw
+    kind = os.getenv("REFUND_GATEWAY") or ("vnpay" if app.config.get("VNP_TMN_CODE") else "fake")
+    if kind == "vnpay":
+        gw = VnpayRefundClient(app.config["VNP_TMN_CODE"], app.config["VNP_HASH_SECRET"])
+    else:
+        gw = FakeVnpayRefundClient()
+    app.extensions["refund_gateway"] = gw
+    return gw
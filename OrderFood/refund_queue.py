@@ -0,0 +1,256 @@
+# OrderFood/refund_queue.py
+"""
+Hàng đợi hoàn tiền cho đơn bị huỷ sau khi đã thanh toán.
+
+- enqueue_refunds(order_ids, reason): 1 câu INSERT ... SELECT tạo dòng refund REQUESTED cho các
+  payment PAID chưa có refund (chạy lại không tạo trùng). Không commit — đi cùng transaction huỷ đơn.
+- RefundWorker (1 thread điều phối + ThreadPoolExecutor REFUND_WORKERS luồng): nhận lô bằng UPDATE
+  có điều kiện (claim_token), gửi cả lô sang gateway (refund_gateway.py).
+  Thành công -> COMPLETED + payment.status = REFUND; lỗi tạm thời -> thử lại với backoff;
+  lỗi cuối / quá REFUND_MAX_ATTEMPTS -> FAILED.
+- Request huỷ đơn chỉ INSERT vài dòng rồi trả về; đợt huỷ hàng loạt được worker xử lý dần.
+"""
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from uuid import uuid4
+from zoneinfo import ZoneInfo
+
+from sqlalchemy import func, or_, and_, select, insert, exists, update, literal
+
+from OrderFood import db
+from OrderFood.models import Refund, Payment, StatusRefund, StatusPayment
+from OrderFood.refund_gateway import RefundRequest, default_gateway
+
+_TZ = ZoneInfo("Asia/Ho_Chi_Minh")
+
+REFUND_WORKERS = int(os.getenv("REFUND_WORKERS", "2"))
+REFUND_BATCH_SIZE = int(os.getenv("REFUND_BATCH_SIZE", "20"))
+REFUND_MAX_ATTEMPTS = int(os.getenv("REFUND_MAX_ATTEMPTS", "6"))
+REFUND_POLL_SECONDS = float(os.getenv("REFUND_POLL_SECONDS", "30"))
+REFUND_BACKOFF_BASE = 60          # giây
+REFUND_BACKOFF_MAX = 6 * 60 * 60
+REFUND_LOCK_TIMEOUT = timedelta(minutes=15)
+
+
+def _now():
+    return datetime.now(_TZ).replace(tzinfo=None)
+
+
+# ========= Metrics =========
+_metrics_lock = threading.Lock()
+_metrics = {
+    "completed": 0,
+    "failed": 0,
+    "retried": 0,
+    "batches": 0,
+    "last_batch_seconds": None,
+    "last_error": None,
+}
+
+
+def _incr(**fields):
+    with _metrics_lock:
+        for k, v in fields.items():
+            if isinstance(v, int) and isinstance(_metrics.get(k), int):
+                _metrics[k] += v
+            else:
+                _metrics[k] = v
+
+
+def refund_metrics() -> dict:
+    with _metrics_lock:
+        data = dict(_metrics)
+    rows = db.session.query(Refund.status, func.count(Refund.refund_id)).group_by(Refund.status).all()
+    data["queue"] = {s.value: 0 for s in StatusRefund}
+    for status, n in rows:
+        data["queue"][getattr(status, "value", status)] = int(n or 0)
+    data["workers"] = REFUND_WORKERS
+    return data
+
+
+# ========= Enqueue =========
+def enqueue_refunds(order_ids, reason: str | None = None, wake: bool = True) -> int:
+    """Tạo refund REQUESTED cho payment PAID của các đơn (bỏ qua đơn đã có refund). Trả về số dòng."""
+    order_ids = [int(i) for i in order_ids or []]
+    if not order_ids:
+        return 0
+    now = _now()
+    src = (select(Payment.payment_id,
+                  literal(StatusRefund.REQUESTED.value),
+                  literal((reason or "Đơn hàng bị huỷ")[:255]),
+                  Payment.amount,
+                  literal(0),
+                  literal(now),
+                  literal(now))
+           .where(Payment.order_id.in_(order_ids),
+                  Payment.status == StatusPayment.PAID,
+                  ~exists().where(Refund.payment_id == Payment.payment_id)))
+    n = db.session.execute(
+        insert(Refund).from_select(
+            ["payment_id", "status", "reason", "amount", "attempts", "next_attempt_at", "created_at"], src)
+    ).rowcount or 0
+    if n and wake:
+        from OrderFood.unit_of_work import on_commit
+        on_commit(worker.wake)
+    return n
+
+
+def enqueue_refund(order, reason: str | None = None) -> int:
+    return enqueue_refunds([order.order_id], reason)
+
+
+# ========= Worker =========
+def _backoff_seconds(attempts: int) -> float:
+    delay = min(REFUND_BACKOFF_BASE * (2 ** max(attempts - 1, 0)), REFUND_BACKOFF_MAX)
+    return delay * random.uniform(0.8, 1.2)
+
+
+def _claim_batch(limit: int) -> list[int]:
+    now = _now()
+    due = or_(
+        and_(Refund.status == StatusRefund.REQUESTED, Refund.next_attempt_at <= now),
+        and_(Refund.status == StatusRefund.PROCESSING, Refund.locked_at < now - REFUND_LOCK_TIMEOUT),
+    )
+    ids = [r[0] for r in (db.session.query(Refund.refund_id)
+                          .filter(due)
+                          .order_by(Refund.next_attempt_at, Refund.refund_id)
+                          .limit(limit)
+                          .all())]
+    if not ids:
+        return []
+    token = uuid4().hex
+    (db.session.query(Refund)
+     .filter(Refund.refund_id.in_(ids), due)
+     .update({"status": StatusRefund.PROCESSING, "claim_token": token, "locked_at": now},
+             synchronize_session=False))
+    db.session.commit()
+    return [r[0] for r in db.session.query(Refund.refund_id).filter(Refund.claim_token == token).all()]
+
+
+def _process_batch(app, ids: list[int]) -> None:
+    with app.app_context():
+        started = time.monotonic()
+        try:
+            # ngày giao dịch gửi VNPay = vnp_PayDate lưu lúc IPN; payment cũ chưa có thì dùng created_at
+            rows = (db.session.query(Refund, Payment.txn_ref, Payment.vnp_transaction_no,
+                                     func.coalesce(Payment.vnp_pay_date, Payment.created_at))
+                    .join(Payment, Payment.payment_id == Refund.payment_id)
+                    .filter(Refund.refund_id.in_(ids))
+                    .all())
+            if not rows:
+                return
+            requests = [RefundRequest(r.refund_id, txn_ref, r.amount, tx_date, r.reason, tx_no)
+                        for r, txn_ref, tx_no, tx_date in rows]
+            try:
+                results = default_gateway(app).refund_batch(requests)
+            except Exception as ex:
+                results = {}
+                _incr(last_error=f"{type(ex).__name__}: {ex}"[:255])
+                app.logger.exception("refund gateway batch failed")
+
+            paid_ids = []
+            for refund, *_ in rows:
+                res = results.get(refund.refund_id)
+                if res is not None and res.ok:
+                    _mark_completed(refund, res.gateway_ref)
+                    paid_ids.append(refund.payment_id)
+                else:
+                    err = (res.error if res else None) or "no response from gateway"
+                    _mark_retry(refund, err, final=bool(res) and not res.retryable)
+            if paid_ids:
+                db.session.execute(
+                    update(Payment)
+                    .where(Payment.payment_id.in_(paid_ids))
+                    .values(status=StatusPayment.REFUND)
+                    .execution_options(synchronize_session=False)
+                )
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            app.logger.exception("refund batch failed")
+        finally:
+            _incr(batches=1, last_batch_seconds=round(time.monotonic() - started, 3))
+            db.session.remove()
+
+
+def _mark_completed(refund: Refund, gateway_ref: str | None) -> None:
+    refund.status = StatusRefund.COMPLETED
+    refund.attempts = (refund.attempts or 0) + 1
+    refund.gateway_ref = (gateway_ref or None) and gateway_ref[:64]
+    refund.completed_at = _now()
+    refund.claim_token = None
+    refund.locked_at = None
+    refund.last_error = None
+    _incr(completed=1)
+
+
+def _mark_retry(refund: Refund, error: str, final: bool = False) -> None:
+    refund.attempts = (refund.attempts or 0) + 1
+    refund.last_error = error[:255]
+    refund.claim_token = None
+    refund.locked_at = None
+    if final or refund.attempts >= REFUND_MAX_ATTEMPTS:
+        refund.status = StatusRefund.FAILED
+        _incr(failed=1, last_error=refund.last_error)
+    else:
+        refund.status = StatusRefund.REQUESTED
+        refund.next_attempt_at = _now() + timedelta(seconds=_backoff_seconds(refund.attempts))
+        _incr(retried=1, last_error=refund.last_error)
+
+
+class RefundWorker:
+    """Thread điều phối: chờ wake() hoặc hết REFUND_POLL_SECONDS, chia lô cho thread pool."""
+
+    def __init__(self, workers: int = REFUND_WORKERS, batch_size: int = REFUND_BATCH_SIZE):
+        self.workers = workers
+        self.batch_size = batch_size
+        self._event = threading.Event()
+        self._thread = None
+        self._pool = None
+        self._app = None
+
+    def start(self, app) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._app = app
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="refund")
+        self._thread = threading.Thread(target=self._loop, name="refund-dispatcher", daemon=True)
+        self._thread.start()
+        print("[REFUND] worker started")
+
+    def wake(self) -> None:
+        self._event.set()
+
+    def _loop(self) -> None:
+        while True:
+            self._event.wait(REFUND_POLL_SECONDS)
+            self._event.clear()
+            try:
+                self.drain()
+            except Exception:
+                self._app.logger.exception("refund dispatcher failed")
+
+    def drain(self) -> int:
+        """Xử lý hết refund đến hạn; trả về số refund đã nhận."""
+        handled = 0
+        with self._app.app_context():
+            try:
+                while True:
+                    ids = _claim_batch(self.batch_size * self.workers)
+                    if not ids:
+                        break
+                    handled += len(ids)
+                    chunks = [ids[i:i + self.batch_size] for i in range(0, len(ids), self.batch_size)]
+                    futures = [self._pool.submit(_process_batch, self._app, c) for c in chunks]
+                    for f in futures:
+                        f.result()
+            finally:
+                db.session.remove()
+        return handled
+
+
+worker = RefundWorker()
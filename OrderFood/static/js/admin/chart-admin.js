@@ -1,5 +1,6 @@
 let userOwnerChartInstance = null;
 let transactionChartInstance = null;
+let cohortChartInstance = null;
 
 // ========== User & Owner Chart ==========
 function loadUserOwnerChart() {
@@ -69,12 +70,51 @@ function loadTransactionChart() {
         });
 }
 
+// ========== Cohort Chart ==========
+function loadCohortChart() {
+    const months = document.getElementById("cohortMonths").value;
+
+    fetch(`/admin/api/stats/cohorts?months=${months}`)
+        .then(res => res.json())
+        .then(data => {
+            const ctx = document.getElementById("cohortChart").getContext("2d");
+
+            if (cohortChartInstance) {
+                cohortChartInstance.destroy();
+            }
+
+            document.getElementById("cohortComputedAt").textContent =
+                data.computed_at ? `Cập nhật lúc ${data.computed_at}` : "Chưa có dữ liệu";
+
+            cohortChartInstance = new Chart(ctx, {
+                data: {
+                    labels: data.labels,
+                    datasets: [
+                        { type: "bar", label: "Khách đăng ký", data: data.sizes, backgroundColor: "#9AD0F5", yAxisID: "y" },
+                        { type: "line", label: "Mua lại (%)", data: data.repeat_rate, borderColor: "#4BC0C0", tension: 0.3, yAxisID: "y1" },
+                        { type: "line", label: "Rời bỏ (%)", data: data.churn_rate, borderColor: "#FF6384", tension: 0.3, yAxisID: "y1" }
+                    ]
+                },
+                options: {
+                    responsive: true,
+                    scales: {
+                        y: { beginAtZero: true, position: "left" },
+                        y1: { beginAtZero: true, max: 100, position: "right", grid: { drawOnChartArea: false } }
+                    }
+                }
+            });
+        });
+}
+
 // ========== Event Listeners ==========
 document.addEventListener("DOMContentLoaded", () => {
     loadUserOwnerChart();
     loadTransactionChart();
+    loadCohortChart();
 
     document.getElementById("userOwnerPeriod").addEventListener("change", loadUserOwnerChart);
 
     document.getElementById("transactionPeriod").addEventListener("change", loadTransactionChart);
+
+    document.getElementById("cohortMonths").addEventListener("change", loadCohortChart);
 });
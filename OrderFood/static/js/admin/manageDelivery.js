@@ -0,0 +1,52 @@
+// static/js/admin/manageDelivery.js
+document.addEventListener("DOMContentLoaded", function () {
+  const selectAll = document.getElementById("bulkSelectAll");
+  const bulkCompleteBtn = document.getElementById("bulkCompleteBtn");
+
+  function selectedIds() {
+    return Array.from(document.querySelectorAll(".bulk-select:checked")).map(cb => parseInt(cb.value, 10));
+  }
+
+  function refreshBulkButtons() {
+    if (bulkCompleteBtn) bulkCompleteBtn.disabled = selectedIds().length === 0;
+  }
+
+  function setLoading(btn, isLoading) {
+    if (!btn) return;
+    btn.disabled = isLoading;
+    btn.style.opacity = isLoading ? "0.6" : "1";
+  }
+
+  selectAll?.addEventListener("change", () => {
+    document.querySelectorAll(".bulk-select").forEach(cb => { cb.checked = selectAll.checked; });
+    refreshBulkButtons();
+  });
+  document.addEventListener("change", (e) => {
+    if (e.target.classList?.contains("bulk-select")) refreshBulkButtons();
+  });
+
+  // ===== Giao nhiều đơn =====
+  bulkCompleteBtn?.addEventListener("click", async () => {
+    const ids = selectedIds();
+    if (!ids.length || !confirm(`Xác nhận đã giao ${ids.length} đơn?`)) return;
+
+    setLoading(bulkCompleteBtn, true);
+    try {
+      const res = await fetch("/admin/delivery/bulk_complete", {
+        method: "POST",
+        headers: { "Accept": "application/json", "Content-Type": "application/json" },
+        body: JSON.stringify({ order_ids: ids })
+      });
+      const data = await res.json().catch(() => ({}));
+      if (!res.ok) throw new Error(data.error || `HTTP ${res.status}`);
+
+      const failed = (data.results || []).filter(r => !r.ok).length;
+      window.Toast?.success?.(`Đã giao ${data.updated || 0} đơn` + (failed ? `, bỏ qua ${failed}` : ""));
+      setTimeout(() => window.location.reload(), 800);
+    } catch (err) {
+      console.error(err);
+      window.Toast?.error?.("Không thể thực hiện. Vui lòng thử lại.");
+      setLoading(bulkCompleteBtn, false);
+    }
+  });
+});
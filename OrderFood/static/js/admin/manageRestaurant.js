@@ -5,7 +5,7 @@
   }
 
   function setStatusBadge(row, statusText) {
-    const cell = row.querySelector(".rs-col--status") || row.querySelector("td:nth-child(4)");
+    const cell = row.querySelector(".rs-col--status") || row.querySelector("td:nth-child(5)");
     if (!cell) return;
     const map = {
       APPROVED: ["rs-badge rs-badge--ok", "APPROVED"],
@@ -38,6 +38,69 @@
     return res.json().catch(() => ({}));
   }
 
+  // ===== Bulk approve / reject =====
+  const selectAll = document.getElementById("bulkSelectAll");
+  const bulkApproveBtn = document.getElementById("bulkApproveBtn");
+  const bulkRejectBtn = document.getElementById("bulkRejectBtn");
+
+  function selectedIds() {
+    return Array.from(document.querySelectorAll(".bulk-select:checked")).map(cb => parseInt(cb.value, 10));
+  }
+
+  function refreshBulkButtons() {
+    const n = selectedIds().length;
+    if (bulkApproveBtn) bulkApproveBtn.disabled = n === 0;
+    if (bulkRejectBtn) bulkRejectBtn.disabled = n === 0;
+  }
+
+  selectAll?.addEventListener("change", () => {
+    document.querySelectorAll(".bulk-select").forEach(cb => { cb.checked = selectAll.checked; });
+    refreshBulkButtons();
+  });
+  document.addEventListener("change", (e) => {
+    if (e.target.classList?.contains("bulk-select")) refreshBulkButtons();
+  });
+
+  async function bulkModerate(action) {
+    const ids = selectedIds();
+    if (!ids.length) return;
+
+    let reason = null;
+    if (action === "reject") {
+      reason = prompt(`Lí do từ chối ${ids.length} nhà hàng:`);
+      if (reason == null || !reason.trim()) return;
+    } else if (!confirm(`Duyệt ${ids.length} nhà hàng đã chọn?`)) {
+      return;
+    }
+
+    setLoading(bulkApproveBtn, true);
+    setLoading(bulkRejectBtn, true);
+    try {
+      const data = await callPatch("/admin/restaurants/bulk", { ids, action, reason: reason && reason.trim() });
+      (data.results || []).forEach(r => {
+        const cb = document.querySelector(`.bulk-select[value="${r.id}"]`);
+        const row = cb && findRow(cb);
+        if (!row || !r.ok) return;
+        setStatusBadge(row, r.status);
+        row.querySelectorAll(".rs-action").forEach(b => b.remove());
+        cb.remove();
+      });
+      const failed = (data.results || []).filter(r => !r.ok).length;
+      window.Toast?.success?.(`Đã cập nhật ${data.updated || 0} nhà hàng` + (failed ? `, bỏ qua ${failed}` : ""));
+    } catch (err) {
+      console.error(err);
+      window.Toast?.error?.("Không thể thực hiện. Vui lòng thử lại.");
+    } finally {
+      setLoading(bulkApproveBtn, false);
+      setLoading(bulkRejectBtn, false);
+      if (selectAll) selectAll.checked = false;
+      refreshBulkButtons();
+    }
+  }
+
+  bulkApproveBtn?.addEventListener("click", () => bulkModerate("approve"));
+  bulkRejectBtn?.addEventListener("click", () => bulkModerate("reject"));
+
   document.addEventListener("click", async (e) => {
     const btn = e.target.closest(".rs-action");
     if (!btn) return;
@@ -25,6 +25,19 @@
     return res.json().catch(() => ({}));
   }
 
+  // Xoá chạy nền -> hỏi tiến độ cho tới khi xong
+  async function waitJob(jobId, btn) {
+    for (;;) {
+      await new Promise(r => setTimeout(r, 1000));
+      const res = await fetch(`/admin/jobs/${jobId}`, { headers: { "Accept": "application/json" } });
+      if (!res.ok) throw new Error(`HTTP ${res.status}`);
+      const job = await res.json();
+      if (job.status === "DONE") return job;
+      if (job.status === "FAILED") throw new Error(job.error || "Job failed");
+      if (btn && job.total) btn.title = `Đang xoá ${job.done || 0}/${job.total} đơn...`;
+    }
+  }
+
   // ===== Event listener =====
   document.addEventListener("click", async (e) => {
     const btn = e.target.closest(".rs-action--reject");
@@ -48,15 +61,16 @@
     try {
       let url = "";
       if (role === "CUSTOMER") {
-        url = `/admin/${userId}/delete_customer`; // endpoint xóa customer
+        url = `/admin/${userId}/delete_customer?async=1`; // endpoint xóa customer
       } else if (role === "RESTAURANT_OWNER") {
-        url = `/admin/${userId}/delete_owner`; // endpoint xóa owner
+        url = `/admin/${userId}/delete_owner?async=1`; // endpoint xóa owner
       } else {
         alert("Không thể xóa user này.");
         return;
       }
 
-      await callDelete(url);
+      const data = await callDelete(url);
+      if (data.job_id) await waitJob(data.job_id, btn);
 
       // Xóa row khỏi table
       row.remove();
@@ -69,16 +83,4 @@
     }
   }, true);
 
-  // ===== Tab switching =====
-  document.querySelectorAll(".tab-btn").forEach(btn => {
-    btn.addEventListener("click", e => {
-      document.querySelectorAll(".tab-btn").forEach(b => b.classList.remove("active"));
-      btn.classList.add("active");
-
-      document.querySelectorAll(".tab-content").forEach(tab => tab.classList.remove("active"));
-      const targetId = btn.dataset.target;
-      document.getElementById(targetId).classList.add("active");
-    });
-  });
-
 })();
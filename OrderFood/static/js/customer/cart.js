@@ -115,6 +115,18 @@ document.addEventListener('DOMContentLoaded', () => {
     });
 });
 
+// Giỏ thay đổi -> đổi idempotency key của nút thanh toán (lần bấm sau là 1 checkout mới)
+function rotateCheckoutKey() {
+    const link = document.getElementById('checkoutLink');
+    if (!link) return;
+    const url = new URL(link.href, window.location.origin);
+    const key = (window.crypto && crypto.randomUUID)
+        ? crypto.randomUUID().replace(/-/g, '')
+        : Date.now().toString(36) + Math.random().toString(36).slice(2);
+    url.searchParams.set('key', key);
+    link.href = url.toString();
+}
+
 function updateCartItem(itemId, quantity, note, row) {
     fetch(`/api/cart/${itemId}`, {
         method: "PUT",
@@ -126,6 +138,7 @@ function updateCartItem(itemId, quantity, note, row) {
         if (data.success) {
             row.querySelector('.cart-subtotal').textContent = data.subtotal.toLocaleString('vi-VN') + ' đ';
             document.getElementById('cart-total').textContent = data.total.toLocaleString('vi-VN') + ' đ';
+            rotateCheckoutKey();
         } else alert(data.error || "Có lỗi khi cập nhật sản phẩm");
     }).catch(err => console.error(err));
 }
@@ -139,6 +152,7 @@ function deleteCartItem(itemId, row) {
         if (data.success) {
             row.remove();
             updateCartCount(data.total_items);
+            rotateCheckoutKey();
 
             // Update tổng giá
             let total = 0;
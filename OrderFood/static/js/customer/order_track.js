@@ -19,3 +19,44 @@
     btn.addEventListener('mouseleave', () => paint(+input.value || 0));
   });
 })();
+
+// Theo dõi trạng thái đơn bằng long-poll (/api/order/<id>/status?since=<version>)
+(function () {
+  const card = document.getElementById('orderTrack');
+  if (!card || !card.dataset.statusUrl) return;
+  const url = card.dataset.statusUrl;
+  const timeline = card.querySelector('.timeline');
+  const steps = Array.from(card.querySelectorAll('.step'));
+  const lastLabel = document.getElementById('lastStepLabel');
+  const FINAL = ['CANCELED', 'COMPLETED'];
+  let status = card.dataset.status;
+
+  function render(s) {
+    timeline.style.setProperty('--active-idx', s.active_idx);
+    steps.forEach((el, i) => el.classList.toggle('active', i === s.active_idx));
+    if (lastLabel) lastLabel.textContent = s.last_label;
+  }
+
+  async function poll(since, delay) {
+    if (FINAL.includes(status)) return;
+    try {
+      const q = since == null ? '' : `?since=${since}`;
+      const res = await fetch(url + q, { headers: { 'Accept': 'application/json' } });
+      if (res.status === 401 || res.status === 403 || res.status === 404) return;
+      if (!res.ok) throw new Error(res.status);
+      const s = await res.json();
+      if (s.status !== status) {
+        status = s.status;
+        // hoàn thành -> tải lại để hiện form đánh giá
+        if (s.is_completed) return window.location.reload();
+        render(s);
+      }
+      poll(s.version, 1000);
+    } catch (err) {
+      // lỗi mạng / server: thử lại với backoff (tối đa 30s)
+      setTimeout(() => poll(since, Math.min(delay * 2, 30000)), delay);
+    }
+  }
+
+  poll(null, 1000);
+})();
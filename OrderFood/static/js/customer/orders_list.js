@@ -0,0 +1,50 @@
+// Đơn của tôi: cuộn tới cuối -> tải trang sau theo cursor (keyset), nối thêm dòng vào bảng
+(function () {
+  const more = document.getElementById('orderMore');
+  const tbody = document.getElementById('orderRows');
+  if (!more || !tbody || !more.dataset.cursor) return;
+
+  const btn = document.getElementById('orderMoreBtn');
+  let cursor = more.dataset.cursor;
+  let loading = false;
+
+  async function loadMore() {
+    if (loading || !cursor) return;
+    loading = true;
+    let ok = false;
+    if (btn) btn.classList.add('disabled');
+    try {
+      const res = await fetch(`${more.dataset.url}&cursor=${encodeURIComponent(cursor)}`);
+      if (!res.ok) throw new Error(res.status);
+      const tpl = document.createElement('tbody');
+      tpl.innerHTML = await res.text();
+      const marker = tpl.querySelector('tr[data-next-cursor]');
+      cursor = marker ? marker.dataset.nextCursor : '';
+      if (marker) marker.remove();
+      tbody.append(...tpl.children);
+      if (btn) {
+        if (cursor) btn.href = btn.href.replace(/cursor=[^&]*/, `cursor=${encodeURIComponent(cursor)}`);
+        else btn.remove();
+      }
+      ok = true;
+    } catch (err) {
+      console.error(err);
+    } finally {
+      loading = false;
+      if (btn) btn.classList.remove('disabled');
+    }
+    // trang ngắn: mốc cuối vẫn trong màn hình thì observer không báo lại -> tự tải tiếp
+    if (ok && cursor && more.getBoundingClientRect().top < window.innerHeight + 200) loadMore();
+  }
+
+  btn?.addEventListener('click', (e) => {
+    e.preventDefault();
+    loadMore();
+  });
+
+  if ('IntersectionObserver' in window) {
+    new IntersectionObserver((entries) => {
+      if (entries.some(e => e.isIntersecting)) loadMore();
+    }, { rootMargin: '200px' }).observe(more);
+  }
+})();
@@ -12,6 +12,84 @@
     btn.style.opacity = isLoading ? "0.6" : "1";
   }
 
+  // Cập nhật số trên tab (tab-count) sau khi duyệt / huỷ
+  function bumpCount(tab, delta) {
+    const el = document.getElementById(`${tab}-count`);
+    if (el) el.textContent = Math.max(0, (parseInt(el.textContent, 10) || 0) + delta);
+  }
+
+  // ===== Duyệt / huỷ nhiều đơn =====
+  const selectAll = document.getElementById("bulkSelectAll");
+  const bulkApproveBtn = document.getElementById("bulkApproveBtn");
+  const bulkCancelBtn = document.getElementById("bulkCancelBtn");
+
+  function selectedIds() {
+    return Array.from(document.querySelectorAll(".bulk-select:checked")).map(cb => parseInt(cb.value, 10));
+  }
+
+  function refreshBulkButtons() {
+    const n = selectedIds().length;
+    if (bulkApproveBtn) bulkApproveBtn.disabled = n === 0;
+    if (bulkCancelBtn) bulkCancelBtn.disabled = n === 0;
+  }
+
+  selectAll?.addEventListener("change", () => {
+    document.querySelectorAll(".bulk-select").forEach(cb => { cb.checked = selectAll.checked; });
+    refreshBulkButtons();
+  });
+  document.addEventListener("change", (e) => {
+    if (e.target.classList?.contains("bulk-select")) refreshBulkButtons();
+  });
+
+  async function bulkAction(action) {
+    const ids = selectedIds();
+    if (!ids.length) return;
+
+    let reason = null;
+    if (action === "cancel") {
+      reason = prompt(`Lý do hủy ${ids.length} đơn:`);
+      if (reason == null || !reason.trim()) return;
+    } else if (!confirm(`Duyệt ${ids.length} đơn đã chọn?`)) {
+      return;
+    }
+
+    setLoading(bulkApproveBtn, true);
+    setLoading(bulkCancelBtn, true);
+    try {
+      const res = await fetch(`/owner/orders/bulk/${action}`, {
+        method: "POST",
+        headers: { "Content-Type": "application/json", "Accept": "application/json" },
+        body: JSON.stringify({ order_ids: ids, reason: reason && reason.trim() })
+      });
+      const data = await res.json();
+      if (!res.ok) throw new Error(data.error || "Không thể thực hiện");
+
+      (data.results || []).forEach(r => {
+        if (!r.ok) return;
+        const row = document.querySelector(`#pending li.list-group-item[data-order-id="${r.id}"]`);
+        if (row) { row.dataset.done = "1"; row.remove(); }
+      });
+      bumpCount("pending", -(data.updated || 0));
+      bumpCount(action === "approve" ? "approved" : "cancelled", data.updated || 0);
+
+      const failed = (data.results || []).filter(r => !r.ok).length;
+      if (window.Toast) Toast.success(`Đã cập nhật ${data.updated || 0} đơn` + (failed ? `, bỏ qua ${failed}` : ""));
+      // tab Đã duyệt / Đã hủy cần dữ liệu đầy đủ -> tải lại
+      if (data.updated) setTimeout(() => window.location.reload(), 800);
+    } catch (err) {
+      console.error(err);
+      if (window.Toast) Toast.error(err.message);
+    } finally {
+      setLoading(bulkApproveBtn, false);
+      setLoading(bulkCancelBtn, false);
+      if (selectAll) selectAll.checked = false;
+      refreshBulkButtons();
+    }
+  }
+
+  bulkApproveBtn?.addEventListener("click", () => bulkAction("approve"));
+  bulkCancelBtn?.addEventListener("click", () => bulkAction("cancel"));
+
   // Duyệt đơn
   document.addEventListener("click", async (e) => {
     const btn = e.target.closest(".approve-order-btn");
@@ -30,6 +108,7 @@
       const data = await res.json();
       if (!res.ok || data.status !== "ACCEPTED") throw new Error(data.error || "Không thể duyệt đơn");
 
+      row.dataset.done = "1";   // live board bỏ qua event của chính thao tác này
       row.style.transition = "opacity 0.3s";
       row.style.opacity = 0;
       setTimeout(() => row.remove(), 350);
@@ -38,6 +117,7 @@
       if (approvedTab) {
         const li = document.createElement("li");
         li.className = "list-group-item";
+        li.dataset.orderId = data.order_id;
         let itemsHTML = "";
         if (data.items) itemsHTML = data.items.map(i => `- ${i.name} x ${i.quantity}`).join("<br>");
         li.innerHTML = `
@@ -49,6 +129,8 @@
         `;
         approvedTab.appendChild(li);
       }
+      bumpCount("pending", -1);
+      bumpCount("approved", 1);
 
       if (window.Toast) Toast.success("Đã duyệt đơn!");
     } catch (err) {
@@ -84,6 +166,7 @@ document.addEventListener("submit", async (e) => {
     if (!res.ok) throw new Error(data.error || "Không thể hủy đơn");
 
     // Ẩn row tab Pending
+    row.dataset.done = "1";
     row.style.transition = "opacity 0.3s";
     row.style.opacity = 0;
     setTimeout(() => row.remove(), 350);
@@ -97,8 +180,10 @@ document.addEventListener("submit", async (e) => {
         Đơn #${data.order_id} - ${data.customer_name} - <span class="text-danger">Đã hủy</span>
         <br><small><strong>Lý do:</strong> ${data.reason}</small>
       `;
-      cancelledTab.appendChild(li);
+      cancelledTab.prepend(li);   // lịch sử: mới nhất trước
     }
+    bumpCount("pending", -1);
+    bumpCount("cancelled", 1);
 
     if (window.Toast) Toast.success("Đã hủy đơn!");
   } catch (err) {
@@ -108,4 +193,167 @@ document.addEventListener("submit", async (e) => {
     setLoading(btn, false);
   }
 });
+
+  // ===== Bảng đơn realtime (WebSocket) =====
+  const board = document.getElementById("orderBoard");
+  const wsUrl = board?.dataset.wsUrl;
+  const liveStatus = document.getElementById("liveStatus");
+
+  function esc(v) {
+    return String(v ?? "").replace(/[&<>"']/g, c => ({
+      "&": "&amp;", "<": "&lt;", ">": "&gt;", '"': "&quot;", "'": "&#39;"
+    })[c]);
+  }
+
+  function itemsHTML(o) {
+    return (o.items || []).map(i => `- ${esc(i.name)} x ${esc(i.quantity)}`).join("<br>");
+  }
+
+  function liveRow(tab, id) {
+    const row = document.querySelector(`#${tab} li.list-group-item[data-order-id="${id}"]`);
+    return row && !row.dataset.done ? row : null;
+  }
+
+  function refreshPendingEmpty() {
+    const empty = document.getElementById("pendingEmpty");
+    const list = document.getElementById("pendingList");
+    if (empty && list) empty.classList.toggle("d-none", list.children.length > 0);
+  }
+
+  function addPending(o) {
+    const list = document.getElementById("pendingList");
+    if (!list || list.querySelector(`li[data-order-id="${o.order_id}"]`)) return;
+    const li = document.createElement("li");
+    li.className = "list-group-item";
+    li.dataset.orderId = o.order_id;
+    li.innerHTML = `
+      <div class="d-flex justify-content-between align-items-center">
+        <span>
+          <input type="checkbox" class="bulk-select me-2" value="${o.order_id}">
+          Đơn #${o.order_id} - ${esc(o.customer_name)} - ${esc(o.total_price)} VNĐ
+          <span class="badge bg-warning text-dark ms-1">Mới</span>
+        </span>
+        <button class="btn btn-sm btn-info" data-bs-toggle="collapse" data-bs-target="#order-detail-${o.order_id}">
+          Chi tiết
+        </button>
+      </div>
+      <div id="order-detail-${o.order_id}" class="collapse mt-2">
+        <p><strong>Khách hàng:</strong> ${esc(o.customer_name)}</p>
+        <p><strong>Sản phẩm:</strong><br>${itemsHTML(o)}</p>
+        <p><strong>Tổng tiền:</strong> ${esc(o.total_price)} VNĐ</p>
+        <button type="button" class="btn btn-success btn-sm approve-order-btn" data-order-id="${o.order_id}">
+          Duyệt đơn
+        </button>
+        <button class="btn btn-danger btn-sm" data-bs-toggle="collapse" data-bs-target="#cancel-form-${o.order_id}">
+          Hủy đơn
+        </button>
+        <div id="cancel-form-${o.order_id}" class="collapse mt-2">
+          <form class="cancel-order-form" data-order-id="${o.order_id}">
+            <div class="mb-2">
+              <textarea class="form-control" name="reason" placeholder="Nhập lý do hủy đơn..." required></textarea>
+            </div>
+            <button type="submit" class="btn btn-danger btn-sm">Xác nhận hủy</button>
+          </form>
+        </div>
+      </div>`;
+    list.appendChild(li);
+    bumpCount("pending", 1);
+    refreshPendingEmpty();
+  }
+
+  function addApproved(o) {
+    const list = document.querySelector("#approved ul.list-group");
+    if (!list || list.querySelector(`li[data-order-id="${o.order_id}"]`)) return;
+    const li = document.createElement("li");
+    li.className = "list-group-item";
+    li.dataset.orderId = o.order_id;
+    li.innerHTML = `
+      <div>Đơn #${o.order_id} - ${esc(o.customer_name)} - ${esc(o.total_price)} VNĐ</div>
+      <div style="margin-top: 5px;"><strong>Sản phẩm:</strong><br>${itemsHTML(o)}</div>
+      <span class="order-status-badge"><span class="badge bg-info">Đã duyệt</span></span>`;
+    list.appendChild(li);
+  }
+
+  function prependHistory(tab, html) {
+    const list = document.querySelector(`#${tab} ul.list-group`);
+    if (!list) return;
+    const li = document.createElement("li");
+    li.className = "list-group-item";
+    li.innerHTML = html;
+    list.prepend(li);
+  }
+
+  // Chuyển đơn khỏi tab Chưa duyệt / Đã duyệt; false nếu đơn không có trên bảng (hoặc đã tự xử lý)
+  function takeActive(id) {
+    for (const tab of ["pending", "approved"]) {
+      const row = liveRow(tab, id);
+      if (row) {
+        row.remove();
+        bumpCount(tab, -1);
+        refreshPendingEmpty();
+        return true;
+      }
+    }
+    return false;
+  }
+
+  const handlers = {
+    "order-created": o => {
+      if (window.Toast) Toast.info?.(`Đơn #${o.order_id} đang chờ khách thanh toán`);
+    },
+    "order-paid": o => {
+      addPending(o);
+      if (window.Toast) Toast.success(`Đơn mới #${o.order_id}`);
+    },
+    "order-accepted": o => {
+      const row = liveRow("pending", o.order_id);
+      if (!row) return;
+      row.remove();
+      bumpCount("pending", -1);
+      bumpCount("approved", 1);
+      refreshPendingEmpty();
+      addApproved(o);
+    },
+    "order-completed": o => {
+      if (!takeActive(o.order_id)) return;
+      bumpCount("completed", 1);
+      prependHistory("completed",
+        `Đơn #${o.order_id} - ${esc(o.customer_name)} - <span class="text-success">Hoàn thành</span>`);
+    },
+    "order-cancelled": o => {
+      if (!takeActive(o.order_id)) return;
+      bumpCount("cancelled", 1);
+      prependHistory("cancelled",
+        `Đơn #${o.order_id} - ${esc(o.customer_name)} - <span class="text-danger">Đã hủy</span>
+         <br><small><strong>Lý do:</strong> ${esc(o.reason)}</small>`);
+    },
+  };
+  handlers["order-expired"] = handlers["order-cancelled"];
+
+  function connectLive(delay) {
+    let ws;
+    try {
+      ws = new WebSocket(wsUrl);
+    } catch (err) {
+      console.error(err);
+      return;
+    }
+    ws.onopen = () => {
+      delay = 1000;
+      liveStatus?.classList.remove("d-none");
+    };
+    ws.onmessage = (e) => {
+      let msg;
+      try { msg = JSON.parse(e.data); } catch { return; }
+      const fn = handlers[msg.type];
+      if (fn && msg.order) fn(msg.order);
+    };
+    ws.onclose = () => {
+      liveStatus?.classList.add("d-none");
+      // kết nối lại với backoff (tối đa 30s)
+      setTimeout(() => connectLive(Math.min(delay * 2, 30000)), delay);
+    };
+  }
+
+  if (wsUrl && "WebSocket" in window) connectLive(1000);
 })();
\ No newline at end of file
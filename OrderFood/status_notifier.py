@@ -0,0 +1,123 @@
+# OrderFood/status_notifier.py
+"""
+Theo dõi trạng thái đơn cho trang tracking (long-poll /api/order/<id>/status?since=<version>).
+
+- version = event_id mới nhất của đơn trong order_event (tăng dần, giống nhau giữa các process).
+- Đơn được theo dõi giữ trong RAM: (status, version, customer_id). Lần đầu hỏi 1 câu SELECT,
+  sau đó cập nhật bằng consumer local "status" của dispatcher -> client chờ trên Condition riêng
+  của đơn, không query lặp lại.
+- STATUS_WATCH_REFRESH_SECONDS: quá hạn thì đọc lại DB (lưới an toàn khi lỡ event).
+- Giữ tối đa STATUS_WATCH_MAX đơn (bỏ đơn cũ nhất không còn ai chờ).
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import func, select
+
+from OrderFood import db
+from OrderFood.models import Order, OrderEvent
+from OrderFood.order_events import dispatcher
+
+STATUS_LONG_POLL_SECONDS = float(os.getenv("STATUS_LONG_POLL_SECONDS", "25"))
+STATUS_WATCH_REFRESH_SECONDS = float(os.getenv("STATUS_WATCH_REFRESH_SECONDS", "60"))
+STATUS_WATCH_MAX = 10000
+
+
+class _Watch:
+    __slots__ = ("status", "version", "customer_id", "loaded_at", "waiters", "cond")
+
+    def __init__(self, status: str, version: int, customer_id: int, lock):
+        self.status = status
+        self.version = version
+        self.customer_id = customer_id
+        self.loaded_at = time.monotonic()
+        self.waiters = 0
+        self.cond = threading.Condition(lock)
+
+
+class StatusNotifier:
+    def __init__(self, refresh_seconds: float = STATUS_WATCH_REFRESH_SECONDS, max_orders: int = STATUS_WATCH_MAX):
+        self.refresh_seconds = refresh_seconds
+        self.max_orders = max_orders
+        self._lock = threading.Lock()
+        self._watches: "OrderedDict[int, _Watch]" = OrderedDict()
+
+    def _load(self, order_id: int):
+        """(status, version, customer_id) từ DB, None nếu không có đơn."""
+        version = (select(func.max(OrderEvent.event_id))
+                   .where(OrderEvent.order_id == Order.order_id)
+                   .scalar_subquery())
+        row = (db.session.query(Order.status, Order.customer_id, version)
+               .filter(Order.order_id == order_id)
+               .first())
+        if row is None:
+            return None
+        status, customer_id, version = row
+        return status.value, int(version or 0), customer_id
+
+    def _prune(self) -> None:
+        for oid in list(self._watches):
+            if len(self._watches) < self.max_orders:
+                return
+            if self._watches[oid].waiters == 0:
+                del self._watches[oid]
+
+    def current(self, order_id: int):
+        """
+        (status, version, customer_id) của đơn; None nếu không tồn tại.
+        Chỉ query khi đơn chưa được theo dõi hoặc bản trong RAM đã quá STATUS_WATCH_REFRESH_SECONDS.
+        """
+        with self._lock:
+            w = self._watches.get(order_id)
+            if w is not None and time.monotonic() - w.loaded_at < self.refresh_seconds:
+                self._watches.move_to_end(order_id)
+                return w.status, w.version, w.customer_id
+
+        loaded = self._load(order_id)
+        if loaded is None:
+            return None
+        status, version, customer_id = loaded
+        with self._lock:
+            w = self._watches.get(order_id)
+            if w is None:
+                self._prune()
+                self._watches[order_id] = _Watch(status, version, customer_id, self._lock)
+            else:
+                if version >= w.version:
+                    w.status, w.version = status, version
+                w.loaded_at = time.monotonic()
+                w.cond.notify_all()
+            w = self._watches[order_id]
+            return w.status, w.version, w.customer_id
+
+    def wait(self, order_id: int, since: int, timeout: float):
+        """Chờ tới khi version != since hoặc hết timeout. Trả về (status, version)."""
+        with self._lock:
+            w = self._watches.get(order_id)
+            if w is None:
+                return None
+            w.waiters += 1
+            try:
+                w.cond.wait_for(lambda: w.version != since, timeout)
+            finally:
+                w.waiters -= 1
+            return w.status, w.version
+
+    def update(self, order_id: int, status: str, version: int) -> None:
+        with self._lock:
+            w = self._watches.get(order_id)
+            if w is None or version <= w.version:
+                return
+            w.status, w.version = status, version
+            w.cond.notify_all()
+
+
+status_notifier = StatusNotifier()
+
+
+@dispatcher.register("status", local=True)
+def _on_order_events(events):
+    for e in events:
+        status_notifier.update(e.order_id, e.status, e.event_id)
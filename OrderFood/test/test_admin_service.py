@@ -2,6 +2,7 @@ import unittest
 import pytest
 from unittest.mock import patch, MagicMock
 from flask import session, url_for
+from OrderFood import app
 from OrderFood.admin_service import admin_bp, is_admin, approve_restaurant, reject_restaurant
 from OrderFood.models import StatusRes
 
@@ -35,7 +36,7 @@ class MyTestCase(unittest.TestCase):
         mock_res.owner.user.email = "owner@example.com"
 
         with patch("OrderFood.admin_service.get_restaurant_by_id", return_value=mock_res):
-            with patch("OrderFood.admin_service.db.session.commit") as mock_commit:
+            with patch("OrderFood.admin_service.db.session.flush") as mock_flush:
                 with patch("OrderFood.admin_service.send_restaurant_status_email") as mock_email:
                     with client.session_transaction() as sess:
                         sess["role"] = "admin"
@@ -47,7 +48,7 @@ class MyTestCase(unittest.TestCase):
                     assert response.status_code == 200
                     assert data["ok"] is True
                     assert data["status"] == mock_res.status.value
-                    mock_commit.assert_called_once()
+                    mock_flush.assert_called_once()
                     mock_email.assert_called_once_with("owner@example.com", mock_res.name, "APPROVED")
 
     def test_reject_restaurant_forbidden(client):
@@ -62,7 +63,7 @@ class MyTestCase(unittest.TestCase):
         mock_res.owner.user.email = "owner@example.com"
 
         with patch("OrderFood.admin_service.get_restaurant_by_id", return_value=mock_res):
-            with patch("OrderFood.admin_service.db.session.commit") as mock_commit:
+            with patch("OrderFood.admin_service.db.session.flush") as mock_flush:
                 with patch("OrderFood.admin_service.send_restaurant_status_email") as mock_email:
                     with client.session_transaction() as sess:
                         sess["role"] = "admin"
@@ -75,25 +76,59 @@ class MyTestCase(unittest.TestCase):
                     assert data["ok"] is True
                     assert data["id"] == 1
                     assert data["status"] == mock_res.status.value
-                    mock_commit.assert_called_once()
+                    mock_flush.assert_called_once()
                     mock_email.assert_called_once()
 
-    def test_mark_completed(client):
-        mock_order = MagicMock()
-        mock_order.status = MagicMock()
-        mock_order.status = "ACCEPTED"
 
-        with patch("OrderFood.admin_service.Order.query.get_or_404", return_value=mock_order):
-            with patch("OrderFood.admin_service.db.session.commit") as mock_commit:
-                with patch("OrderFood.admin_service.push_customer_noti_on_completed") as mock_noti:
-                    with client.session_transaction() as sess:
-                        sess["role"] = "admin"
-                        sess["user_id"] = 1
+class TestAdminDeliveryRoutes(unittest.TestCase):
+    """Route giao hàng của admin qua app.test_client() (admin_bp đã đăng ký trong create_app)."""
 
-                    response = client.post("/admin/delivery/mark_completed/1")
-                    assert response.status_code == 302  # redirect
-                    mock_commit.assert_called_once()
-                    mock_noti.assert_called_once_with(mock_order)
+    def setUp(self):
+        app.config["TESTING"] = True
+        self.client = app.test_client()
+        with self.client.session_transaction() as sess:
+            sess["role"] = "admin"
+            sess["user_id"] = 7
+
+    def test_mark_completed(self):
+        with patch("OrderFood.admin_service.order_machine.apply", return_value=True) as mock_apply, \
+                patch("OrderFood.admin_service.db.session.get") as mock_get:
+            response = self.client.post("/admin/delivery/mark_completed/1")
+
+        self.assertEqual(response.status_code, 302)  # redirect về trang giao hàng; commit do unit of work
+        mock_get.assert_not_called()
+        mock_apply.assert_called_once_with("complete", 1, values={"delivery_id": 7})
+
+    def test_mark_completed_unknown_order(self):
+        with patch("OrderFood.admin_service.order_machine.apply", return_value=False), \
+                patch("OrderFood.admin_service.db.session.get", return_value=None):
+            response = self.client.post("/admin/delivery/mark_completed/99")
+
+        self.assertEqual(response.status_code, 404)
+
+    def test_bulk_mark_completed(self):
+        results = [{"id": 1, "ok": True, "status": "COMPLETED"},
+                   {"id": 2, "ok": False, "error": "invalid_status", "status": "PAID"}]
+        with patch("OrderFood.admin_service.complete_orders", return_value=(1, results)) as mock_complete, \
+                patch("OrderFood.admin_service.db.session.commit"):
+            response = self.client.post("/admin/delivery/bulk_complete", json={"order_ids": [1, "2", 1]})
+
+        data = response.get_json()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data["updated"], 1)
+        self.assertEqual(data["results"], results)
+        mock_complete.assert_called_once_with(7, [1, 2])
+
+    def test_bulk_mark_completed_empty(self):
+        response = self.client.post("/admin/delivery/bulk_complete", json={"order_ids": []})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.get_json()["error"], "empty_ids")
+
+    def test_bulk_mark_completed_forbidden(self):
+        with self.client.session_transaction() as sess:
+            sess["role"] = "customer"
+        response = self.client.post("/admin/delivery/bulk_complete", json={"order_ids": [1]})
+        self.assertEqual(response.status_code, 403)
 
 
 # add assertion here
@@ -0,0 +1,109 @@
+import unittest
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+from OrderFood.checkout_service import (
+    prepare_checkout, READY, KEY_CONFLICT, ALREADY_PAID, CANCELED
+)
+from OrderFood.models import StatusOrder, StatusPayment
+
+
+def _line(dish_id, quantity, price=20000):
+    return {"dish_id": dish_id, "name": f"Món {dish_id}", "price": price, "quantity": quantity, "note": ""}
+
+
+def _order(status=StatusOrder.PENDING, lines=((1, 2),), total=40000):
+    payment = SimpleNamespace(status=StatusPayment.PENDING, txn_ref="OD5-old", amount=int(total) * 100)
+    return SimpleNamespace(order_id=5, restaurant_id=1, status=status, total_price=total, waiting_time=10,
+                           idempotency_key="old-key-123", payment=payment,
+                           lines=[SimpleNamespace(dish_id=d, quantity=q) for d, q in lines])
+
+
+class TestPrepareCheckout(unittest.TestCase):
+    def setUp(self):
+        self.order_cls = MagicMock()
+        self.new_txn_ref = MagicMock(return_value="OD5-new")
+        patch("OrderFood.checkout_service.Order", self.order_cls).start()
+        self.db = patch("OrderFood.checkout_service.db").start()
+        patch("OrderFood.checkout_service.record_events").start()
+        self.write_lines = patch("OrderFood.checkout_service._write_lines").start()
+        self.addCleanup(patch.stopall)
+
+    def _found(self, by_key=None, by_cart=None):
+        query = self.order_cls.query.filter.return_value
+        query.first.return_value = by_key
+        query.with_for_update.return_value.first.return_value = by_cart
+
+    def _cart(self, *lines, cart_id=9):
+        return patch("OrderFood.checkout_service.price_active_cart", return_value=(cart_id, list(lines)))
+
+    def test_same_key_reuses_order_without_new_txn_ref(self):
+        order = _order()
+        self._found(by_key=order)
+        with self._cart(_line(1, 2)):
+            result, got, payment = prepare_checkout(3, 1, "same-key-123", 10, self.new_txn_ref)
+        self.assertEqual(result, READY)
+        self.assertIs(got, order)
+        self.assertEqual(payment.txn_ref, "OD5-old")
+        self.new_txn_ref.assert_not_called()
+        self.write_lines.assert_not_called()
+
+    def test_same_key_after_cart_change_is_conflict(self):
+        order = _order()
+        self._found(by_key=order)
+        with self._cart(_line(1, 3)):
+            result, got, _ = prepare_checkout(3, 1, "same-key-123", 10, self.new_txn_ref)
+        self.assertEqual(result, KEY_CONFLICT)
+        self.assertIs(got, order)
+        self.assertEqual(order.total_price, 40000)
+        self.new_txn_ref.assert_not_called()
+
+    def test_new_key_reprices_pending_order_after_cart_change(self):
+        order = _order()
+        self._found(by_cart=order)
+        lines = [_line(1, 2), _line(2, 1, price=15000)]
+        with self._cart(*lines):
+            result, got, payment = prepare_checkout(3, 1, "new-key-456", 10, self.new_txn_ref)
+        self.assertEqual(result, READY)
+        self.assertEqual(order.idempotency_key, "new-key-456")
+        self.assertEqual(order.total_price, 55000)
+        self.write_lines.assert_called_once_with(order, lines, replace=True)
+        self.assertEqual(payment.txn_ref, "OD5-new")
+        self.assertEqual(payment.amount, 5500000)
+
+    def test_paid_order_is_already_paid(self):
+        self._found(by_key=_order(status=StatusOrder.PAID))
+        result, _, _ = prepare_checkout(3, 1, "same-key-123", 10, self.new_txn_ref)
+        self.assertEqual(result, ALREADY_PAID)
+
+    def test_canceled_order_is_not_reported_as_paid(self):
+        self._found(by_key=_order(status=StatusOrder.CANCELED))
+        result, _, _ = prepare_checkout(3, 1, "same-key-123", 10, self.new_txn_ref)
+        self.assertEqual(result, CANCELED)
+
+        self._found(by_cart=_order(status=StatusOrder.CANCELED))
+        with self._cart(_line(1, 2)):
+            result, _, _ = prepare_checkout(3, 1, "new-key-456", 10, self.new_txn_ref)
+        self.assertEqual(result, CANCELED)
+
+    def test_cancel_then_checkout_starts_new_order(self):
+        # đơn PENDING của giỏ 9 bị admin huỷ: lần checkout đầu báo huỷ và đóng giỏ 9
+        self._found(by_cart=_order(status=StatusOrder.CANCELED))
+        with self._cart(_line(1, 2)):
+            result, _, _ = prepare_checkout(3, 1, "new-key-456", 10, self.new_txn_ref)
+        self.assertEqual(result, CANCELED)
+        stmt = self.db.session.execute.call_args.args[0]
+        self.assertEqual(stmt.table.name, "cart")
+        self.assertIn("CHECKOUT", {str(getattr(v, "value", v)) for v in stmt.compile().params.values()})
+
+        # giỏ mới (10) không có đơn -> tạo đơn mới bình thường
+        self._found(by_cart=None)
+        with self._cart(_line(1, 2), cart_id=10):
+            result, order, _ = prepare_checkout(3, 1, "new-key-789", 10, self.new_txn_ref)
+        self.assertEqual(result, READY)
+        self.assertEqual(self.order_cls.call_args.kwargs["cart_id"], 10)
+        self.assertEqual(self.order_cls.call_args.kwargs["status"], StatusOrder.PENDING)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -99,5 +99,25 @@ class MyTestCase(unittest.TestCase):
                 assert b"order_track.html" in response.data or b"html" in response.data
 
 
+
+class TestCustomerOrderHistory(unittest.TestCase):
+    def test_normalize_status_filter(self):
+        from OrderFood.dao.customer_dao import normalize_status_filter
+        self.assertEqual(normalize_status_filter(" accept "), "ACCEPTED")
+        self.assertEqual(normalize_status_filter("paid"), "PAID")
+        self.assertEqual(normalize_status_filter("bogus"), "")
+
+    def test_status_counts_cached_until_invalidated(self):
+        from OrderFood.dao import customer_dao
+        counts = {"PENDING": 0, "PAID": 1, "ACCEPTED": 0, "CANCELED": 2, "COMPLETED": 5}
+        with patch.object(customer_dao, "count_customer_orders_by_status", return_value=counts) as mock_count:
+            customer_dao.invalidate_customer_status_counts([42])
+            self.assertEqual(customer_dao.cached_customer_status_counts(42), counts)
+            customer_dao.cached_customer_status_counts(42)
+            self.assertEqual(mock_count.call_count, 1)
+            customer_dao.invalidate_customer_status_counts([42])
+            customer_dao.cached_customer_status_counts(42)
+            self.assertEqual(mock_count.call_count, 2)
+
 if __name__ == '__main__':
     unittest.main()
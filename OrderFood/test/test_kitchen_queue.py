@@ -0,0 +1,42 @@
+import time
+import unittest
+from datetime import datetime
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from OrderFood.kitchen_queue import KitchenQueue, _Board
+from OrderFood.models import StatusOrder
+from OrderFood.order_state_machine import COMPLETE, OWNER_CANCEL
+
+
+def _row(order_id, minute, waiting=10, status=StatusOrder.PAID):
+    return SimpleNamespace(order_id=order_id, restaurant_id=1, status=status, total_price=100.0,
+                           created_date=datetime(2025, 1, 1, 12, minute), waiting_time=waiting)
+
+
+class TestKitchenQueue(unittest.TestCase):
+    def setUp(self):
+        self.queue = KitchenQueue(refresh_seconds=60)
+        # hạn: #1 12:20, #2 12:10, #3 12:15
+        self.queue._boards[1] = _Board([_row(1, 10), _row(2, 0), _row(3, 5)], time.monotonic())
+
+    def test_snapshot_sorted_by_deadline_without_query(self):
+        with patch.object(self.queue, "_load") as mock_load:
+            items = self.queue.snapshot(1)
+        mock_load.assert_not_called()
+        self.assertEqual([it["order_id"] for it in items], [2, 3, 1])
+
+    def test_terminal_events_remove_orders(self):
+        events = [SimpleNamespace(order_id=2, restaurant_id=1, transition=COMPLETE),
+                  SimpleNamespace(order_id=3, restaurant_id=1, transition=OWNER_CANCEL)]
+        self.queue.apply(events)
+        self.assertEqual(list(self.queue._boards[1].entries), [1])
+
+    def test_events_for_unloaded_restaurant_ignored(self):
+        events = [SimpleNamespace(order_id=9, restaurant_id=5, transition=COMPLETE)]
+        self.queue.apply(events)
+        self.assertNotIn(5, self.queue._boards)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,41 @@
+import unittest
+from types import SimpleNamespace
+
+from OrderFood.live_board import LiveBroker, order_card
+from OrderFood.models import StatusOrder
+from OrderFood.order_state_machine import PAY, OWNER_CANCEL, EXPIRE, EXPIRE_MESSAGE
+
+
+def _order():
+    return SimpleNamespace(
+        order_id=7, status=StatusOrder.PAID, total_price=120000.0,
+        customer=SimpleNamespace(user=SimpleNamespace(name="An")),
+        lines=[SimpleNamespace(dish_name="Phở", quantity=2)],
+    )
+
+
+class TestOrderCard(unittest.TestCase):
+    def test_paid_card_has_items(self):
+        card = order_card(_order(), PAY, {})
+        self.assertEqual(card["customer_name"], "An")
+        self.assertEqual(card["items"], [{"name": "Phở", "quantity": 2}])
+        self.assertNotIn("reason", card)
+
+    def test_cancel_reason(self):
+        self.assertEqual(order_card(_order(), OWNER_CANCEL, {"reason": " Hết món "})["reason"], "Hết món")
+        self.assertEqual(order_card(_order(), EXPIRE, {})["reason"], EXPIRE_MESSAGE)
+
+
+class TestBroker(unittest.TestCase):
+    def test_same_origin(self):
+        self.assertTrue(LiveBroker._same_origin({"Origin": "http://shop.vn:5000", "Host": "shop.vn:5001"}))
+        self.assertFalse(LiveBroker._same_origin({"Origin": "http://evil.vn", "Host": "shop.vn:5001"}))
+
+    def test_publish_without_subscribers_is_noop(self):
+        broker = LiveBroker()
+        broker.publish(1, {"type": "order-paid"})
+        self.assertEqual(broker.connections(), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
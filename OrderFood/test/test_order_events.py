@@ -0,0 +1,83 @@
+import unittest
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from OrderFood.order_events import (
+    _contiguous, _update_gaps, _notification_rows,
+    ORDER_EVENT_GAP_SECONDS, ORDER_EVENT_GAP_MAX_SECONDS, ORDER_EVENT_MAX_GAPS
+)
+from OrderFood.order_state_machine import PAY, OWNER_CANCEL, EXPIRE
+
+
+def _event(event_id, created_at, transition=PAY, **kw):
+    return SimpleNamespace(event_id=event_id, created_at=created_at, transition=transition,
+                           order_id=kw.get("order_id", 1), customer_id=kw.get("customer_id", 10),
+                           restaurant_id=1, data=kw.get("data", {}))
+
+
+class TestContiguous(unittest.TestCase):
+    def setUp(self):
+        self.now = datetime(2025, 1, 1, 12, 0, 0)
+
+    def test_stops_before_recent_gap(self):
+        rows = [_event(5, self.now), _event(6, self.now), _event(8, self.now)]
+        out, skipped = _contiguous(rows, 4, self.now)
+        self.assertEqual([r.event_id for r in out], [5, 6])
+        self.assertEqual(skipped, [])
+
+    def test_skips_old_gap(self):
+        old = self.now - timedelta(seconds=ORDER_EVENT_GAP_SECONDS + 1)
+        rows = [_event(5, old), _event(7, old), _event(10, old)]
+        out, skipped = _contiguous(rows, 4, self.now)
+        self.assertEqual([r.event_id for r in out], [5, 7, 10])
+        self.assertEqual(skipped, [(6, 6), (8, 9)])
+
+    def test_recent_gap_at_head_yields_nothing(self):
+        self.assertEqual(_contiguous([_event(9, self.now)], 4, self.now), ([], []))
+
+
+class TestUpdateGaps(unittest.TestCase):
+    def setUp(self):
+        self.now = datetime(2025, 1, 1, 12, 0, 0)
+        self.since = (self.now - timedelta(seconds=30)).isoformat()
+
+    def test_new_skipped_ranges_are_kept(self):
+        gaps, expired = _update_gaps(None, [], [(6, 6), (8, 9)], self.now)
+        self.assertEqual(gaps, [[6, 6, self.now.isoformat()], [8, 9, self.now.isoformat()]])
+        self.assertEqual(expired, [])
+
+    def test_late_event_closes_or_splits_range(self):
+        gaps, _ = _update_gaps([[6, 6, self.since], [8, 12, self.since]], [6, 10], [], self.now)
+        self.assertEqual(gaps, [[8, 9, self.since], [11, 12, self.since]])
+
+    def test_range_older_than_max_window_expires(self):
+        old = (self.now - timedelta(seconds=ORDER_EVENT_GAP_MAX_SECONDS + 1)).isoformat()
+        gaps, expired = _update_gaps([[6, 7, old], [9, 9, self.since]], [6], [], self.now)
+        self.assertEqual(gaps, [[9, 9, self.since]])
+        self.assertEqual(expired, [(7, 7)])
+
+    def test_list_is_capped_oldest_first(self):
+        skipped = [(i * 2, i * 2) for i in range(ORDER_EVENT_MAX_GAPS + 1)]
+        gaps, expired = _update_gaps([], [], skipped, self.now)
+        self.assertEqual(len(gaps), ORDER_EVENT_MAX_GAPS)
+        self.assertEqual(expired, [(0, 0)])
+
+
+class TestNotificationRows(unittest.TestCase):
+    def test_pay_goes_to_owner(self):
+        rows = _notification_rows(_event(1, None, PAY, order_id=3), owner_id=77)
+        self.assertEqual([(r["owner_id"], r["customer_id"]) for r in rows], [(77, None)])
+
+    def test_owner_cancel_carries_reason(self):
+        rows = _notification_rows(_event(1, None, OWNER_CANCEL, order_id=3, data={"reason": "Hết món"}), 77)
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]["customer_id"], 10)
+        self.assertIn("Hết món", rows[0]["message"])
+
+    def test_expire_notifies_both(self):
+        rows = _notification_rows(_event(1, None, EXPIRE), owner_id=77)
+        self.assertEqual({(r["customer_id"], r["owner_id"]) for r in rows}, {(10, None), (None, 77)})
+
+
+if __name__ == "__main__":
+    unittest.main()
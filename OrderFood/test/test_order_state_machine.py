@@ -0,0 +1,75 @@
+import unittest
+from unittest.mock import patch, MagicMock
+
+from OrderFood.models import StatusOrder
+from OrderFood.order_state_machine import (
+    OrderStateMachine, TRANSITIONS, REFUND_REASONS, ACCEPT, COMPLETE, OWNER_CANCEL, ADMIN_CANCEL, EXPIRE, PAY,
+)
+
+
+class TestTransitionTable(unittest.TestCase):
+    def setUp(self):
+        self.machine = OrderStateMachine()
+
+    def test_allowed_sources(self):
+        self.assertTrue(self.machine.can(PAY, StatusOrder.PENDING))
+        self.assertTrue(self.machine.can(ACCEPT, "PAID"))
+        self.assertFalse(self.machine.can(ACCEPT, StatusOrder.ACCEPTED))
+        self.assertTrue(self.machine.can(OWNER_CANCEL, StatusOrder.ACCEPTED))
+        self.assertFalse(self.machine.can(COMPLETE, StatusOrder.PAID))
+        self.assertTrue(self.machine.can(ADMIN_CANCEL, StatusOrder.PENDING))
+        self.assertFalse(self.machine.can(EXPIRE, StatusOrder.ACCEPTED))
+
+    def test_terminal_states_have_no_exit(self):
+        for t in TRANSITIONS.values():
+            self.assertNotIn(StatusOrder.COMPLETED, t.sources)
+            self.assertNotIn(StatusOrder.CANCELED, t.sources)
+
+
+class TestApply(unittest.TestCase):
+    def setUp(self):
+        self.machine = OrderStateMachine()
+
+    def _apply(self, name, order_id, rowcount=1, **kw):
+        result = MagicMock(rowcount=rowcount)
+        with patch("OrderFood.order_state_machine.db.session.execute", return_value=result) as self.execute, \
+                patch("OrderFood.order_events.record_events") as mock_record, \
+                patch("OrderFood.refund_queue.enqueue_refunds") as mock_refund:
+            ok = self.machine.apply(name, order_id, **kw)
+        return ok, mock_record, mock_refund
+
+    def _tables(self):
+        return [c.args[0].table.name for c in self.execute.call_args_list]
+
+    def test_records_event_when_update_wins(self):
+        ok, mock_record, _ = self._apply(OWNER_CANCEL, 5, restaurant_id=2, reason="Hết món")
+        self.assertTrue(ok)
+        mock_record.assert_called_once_with(OWNER_CANCEL, StatusOrder.CANCELED, [5], {"reason": "Hết món"})
+
+    def test_no_event_when_guard_fails(self):
+        ok, mock_record, mock_refund = self._apply(ACCEPT, 5, rowcount=0)
+        self.assertFalse(ok)
+        mock_record.assert_not_called()
+        mock_refund.assert_not_called()
+
+    def test_cancel_enqueues_refund_in_same_transaction(self):
+        _, _, mock_refund = self._apply(OWNER_CANCEL, 5, restaurant_id=2, reason="Hết món")
+        mock_refund.assert_called_once_with([5], "Hết món")
+
+        _, _, mock_refund = self._apply(EXPIRE, 6)
+        mock_refund.assert_called_once_with([6], REFUND_REASONS[EXPIRE])
+
+    def test_non_cancel_does_not_refund(self):
+        _, _, mock_refund = self._apply(ACCEPT, 5, restaurant_id=2)
+        mock_refund.assert_not_called()
+
+    def test_cancel_from_pending_closes_cart(self):
+        self._apply(ADMIN_CANCEL, 5)
+        self.assertEqual(self._tables(), ["order", "cart"])
+
+        self._apply(OWNER_CANCEL, 5, restaurant_id=2)   # đã thanh toán -> giỏ đã CHECKOUT
+        self.assertEqual(self._tables(), ["order"])
+
+
+if __name__ == "__main__":
+    unittest.main()
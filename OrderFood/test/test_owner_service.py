@@ -2,6 +2,7 @@ import unittest
 import pytest
 from unittest.mock import patch, MagicMock
 from flask import session
+from OrderFood import app
 from OrderFood.owner import owner_bp, is_owner
 from OrderFood.models import StatusOrder, Role, StatusRefund
 from datetime import datetime
@@ -27,10 +28,9 @@ class MyTestCase(unittest.TestCase):
         assert response.status_code == 302  # redirect to login
 
     def test_owner_home_success(client):
-        mock_user = MagicMock()
-        mock_restaurant = MagicMock()
-        mock_user.restaurant_owner.restaurant = mock_restaurant
-        with patch("OrderFood.owner.User.query.get", return_value=mock_user):
+        mock_principal = MagicMock()
+        mock_principal.restaurant = MagicMock()
+        with patch("OrderFood.owner.current_principal", return_value=mock_principal):
             with client.session_transaction() as sess:
                 sess["role"] = "restaurant_owner"
                 sess["user_id"] = 1
@@ -39,9 +39,9 @@ class MyTestCase(unittest.TestCase):
             assert b"owner_home.html" in response.data or b"html" in response.data
 
     def test_get_menu_with_keyword(client):
-        mock_user = MagicMock()
-        mock_user.restaurant_owner.restaurant = MagicMock()
-        with patch("OrderFood.owner.User.query.get", return_value=mock_user):
+        mock_principal = MagicMock()
+        mock_principal.restaurant = MagicMock()
+        with patch("OrderFood.owner.current_principal", return_value=mock_principal):
             with patch("OrderFood.owner.get_dishes_by_name", return_value=["dish1"]):
                 with patch("OrderFood.owner.get_categories_by_owner_id", return_value=[]):
                     with client.session_transaction() as sess:
@@ -51,11 +51,11 @@ class MyTestCase(unittest.TestCase):
                     assert b"menu.html" in response.data
 
     def test_add_dish_success(client):
-        mock_user = MagicMock()
-        mock_user.restaurant_owner.restaurant.restaurant_id = 1
-        with patch("OrderFood.owner.User.query.get", return_value=mock_user):
+        mock_principal = MagicMock()
+        mock_principal.restaurant_id = 1
+        with patch("OrderFood.owner.current_principal", return_value=mock_principal):
             with patch("OrderFood.owner.db.session.add") as mock_add:
-                with patch("OrderFood.owner.db.session.commit") as mock_commit:
+                with patch("OrderFood.owner.db.session.flush") as mock_flush:
                     with client.session_transaction() as sess:
                         sess["user_id"] = 1
                     response = client.post("/owner/add_dish", data={
@@ -69,14 +69,14 @@ class MyTestCase(unittest.TestCase):
                     data = response.get_json()
                     assert data["success"] is True
                     mock_add.assert_called()
-                    mock_commit.assert_called()
+                    mock_flush.assert_called()
 
     def test_edit_dish_success(client):
         mock_dish = MagicMock()
         mock_dish.dish_id = 1
         mock_dish.category = MagicMock(name="Main")
         with patch("OrderFood.owner.Dish.query.get", return_value=mock_dish):
-            with patch("OrderFood.owner.db.session.commit") as mock_commit:
+            with patch("OrderFood.owner.db.session.flush") as mock_flush:
                 with client.session_transaction() as sess:
                     sess["user_id"] = 1
                 response = client.post("/owner/menu/1", data={
@@ -91,14 +91,14 @@ class MyTestCase(unittest.TestCase):
                 data = response.get_json()
                 assert data["success"] is True
                 assert data["dish"]["name"] == "Pizza Updated"
-                mock_commit.assert_called()
+                mock_flush.assert_called()
 
     def test_delete_dish_success(client):
         mock_dish = MagicMock()
         mock_dish.name = "Burger"
         with patch("OrderFood.owner.Dish.query.get", return_value=mock_dish):
             with patch("OrderFood.owner.db.session.delete") as mock_delete:
-                with patch("OrderFood.owner.db.session.commit") as mock_commit:
+                with patch("OrderFood.owner.db.session.flush") as mock_flush:
                     with client.session_transaction() as sess:
                         sess["user_id"] = 1
                     response = client.delete("/owner/menu/1")
@@ -106,48 +106,14 @@ class MyTestCase(unittest.TestCase):
                     data = response.get_json()
                     assert data["success"] is True
                     mock_delete.assert_called()
-                    mock_commit.assert_called()
-
-    def test_approve_order_success(client):
-        mock_order = MagicMock()
-        mock_order.order_id = 1
-        mock_order.status = StatusOrder.PAID
-        mock_order.customer.user.name = "John"
-        mock_order.total_price = 200
-        mock_order.cart.items = []
-        with patch("OrderFood.owner.Order.query.get_or_404", return_value=mock_order):
-            with patch("OrderFood.owner.db.session.commit") as mock_commit:
-                with client.session_transaction() as sess:
-                    sess["user_id"] = 1
-                response = client.post("/owner/orders/1/approve")
-                assert response.status_code == 200
-                data = response.get_json()
-                assert data["status"] == StatusOrder.ACCEPTED.value
-                mock_commit.assert_called()
-
-    def test_cancel_order_success(client):
-        mock_order = MagicMock()
-        mock_order.order_id = 1
-        mock_order.status = StatusOrder.PAID
-        mock_order.customer.user.name = "John"
-        mock_order.payment = MagicMock(payment_id=10)
-        with patch("OrderFood.owner.Order.query.get_or_404", return_value=mock_order):
-            with patch("OrderFood.owner.db.session.add") as mock_add:
-                with patch("OrderFood.owner.db.session.commit") as mock_commit:
-                    with client.session_transaction() as sess:
-                        sess["user_id"] = 1
-                    response = client.post("/owner/orders/1/cancel", json={"reason": "Out of stock"})
-                    assert response.status_code == 200
-                    data = response.get_json()
-                    assert data["status"] == StatusOrder.CANCELED.value
-                    mock_add.assert_called()
-                    mock_commit.assert_called()
+                    mock_flush.assert_called()
 
     def test_manage_restaurant_success(client):
-        mock_user = MagicMock()
-        mock_user.restaurant_owner.restaurant = MagicMock()
-        mock_user.restaurant_owner = MagicMock()
-        with patch("OrderFood.owner.User.query.get", return_value=mock_user):
+        mock_principal = MagicMock()
+        mock_principal.restaurant_id = 1
+        mock_principal.restaurant = MagicMock()
+        mock_principal.owner = MagicMock()
+        with patch("OrderFood.owner.current_principal", return_value=mock_principal):
             with client.session_transaction() as sess:
                 sess["role"] = "restaurant_owner"
                 sess["user_id"] = 1
@@ -156,11 +122,12 @@ class MyTestCase(unittest.TestCase):
             assert b"manage_res.html" in response.data
 
     def test_update_restaurant_success(client):
-        mock_user = MagicMock()
-        mock_user.restaurant_owner.restaurant = MagicMock()
-        mock_user.restaurant_owner = MagicMock()
-        with patch("OrderFood.owner.User.query.get", return_value=mock_user):
-            with patch("OrderFood.owner.db.session.commit") as mock_commit:
+        mock_principal = MagicMock()
+        mock_principal.restaurant_id = 1
+        mock_principal.restaurant = MagicMock()
+        mock_principal.owner = MagicMock()
+        with patch("OrderFood.owner.current_principal", return_value=mock_principal):
+            with patch("OrderFood.owner.db.session.flush") as mock_flush:
                 with client.session_transaction() as sess:
                     sess["role"] = "restaurant_owner"
                     sess["user_id"] = 1
@@ -171,7 +138,104 @@ class MyTestCase(unittest.TestCase):
                 assert response.status_code == 200
                 data = response.get_json()
                 assert data["success"] is True
-                mock_commit.assert_called()
+                mock_flush.assert_called()
+
+
+class TestOwnerOrderRoutes(unittest.TestCase):
+    """Route đơn hàng của owner qua app.test_client() (owner_bp đã đăng ký trong create_app)."""
+
+    def setUp(self):
+        app.config["TESTING"] = True
+        self.client = app.test_client()
+        with self.client.session_transaction() as sess:
+            sess["role"] = "restaurant_owner"
+            sess["user_id"] = 1
+        self.principal = MagicMock()
+        self.principal.restaurant_id = 3
+        patch("OrderFood.owner.current_principal", return_value=self.principal).start()
+        self.addCleanup(patch.stopall)
+
+    def test_manage_orders_paginates_history(self):
+        actionable = {StatusOrder.PAID: [], StatusOrder.ACCEPTED: []}
+        counts = {"PAID": 0, "ACCEPTED": 0, "CANCELED": 3, "COMPLETED": 0}
+        with patch("OrderFood.owner.order_dao.list_owner_actionable", return_value=actionable), \
+                patch("OrderFood.owner.order_dao.list_owner_history", return_value=([], None)) as mock_history, \
+                patch("OrderFood.owner.order_dao.cached_status_counts", return_value=counts), \
+                patch("OrderFood.owner.render_template", return_value="ok") as mock_render:
+            response = self.client.get("/owner/orders?tab=cancelled&cursor=abc")
+
+        self.assertEqual(response.status_code, 200)
+        # cursor chỉ áp dụng cho tab đang mở
+        mock_history.assert_any_call(3, StatusOrder.CANCELED, "abc", 20)
+        mock_history.assert_any_call(3, StatusOrder.COMPLETED, None, 20)
+        kwargs = mock_render.call_args.kwargs
+        self.assertEqual(kwargs["active_tab"], "cancelled")
+        self.assertEqual(kwargs["status_counts"], counts)
+
+    def test_bulk_approve_orders(self):
+        results = [{"id": 5, "ok": True, "status": "ACCEPTED"}]
+        with patch("OrderFood.owner.approve_orders", return_value=(1, results)) as mock_approve, \
+                patch("OrderFood.owner.db.session.commit"):
+            response = self.client.post("/owner/orders/bulk/approve", json={"order_ids": [5]})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()["results"], results)
+        # chỉ đơn của nhà hàng mình
+        mock_approve.assert_called_once_with(3, [5])
+
+    def test_approve_order_success(self):
+        mock_order = MagicMock()
+        mock_order.order_id = 1
+        mock_order.status = StatusOrder.ACCEPTED
+        mock_order.customer.user.name = "John"
+        mock_order.total_price = 200
+        mock_order.lines = [MagicMock(dish_name="Phở bò", quantity=2)]
+        with patch("OrderFood.owner.order_machine.apply", return_value=True) as mock_apply, \
+                patch("OrderFood.owner.db.session.get", return_value=mock_order), \
+                patch("OrderFood.owner.db.session.commit"):
+            response = self.client.post("/owner/orders/1/approve")
+
+        self.assertEqual(response.status_code, 200)
+        data = response.get_json()
+        self.assertEqual(data["status"], StatusOrder.ACCEPTED.value)
+        self.assertEqual(data["items"], [{"name": "Phở bò", "quantity": 2}])
+        mock_apply.assert_called_once_with("accept", 1, restaurant_id=3)
+
+    def test_approve_order_wrong_status(self):
+        # UPDATE có điều kiện không khớp nhưng đơn thuộc nhà hàng -> 400 (không phải 404)
+        query = MagicMock()
+        query.filter.return_value.first.return_value = (1,)
+        with patch("OrderFood.owner.order_machine.apply", return_value=False), \
+                patch("OrderFood.owner.db.session.query", return_value=query):
+            response = self.client.post("/owner/orders/1/approve")
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.get_json()["error"], "Đơn hàng không ở trạng thái PAID")
+
+    def test_approve_order_not_found(self):
+        query = MagicMock()
+        query.filter.return_value.first.return_value = None
+        with patch("OrderFood.owner.order_machine.apply", return_value=False), \
+                patch("OrderFood.owner.db.session.query", return_value=query):
+            response = self.client.post("/owner/orders/99/approve")
+
+        self.assertEqual(response.status_code, 404)
+
+    def test_cancel_order_success(self):
+        mock_order = MagicMock()
+        mock_order.order_id = 1
+        mock_order.status = StatusOrder.CANCELED
+        mock_order.customer.user.name = "John"
+        with patch("OrderFood.owner.order_machine.apply", return_value=True) as mock_apply, \
+                patch("OrderFood.owner.db.session.get", return_value=mock_order), \
+                patch("OrderFood.owner.db.session.commit"):
+            response = self.client.post("/owner/orders/1/cancel", json={"reason": "Out of stock"})
+
+        self.assertEqual(response.status_code, 200)
+        data = response.get_json()
+        self.assertEqual(data["status"], StatusOrder.CANCELED.value)
+        self.assertEqual(data["reason"], "Out of stock")
+        mock_apply.assert_called_once_with("owner_cancel", 1, restaurant_id=3, reason="Out of stock")
 
 
 if __name__ == '__main__':
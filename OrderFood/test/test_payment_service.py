@@ -0,0 +1,88 @@
+import unittest
+from unittest.mock import patch
+
+from flask import Flask
+
+from OrderFood import db
+from OrderFood import payment_service
+from OrderFood.models import Order, Cart, Payment, StatusOrder, StatusPayment, StatusCart
+from OrderFood.payment_service import (
+    confirm_vnpay_payment, CONFIRMED, ALREADY_CONFIRMED, REFUNDING, LATE_PAYMENT_REASON
+)
+
+
+class TestConfirmVnpayPayment(unittest.TestCase):
+    """Chỉ tạo bảng cart + order + payment trên SQLite in-memory (SQLite không ép FK)."""
+
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite://"
+        db.init_app(self.app)
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        self.tables = [Cart.__table__, Order.__table__, Payment.__table__]
+        db.metadata.create_all(db.engine, tables=self.tables)
+
+        self.machine = patch("OrderFood.payment_service.order_machine").start()
+        self.enqueue = patch("OrderFood.payment_service.enqueue_refunds").start()
+        self.addCleanup(patch.stopall)
+        payment_service._confirmed.clear()
+
+    def tearDown(self):
+        db.session.remove()
+        db.metadata.drop_all(db.engine, tables=list(reversed(self.tables)))
+        self.ctx.pop()
+
+    def _seed(self, order_status=StatusOrder.PENDING, payment_status=StatusPayment.PENDING):
+        cart = Cart(cus_id=3, res_id=1, status=StatusCart.ACTIVE)
+        db.session.add(cart)
+        db.session.flush()
+        order = Order(customer_id=3, restaurant_id=1, cart_id=cart.cart_id, status=order_status,
+                      total_price=40000, waiting_time=10)
+        db.session.add(order)
+        db.session.flush()
+        db.session.add(Payment(order_id=order.order_id, txn_ref="OD1-1-x", amount=4000000,
+                               status=payment_status))
+        db.session.commit()
+        return order.order_id, cart.cart_id
+
+    def _payment_status(self):
+        return db.session.query(Payment.status).filter_by(txn_ref="OD1-1-x").scalar()
+
+    def _cart_status(self, cart_id):
+        return db.session.query(Cart.status).filter_by(cart_id=cart_id).scalar()
+
+    def test_pending_order_is_confirmed(self):
+        order_id, cart_id = self._seed()
+        self.machine.apply.return_value = True
+
+        self.assertEqual(confirm_vnpay_payment("OD1-1-x", "4000000", "00", "14123456"), (CONFIRMED, order_id))
+        self.assertEqual(self._payment_status(), StatusPayment.PAID)
+        self.assertEqual(self._cart_status(cart_id), StatusCart.CHECKOUT)
+        self.enqueue.assert_not_called()
+
+    def test_payment_after_cancel_is_refunded_not_confirmed(self):
+        order_id, cart_id = self._seed(order_status=StatusOrder.CANCELED)
+        self.machine.apply.return_value = False
+
+        self.assertEqual(confirm_vnpay_payment("OD1-1-x", "4000000", "00"), (REFUNDING, order_id))
+        self.assertEqual(self._payment_status(), StatusPayment.PAID)
+        self.assertEqual(self._cart_status(cart_id), StatusCart.ACTIVE)
+        self.enqueue.assert_called_once_with([order_id], LATE_PAYMENT_REASON)
+
+    def test_replay_after_cancel_stays_refunding(self):
+        order_id, _ = self._seed(order_status=StatusOrder.CANCELED, payment_status=StatusPayment.PAID)
+        self.assertEqual(confirm_vnpay_payment("OD1-1-x", "4000000", "00"), (REFUNDING, order_id))
+        self.machine.apply.assert_not_called()
+
+    def test_replay_after_refund_does_not_reset_to_paid(self):
+        order_id, cart_id = self._seed(order_status=StatusOrder.COMPLETED, payment_status=StatusPayment.REFUND)
+        self.assertEqual(confirm_vnpay_payment("OD1-1-x", "4000000", "00", "14123456"),
+                         (ALREADY_CONFIRMED, order_id))
+        self.assertEqual(self._payment_status(), StatusPayment.REFUND)
+        self.assertEqual(self._cart_status(cart_id), StatusCart.ACTIVE)
+        self.machine.apply.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,96 @@
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from datetime import date, datetime
+
+from sqlalchemy import create_engine, text
+
+from OrderFood.payout_job import partition, compute_statement, parse_period, previous_month
+from payout_worker import settle_slice
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class TestPartition(unittest.TestCase):
+    def test_contiguous_slices_cover_all_ids(self):
+        ids = [7, 1, 3, 9, 4, 12, 15]
+        slices = partition(ids, 3)
+        self.assertEqual(slices, [(1, 4), (7, 9), (12, 15)])
+
+    def test_more_parts_than_ids(self):
+        self.assertEqual(partition([5, 2], 8), [(2, 2), (5, 5)])
+
+    def test_empty(self):
+        self.assertEqual(partition([], 4), [])
+
+
+class TestComputeStatement(unittest.TestCase):
+    def test_commission_and_net(self):
+        row = compute_statement({"completed_orders": 3, "gross_revenue": 300000,
+                                 "refunded_orders": 1, "refunded_amount": 50000}, 0.1)
+        self.assertEqual(row["commission"], 30000)
+        self.assertEqual(row["net_payout"], 270000)
+        # refund của đơn huỷ chỉ báo cáo, không trừ vào net
+        self.assertEqual(row["refunded_amount"], 50000)
+
+    def test_no_activity(self):
+        row = compute_statement({}, 0.1)
+        self.assertEqual((row["completed_orders"], row["net_payout"]), (0, 0))
+
+
+class TestPeriod(unittest.TestCase):
+    def test_parse_month(self):
+        self.assertEqual(parse_period("2025-12"), (date(2025, 12, 1), date(2026, 1, 1)))
+
+    def test_previous_month(self):
+        self.assertEqual(previous_month(date(2025, 3, 15)), (date(2025, 2, 1), date(2025, 3, 1)))
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            parse_period("2025/12")
+
+
+class TestSettleSlice(unittest.TestCase):
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix=".db")
+        os.close(fd)
+        self.uri = f"sqlite:///{self.path}"
+        engine = create_engine(self.uri)
+        with engine.begin() as conn:
+            conn.execute(text('CREATE TABLE "order" (order_id INTEGER PRIMARY KEY, restaurant_id INTEGER, '
+                              'status TEXT, total_price REAL, created_date DATETIME)'))
+            conn.execute(text("CREATE TABLE payment (payment_id INTEGER PRIMARY KEY, order_id INTEGER, amount INTEGER)"))
+            conn.execute(text("CREATE TABLE refund (refund_id INTEGER PRIMARY KEY, payment_id INTEGER, "
+                              "status TEXT, amount INTEGER, completed_at DATETIME)"))
+            conn.execute(text('INSERT INTO "order" VALUES '
+                              "(1, 1, 'COMPLETED', 100000, '2025-01-10 12:00:00'),"
+                              "(2, 1, 'COMPLETED', 50000, '2025-01-20 12:00:00'),"
+                              "(3, 1, 'CANCELED', 20000, '2025-01-21 12:00:00'),"
+                              "(4, 2, 'COMPLETED', 70000, '2025-02-02 12:00:00'),"
+                              "(5, 3, 'COMPLETED', 90000, '2025-01-05 12:00:00')"))
+            conn.execute(text("INSERT INTO payment VALUES (1, 3, 2000000)"))
+            conn.execute(text("INSERT INTO refund VALUES (1, 1, 'COMPLETED', NULL, '2025-01-22 08:00:00')"))
+        engine.dispose()
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_sums_completed_orders_and_refunds_in_period(self):
+        stats = settle_slice(self.uri, 1, 2, datetime(2025, 1, 1), datetime(2025, 2, 1), batch=1)
+        self.assertEqual(set(stats), {1})
+        self.assertEqual(stats[1], {"completed_orders": 2, "gross_revenue": 150000.0,
+                                    "refunded_orders": 1, "refunded_amount": 20000.0})
+
+
+class TestWorkerIsolation(unittest.TestCase):
+    def test_worker_module_does_not_import_app(self):
+        # process con của pool chỉ import payout_worker -> không được kéo theo OrderFood (create_app)
+        code = "import sys, payout_worker; sys.exit(int('OrderFood' in sys.modules))"
+        res = subprocess.run([sys.executable, "-c", code], cwd=ROOT)
+        self.assertEqual(res.returncode, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
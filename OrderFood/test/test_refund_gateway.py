@@ -0,0 +1,51 @@
+import hashlib
+import hmac
+import unittest
+from datetime import datetime
+
+from OrderFood.refund_gateway import FakeVnpayRefundClient, VnpayRefundClient, RefundRequest
+
+
+def _req(refund_id, amount=100000, txn_ref="OD1-1-abc", transaction_no="14123456"):
+    return RefundRequest(refund_id, txn_ref, amount, datetime(2025, 1, 1, 10, 0, 0), "test", transaction_no)
+
+
+class TestFakeVnpayRefundClient(unittest.TestCase):
+    def test_success_returns_gateway_ref(self):
+        client = FakeVnpayRefundClient(latency=0, fail_rate=0)
+        res = client.refund_batch([_req(1), _req(2)])
+        self.assertTrue(res[1].ok and res[2].ok)
+        self.assertTrue(res[1].gateway_ref.startswith("FAKE"))
+        self.assertEqual(client.calls, 1)
+
+    def test_invalid_amount_is_final_failure(self):
+        client = FakeVnpayRefundClient(latency=0, fail_rate=0)
+        res = client.refund_batch([_req(1, amount=0)])
+        self.assertFalse(res[1].ok)
+        self.assertFalse(res[1].retryable)
+
+    def test_transient_failure_is_retryable(self):
+        client = FakeVnpayRefundClient(latency=0, fail_rate=1)
+        res = client.refund_batch([_req(1)])
+        self.assertFalse(res[1].ok)
+        self.assertTrue(res[1].retryable)
+
+
+class TestVnpayRefundClient(unittest.TestCase):
+    def test_payload_signature(self):
+        client = VnpayRefundClient("TMN", "secret")
+        p = client._payload(_req(1))
+        fields = [p[k] for k in (
+            "vnp_RequestId", "vnp_Version", "vnp_Command", "vnp_TmnCode", "vnp_TransactionType",
+            "vnp_TxnRef", "vnp_Amount", "vnp_TransactionNo", "vnp_TransactionDate", "vnp_CreateBy",
+            "vnp_CreateDate", "vnp_IpAddr", "vnp_OrderInfo")]
+        expected = hmac.new(b"secret", "|".join(str(f) for f in fields).encode("utf-8"),
+                            hashlib.sha512).hexdigest()
+        self.assertEqual(p["vnp_SecureHash"], expected)
+        self.assertEqual(p["vnp_Command"], "refund")
+        self.assertEqual(p["vnp_TransactionDate"], "20250101100000")
+        self.assertEqual(p["vnp_TransactionNo"], "14123456")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,143 @@
+import unittest
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from flask import Flask
+
+from OrderFood import db
+from OrderFood.models import Payment, Refund, StatusPayment, StatusRefund
+from OrderFood.refund_queue import (
+    enqueue_refunds, _claim_batch, _mark_retry, _backoff_seconds, _now,
+    REFUND_BACKOFF_BASE, REFUND_BACKOFF_MAX, REFUND_LOCK_TIMEOUT, REFUND_MAX_ATTEMPTS
+)
+
+
+class _SqliteCase(unittest.TestCase):
+    """Chỉ tạo bảng payment + refund trên SQLite in-memory (SQLite không ép FK)."""
+
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite://"
+        db.init_app(self.app)
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.metadata.create_all(db.engine, tables=[Payment.__table__, Refund.__table__])
+
+    def tearDown(self):
+        db.session.remove()
+        db.metadata.drop_all(db.engine, tables=[Refund.__table__, Payment.__table__])
+        self.ctx.pop()
+
+    def _payment(self, order_id, status=StatusPayment.PAID, amount=5000000):
+        p = Payment(order_id=order_id, txn_ref=f"OD{order_id}-1-x", amount=amount, status=status)
+        db.session.add(p)
+        db.session.flush()
+        return p
+
+    def _refund(self, payment, status=StatusRefund.REQUESTED, next_attempt_at=None, locked_at=None):
+        r = Refund(payment_id=payment.payment_id, status=status, amount=payment.amount, attempts=0,
+                   next_attempt_at=next_attempt_at, locked_at=locked_at,
+                   claim_token="old" if status == StatusRefund.PROCESSING else None)
+        db.session.add(r)
+        db.session.flush()
+        return r
+
+
+class TestEnqueueRefunds(_SqliteCase):
+    def test_only_paid_payments_without_refund(self):
+        paid = self._payment(1)
+        self._payment(2, status=StatusPayment.PENDING)
+        self._refund(self._payment(3))
+
+        self.assertEqual(enqueue_refunds([1, 2, 3], "Hết món", wake=False), 1)
+        refund = Refund.query.filter_by(payment_id=paid.payment_id).one()
+        self.assertEqual(refund.status, StatusRefund.REQUESTED)
+        self.assertEqual(refund.amount, 5000000)
+        self.assertEqual(refund.reason, "Hết món")
+        self.assertIsNotNone(refund.next_attempt_at)
+
+    def test_rerun_does_not_duplicate(self):
+        self._payment(1)
+        self.assertEqual(enqueue_refunds([1], wake=False), 1)
+        self.assertEqual(enqueue_refunds([1, 1], wake=False), 0)
+        self.assertEqual(Refund.query.count(), 1)
+
+    def test_empty_ids(self):
+        self.assertEqual(enqueue_refunds([], wake=False), 0)
+
+
+class TestClaimBatch(_SqliteCase):
+    def test_claims_due_rows_once_with_one_token(self):
+        now = _now()
+        a = self._refund(self._payment(1), next_attempt_at=now - timedelta(seconds=1))
+        b = self._refund(self._payment(2), next_attempt_at=now - timedelta(seconds=1))
+        self._refund(self._payment(3), next_attempt_at=now + timedelta(minutes=5))   # chưa đến hạn
+        db.session.commit()
+
+        ids = _claim_batch(10)
+        self.assertEqual(sorted(ids), sorted([a.refund_id, b.refund_id]))
+        rows = Refund.query.filter(Refund.refund_id.in_(ids)).all()
+        self.assertEqual({r.status for r in rows}, {StatusRefund.PROCESSING})
+        self.assertEqual(len({r.claim_token for r in rows}), 1)
+        self.assertIsNotNone(rows[0].claim_token)
+
+        self.assertEqual(_claim_batch(10), [])
+
+    def test_respects_limit(self):
+        now = _now()
+        for order_id in (1, 2, 3):
+            self._refund(self._payment(order_id), next_attempt_at=now - timedelta(seconds=1))
+        db.session.commit()
+        self.assertEqual(len(_claim_batch(2)), 2)
+        self.assertEqual(len(_claim_batch(2)), 1)
+
+    def test_reclaims_stale_lock_only(self):
+        now = _now()
+        stale = self._refund(self._payment(1), status=StatusRefund.PROCESSING,
+                             locked_at=now - REFUND_LOCK_TIMEOUT - timedelta(minutes=1))
+        self._refund(self._payment(2), status=StatusRefund.PROCESSING, locked_at=now)
+        db.session.commit()
+
+        self.assertEqual(_claim_batch(10), [stale.refund_id])
+        db.session.refresh(stale)
+        self.assertNotEqual(stale.claim_token, "old")
+
+
+class TestMarkRetry(unittest.TestCase):
+    def _refund(self, attempts=0):
+        return SimpleNamespace(attempts=attempts, status=StatusRefund.PROCESSING, last_error=None,
+                               claim_token="tok", locked_at=_now(), next_attempt_at=None)
+
+    def test_transient_error_backs_off(self):
+        r = self._refund()
+        with patch("OrderFood.refund_queue.random.uniform", return_value=1.0):
+            before = _now()
+            _mark_retry(r, "99: gateway temporarily unavailable")
+        self.assertEqual(r.status, StatusRefund.REQUESTED)
+        self.assertEqual(r.attempts, 1)
+        self.assertIsNone(r.claim_token)
+        self.assertIsNone(r.locked_at)
+        self.assertGreaterEqual(r.next_attempt_at, before + timedelta(seconds=REFUND_BACKOFF_BASE))
+
+    def test_backoff_grows_and_is_capped(self):
+        with patch("OrderFood.refund_queue.random.uniform", return_value=1.0):
+            self.assertEqual(_backoff_seconds(1), REFUND_BACKOFF_BASE)
+            self.assertEqual(_backoff_seconds(3), REFUND_BACKOFF_BASE * 4)
+            self.assertEqual(_backoff_seconds(50), REFUND_BACKOFF_MAX)
+
+    def test_final_error_fails_immediately(self):
+        r = self._refund()
+        _mark_retry(r, "94: invalid refund request", final=True)
+        self.assertEqual(r.status, StatusRefund.FAILED)
+        self.assertEqual(r.attempts, 1)
+
+    def test_exhausted_attempts_fail(self):
+        r = self._refund(attempts=REFUND_MAX_ATTEMPTS - 1)
+        _mark_retry(r, "99: gateway temporarily unavailable")
+        self.assertEqual(r.status, StatusRefund.FAILED)
+        self.assertEqual(r.last_error, "99: gateway temporarily unavailable")
+
+
+if __name__ == "__main__":
+    unittest.main()
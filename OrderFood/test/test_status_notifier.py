@@ -0,0 +1,44 @@
+import threading
+import unittest
+from unittest.mock import patch
+
+from OrderFood.status_notifier import StatusNotifier
+
+
+class TestStatusNotifier(unittest.TestCase):
+    def setUp(self):
+        self.notifier = StatusNotifier(refresh_seconds=60, max_orders=2)
+
+    def test_loads_once_then_serves_from_memory(self):
+        with patch.object(self.notifier, "_load", return_value=("PAID", 5, 9)) as mock_load:
+            self.assertEqual(self.notifier.current(1), ("PAID", 5, 9))
+            self.assertEqual(self.notifier.current(1), ("PAID", 5, 9))
+        mock_load.assert_called_once_with(1)
+
+    def test_wait_returns_on_update(self):
+        with patch.object(self.notifier, "_load", return_value=("PAID", 5, 9)):
+            self.notifier.current(1)
+        timer = threading.Timer(0.05, self.notifier.update, args=(1, "ACCEPTED", 6))
+        timer.start()
+        self.assertEqual(self.notifier.wait(1, 5, timeout=2), ("ACCEPTED", 6))
+
+    def test_wait_times_out_without_change(self):
+        with patch.object(self.notifier, "_load", return_value=("PAID", 5, 9)):
+            self.notifier.current(1)
+        self.assertEqual(self.notifier.wait(1, 5, timeout=0.01), ("PAID", 5))
+
+    def test_old_events_ignored(self):
+        with patch.object(self.notifier, "_load", return_value=("ACCEPTED", 6, 9)):
+            self.notifier.current(1)
+        self.notifier.update(1, "PAID", 5)
+        self.assertEqual(self.notifier.current(1)[:2], ("ACCEPTED", 6))
+
+    def test_bounded_size(self):
+        with patch.object(self.notifier, "_load", side_effect=lambda oid: ("PAID", oid, 9)):
+            for oid in (1, 2, 3):
+                self.notifier.current(oid)
+        self.assertEqual(list(self.notifier._watches), [2, 3])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,52 @@
+import unittest
+from datetime import timedelta
+
+from OrderFood.trending import SpaceSaving, TrendingTracker, _now
+
+
+class TestSpaceSaving(unittest.TestCase):
+    def test_keeps_heavy_hitters(self):
+        sk = SpaceSaving(capacity=3)
+        for _ in range(10):
+            sk.offer("pho")
+        for _ in range(5):
+            sk.offer("com")
+        for item in ("a", "b", "c", "d"):
+            sk.offer(item)
+
+        top = sk.top(2)
+        self.assertEqual(top[0], ("pho", 10))
+        self.assertEqual(top[1], ("com", 5))
+        self.assertLessEqual(len(sk), 3)
+
+    def test_ignores_non_positive_weight(self):
+        sk = SpaceSaving(capacity=2)
+        sk.offer("pho", 0)
+        self.assertEqual(len(sk), 0)
+
+
+class TestTrendingTracker(unittest.TestCase):
+    def test_restaurant_and_global_scope(self):
+        t = TrendingTracker(capacity=8)
+        t.record(1, [(10, "Phở bò", 3), (11, "Trà sữa", 1)])
+        t.record(2, [(20, "Cơm tấm", 5)])
+
+        res1 = t.top("today", restaurant_id=1, k=5)
+        self.assertEqual([i["dish_id"] for i in res1], [10, 11])
+        self.assertEqual(res1[0]["dish"], "Phở bò")
+
+        glob = t.top("hour", k=1)
+        self.assertEqual(glob[0]["dish_id"], 20)
+        self.assertEqual(glob[0]["quantity"], 5)
+
+    def test_old_events_excluded_from_hour(self):
+        t = TrendingTracker()
+        t.record(1, [(10, "Phở bò", 2)], at=_now() - timedelta(hours=2))
+        self.assertEqual(t.top("hour", restaurant_id=1), [])
+
+    def test_unknown_scope_is_empty(self):
+        self.assertEqual(TrendingTracker().top("week", restaurant_id=99), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+import unittest
+
+from flask import Flask
+from sqlalchemy import update
+
+from OrderFood import db
+from OrderFood import unit_of_work
+from OrderFood.models import Payment, StatusPayment
+
+
+class TestUnitOfWork(unittest.TestCase):
+    """App riêng trên SQLite in-memory, chỉ bảng payment."""
+
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite://"
+        db.init_app(self.app)
+        unit_of_work.init_app(self.app)
+
+        @self.app.post("/bulk/<int:status>")
+        def bulk(status):
+            db.session.execute(update(Payment).values(status=StatusPayment.PAID)
+                               .execution_options(synchronize_session=False))
+            return "", status
+
+        with self.app.app_context():
+            db.metadata.create_all(db.engine, tables=[Payment.__table__])
+            db.session.add(Payment(order_id=1, txn_ref="OD1-1-x", amount=100, status=StatusPayment.PENDING))
+            db.session.commit()
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.metadata.drop_all(db.engine, tables=[Payment.__table__])
+
+    def _status(self):
+        with self.app.app_context():
+            return db.session.query(Payment.status).scalar()
+
+    def test_bulk_update_without_flush_is_committed(self):
+        self.assertEqual(self.client.post("/bulk/200").status_code, 200)
+        self.assertEqual(self._status(), StatusPayment.PAID)
+
+    def test_error_response_rolls_back(self):
+        self.assertEqual(self.client.post("/bulk/400").status_code, 400)
+        self.assertEqual(self._status(), StatusPayment.PENDING)
+
+
+if __name__ == "__main__":
+    unittest.main()
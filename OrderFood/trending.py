@@ -0,0 +1,243 @@
+# OrderFood/trending.py
+"""
+Theo dõi "món đang hot" theo thời gian thực bằng Space-Saving (heavy hitters).
+
+- Mỗi scope (toàn sàn = None, hoặc từng restaurant_id) giữ 3 cửa sổ:
+    hour  : trượt 60 phút, chia 12 bucket x 5 phút
+    today : theo ngày (Asia/Ho_Chi_Minh), reset khi sang ngày mới
+    week  : theo tuần ISO, reset khi sang tuần mới
+- Mỗi sketch chỉ giữ tối đa SKETCH_CAPACITY món -> bộ nhớ cố định,
+  đọc top-k không chạm DB.
+- Được "bơm" dữ liệu khi đơn chuyển COMPLETED (record_completed_orders, gọi từ event COMPLETE).
+
+Lưu ý: state nằm trong process; chạy nhiều worker thì mỗi worker có bảng riêng
+(warm_up() nạp lại từ DB khi khởi động).
+"""
+from __future__ import annotations
+
+import heapq
+from collections import defaultdict
+import threading
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+_TZ = ZoneInfo("Asia/Ho_Chi_Minh")
+
+SKETCH_CAPACITY = 64
+HOUR_BUCKET_MINUTES = 5
+HOUR_BUCKETS = 60 // HOUR_BUCKET_MINUTES
+WINDOWS = ("hour", "today", "week")
+
+
+def _now():
+    return datetime.now(_TZ)
+
+
+def _as_local(dt: datetime) -> datetime:
+    # created_date trong DB là naive giờ VN
+    if dt.tzinfo is None:
+        return dt.replace(tzinfo=_TZ)
+    return dt.astimezone(_TZ)
+
+
+class SpaceSaving:
+    """
+    Sketch Space-Saving (Metwally et al.): giữ tối đa `capacity` bộ đếm.
+    Khi đầy, món mới thay món có count nhỏ nhất và kế thừa count đó (+ error).
+    Mọi món có tần suất thật > N/capacity chắc chắn nằm trong sketch.
+    """
+
+    __slots__ = ("capacity", "counts", "errors")
+
+    def __init__(self, capacity: int = SKETCH_CAPACITY):
+        self.capacity = capacity
+        self.counts: dict = {}
+        self.errors: dict = {}
+
+    def offer(self, item, weight: int = 1) -> None:
+        if weight <= 0:
+            return
+        if item in self.counts:
+            self.counts[item] += weight
+            return
+        if len(self.counts) < self.capacity:
+            self.counts[item] = weight
+            self.errors[item] = 0
+            return
+        victim = min(self.counts, key=self.counts.__getitem__)
+        floor = self.counts.pop(victim)
+        self.errors.pop(victim, None)
+        self.counts[item] = floor + weight
+        self.errors[item] = floor
+
+    def merge_into(self, acc: dict) -> None:
+        for item, c in self.counts.items():
+            acc[item] = acc.get(item, 0) + c
+
+    def top(self, k: int) -> list[tuple]:
+        return heapq.nlargest(k, self.counts.items(), key=lambda kv: kv[1])
+
+    def __len__(self):
+        return len(self.counts)
+
+
+class _ScopeWindows:
+    """3 cửa sổ (hour / today / week) cho 1 scope."""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.hour_buckets: dict[datetime, SpaceSaving] = {}
+        self.day_key = None
+        self.day = SpaceSaving(capacity)
+        self.week_key = None
+        self.week = SpaceSaving(capacity)
+
+    @staticmethod
+    def _bucket_start(at: datetime) -> datetime:
+        minute = at.minute - at.minute % HOUR_BUCKET_MINUTES
+        return at.replace(minute=minute, second=0, microsecond=0)
+
+    def _expire_hour(self, now: datetime) -> None:
+        cutoff = self._bucket_start(now) - timedelta(minutes=HOUR_BUCKET_MINUTES * (HOUR_BUCKETS - 1))
+        for start in [b for b in self.hour_buckets if b < cutoff]:
+            del self.hour_buckets[start]
+
+    def _roll_calendar(self, now: datetime) -> None:
+        day_key = now.date()
+        if self.day_key != day_key:
+            self.day_key = day_key
+            self.day = SpaceSaving(self.capacity)
+        week_key = now.isocalendar()[:2]
+        if self.week_key != week_key:
+            self.week_key = week_key
+            self.week = SpaceSaving(self.capacity)
+
+    def offer(self, item, weight: int, at: datetime, now: datetime) -> None:
+        self._roll_calendar(now)
+        if at.isocalendar()[:2] == self.week_key:
+            self.week.offer(item, weight)
+        if at.date() == self.day_key:
+            self.day.offer(item, weight)
+
+        if now - at < timedelta(hours=1):
+            start = self._bucket_start(at)
+            sk = self.hour_buckets.get(start)
+            if sk is None:
+                sk = self.hour_buckets[start] = SpaceSaving(self.capacity)
+            sk.offer(item, weight)
+        self._expire_hour(now)
+
+    def top(self, window: str, k: int, now: datetime) -> list[tuple]:
+        self._roll_calendar(now)
+        if window == "today":
+            return self.day.top(k)
+        if window == "week":
+            return self.week.top(k)
+        self._expire_hour(now)
+        # gộp tối đa HOUR_BUCKETS sketch -> O(k * HOUR_BUCKETS), vẫn là hằng số
+        acc: dict = {}
+        for sk in self.hour_buckets.values():
+            sk.merge_into(acc)
+        return heapq.nlargest(k, acc.items(), key=lambda kv: kv[1])
+
+
+class TrendingTracker:
+    """Bảng top món theo scope, thread-safe."""
+
+    def __init__(self, capacity: int = SKETCH_CAPACITY):
+        self.capacity = capacity
+        self._scopes: dict[int | None, _ScopeWindows] = {}
+        self._names: dict[int, str] = {}
+        self._lock = threading.Lock()
+
+    def _scope(self, restaurant_id) -> _ScopeWindows:
+        sc = self._scopes.get(restaurant_id)
+        if sc is None:
+            sc = self._scopes[restaurant_id] = _ScopeWindows(self.capacity)
+        return sc
+
+    def record(self, restaurant_id: int, lines, at: datetime | None = None) -> None:
+        """
+        lines: iterable (dish_id, dish_name, quantity).
+        Ghi vào scope của nhà hàng và scope toàn sàn.
+        """
+        now = _now()
+        at = _as_local(at) if at else now
+        with self._lock:
+            res_scope = self._scope(restaurant_id)
+            glob_scope = self._scope(None)
+            for dish_id, name, qty in lines:
+                if dish_id is None:
+                    continue
+                if name:
+                    self._names[dish_id] = name
+                item = (restaurant_id, dish_id)
+                res_scope.offer(item, int(qty or 0), at, now)
+                glob_scope.offer(item, int(qty or 0), at, now)
+
+    def top(self, window: str = "today", restaurant_id: int | None = None, k: int = 10) -> list[dict]:
+        if window not in WINDOWS:
+            window = "today"
+        now = _now()
+        with self._lock:
+            sc = self._scopes.get(restaurant_id)
+            if sc is None:
+                return []
+            items = sc.top(window, k, now)
+            names = self._names
+            return [
+                {"restaurant_id": rid, "dish_id": did, "dish": names.get(did, ""), "quantity": int(c)}
+                for (rid, did), c in items
+            ]
+
+    def reset(self) -> None:
+        with self._lock:
+            self._scopes.clear()
+            self._names.clear()
+
+
+tracker = TrendingTracker()
+
+
+def record_completed_orders(order_ids) -> None:
+    """
+    Gọi từ consumer "trending" của order_event (transition COMPLETE), 1 câu đọc order_line cho cả lô.
+    Lỗi ở đây không được làm hỏng nghiệp vụ chính.
+    """
+    from OrderFood import db
+    from OrderFood.models import OrderLine
+
+    order_ids = list(order_ids or [])
+    if not order_ids:
+        return
+    try:
+        rows = (db.session.query(OrderLine.restaurant_id, OrderLine.dish_id, OrderLine.dish_name,
+                                 OrderLine.quantity)
+                .filter(OrderLine.order_id.in_(order_ids), OrderLine.dish_id.isnot(None))
+                .all())
+        by_res = defaultdict(list)
+        for rid, dish_id, name, qty in rows:
+            by_res[rid].append((dish_id, name, qty))
+        for rid, lines in by_res.items():
+            tracker.record(rid, lines)
+    except Exception as ex:
+        print("[TRENDING] record failed:", ex)
+
+
+def warm_up() -> None:
+    """Nạp lại các đơn COMPLETED trong tuần hiện tại (dùng created_date làm mốc)."""
+    from OrderFood import db
+    from OrderFood.models import Order, OrderLine, StatusOrder
+
+    now = _now()
+    week_start = (now - timedelta(days=now.weekday())).replace(hour=0, minute=0, second=0, microsecond=0)
+    rows = (db.session.query(OrderLine.restaurant_id, OrderLine.created_date, OrderLine.dish_id,
+                             OrderLine.dish_name, OrderLine.quantity)
+            .join(Order, Order.order_id == OrderLine.order_id)
+            .filter(Order.status == StatusOrder.COMPLETED,
+                    OrderLine.created_date >= week_start.replace(tzinfo=None),
+                    OrderLine.dish_id.isnot(None))
+            .yield_per(1000))
+    tracker.reset()
+    for rid, created, dish_id, name, qty in rows:
+        tracker.record(rid, [(dish_id, name, qty)], at=created)
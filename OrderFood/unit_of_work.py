@@ -0,0 +1,101 @@
+# OrderFood/unit_of_work.py
+"""
+Unit of work theo request.
+
+- DAO / helper chỉ db.session.add() + flush() (để lấy id, phát hiện lỗi ràng buộc sớm),
+  KHÔNG commit giữa chừng.
+- Cuối request: response < 400 và có thay đổi -> commit đúng 1 lần;
+  response >= 400 hoặc exception -> rollback toàn bộ.
+- Commit lỗi -> rollback + trả 500 (thay vì response "thành công" mà dữ liệu không được lưu).
+
+Ngoài request (job nền, seed, script) người gọi tự commit như trước.
+
+Ngoại lệ có chủ ý (vẫn commit trong request):
+- db_retry.retry_on_deadlock: commit trong vòng retry để bắt deadlock lúc commit và chạy lại
+  (vnpay_return / vnpay_ipn / checkout ...);
+- bulk_delete: xoá theo lô, mỗi lô commit riêng để không giữ lock lâu.
+"""
+from flask import g, has_request_context, jsonify, current_app
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from OrderFood import db
+
+
+def _mark_pending(*_):
+    if has_request_context():
+        g._uow_pending = True
+
+
+def _mark_write(state):
+    # UPDATE / DELETE / INSERT ... SELECT chạy thẳng qua session.execute() không đi qua flush
+    if state.is_insert or state.is_update or state.is_delete:
+        _mark_pending()
+
+
+def _clear_pending(*_):
+    if has_request_context():
+        g.pop("_uow_pending", None)
+
+
+def _has_changes() -> bool:
+    s = db.session
+    return bool(g.get("_uow_pending") or s.new or s.dirty or s.deleted)
+
+
+def on_commit(fn) -> None:
+    """
+    Chạy fn() sau khi request commit thành công (vd: đánh thức worker nền).
+    Ngoài request -> chạy ngay (người gọi đã/ sẽ tự commit).
+    """
+    if has_request_context():
+        g.setdefault("_uow_callbacks", []).append(fn)
+    else:
+        fn()
+
+
+def _run_callbacks():
+    for fn in g.pop("_uow_callbacks", []):
+        try:
+            fn()
+        except Exception:
+            current_app.logger.exception("unit of work on_commit callback failed")
+
+
+def _finish(response):
+    if response.status_code >= 400:
+        db.session.rollback()
+        g.pop("_uow_callbacks", None)
+        return response
+    if _has_changes():
+        try:
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            g.pop("_uow_callbacks", None)
+            current_app.logger.exception("unit of work commit failed")
+            resp = jsonify({"error": "commit_failed"})
+            resp.status_code = 500
+            return resp
+        finally:
+            g.pop("_uow_pending", None)
+    _run_callbacks()
+    return response
+
+
+def _teardown(exc):
+    if exc is not None:
+        db.session.rollback()
+
+
+def init_app(app):
+    # flush() trong request -> đánh dấu còn thay đổi chưa commit
+    # (sau flush, session.new/dirty rỗng nên không tự nhận biết được)
+    if not event.contains(Session, "after_flush", _mark_pending):
+        event.listen(Session, "after_flush", _mark_pending)
+        event.listen(Session, "do_orm_execute", _mark_write)
+        # route còn tự commit (code cũ) -> không cần commit lại lần nữa
+        event.listen(Session, "after_commit", _clear_pending)
+        event.listen(Session, "after_rollback", _clear_pending)
+    app.after_request(_finish)
+    app.teardown_request(_teardown)
@@ -0,0 +1,72 @@
+# payout_worker.py
+"""
+Phần tính payout chạy trong process con của OrderFood/payout_job.py (ProcessPool forkserver / spawn).
+
+Module cố ý nằm NGOÀI package OrderFood: import OrderFood là chạy create_app() (kết nối DB,
+create_all, scheduler, worker nền) trong từng process con. Ở đây chỉ cần sqlalchemy + DB URL;
+các bảng được khai báo lại bằng sqlalchemy Core (table()/column()) với đúng những cột cần đọc
+— đổi tên cột trong OrderFood/models.py thì sửa cả ở đây.
+"""
+from collections import defaultdict
+from datetime import datetime
+
+from sqlalchemy import create_engine, select, func, table, column
+from sqlalchemy.pool import NullPool
+
+PAYOUT_STREAM_BATCH = 2000
+
+# Giá trị enum lưu trong DB (StatusOrder.COMPLETED / StatusRefund.COMPLETED)
+ORDER_COMPLETED = "COMPLETED"
+REFUND_COMPLETED = "COMPLETED"
+
+order_t = table("order",
+                column("order_id"), column("restaurant_id"), column("status"),
+                column("total_price"), column("created_date"))
+payment_t = table("payment",
+                  column("payment_id"), column("order_id"), column("amount"))
+refund_t = table("refund",
+                 column("refund_id"), column("payment_id"), column("status"),
+                 column("amount"), column("completed_at"))
+
+
+def empty_stats() -> dict:
+    return {"completed_orders": 0, "gross_revenue": 0.0, "refunded_orders": 0, "refunded_amount": 0.0}
+
+
+def settle_slice(db_uri: str, lo: int, hi: int, start: datetime, end: datetime,
+                 batch: int = PAYOUT_STREAM_BATCH) -> dict[int, dict]:
+    """Tổng hợp nhà hàng có restaurant_id trong [lo, hi]. Engine riêng, không dùng db.session của Flask."""
+    engine = create_engine(db_uri, poolclass=NullPool)
+    out: dict[int, dict] = defaultdict(empty_stats)
+    o, p, r = order_t.c, payment_t.c, refund_t.c
+    try:
+        with engine.connect() as conn:
+            orders = (select(o.restaurant_id, o.total_price)
+                      .where(o.restaurant_id.between(lo, hi),
+                             o.status == ORDER_COMPLETED,
+                             o.created_date >= start,
+                             o.created_date < end))
+            result = conn.execution_options(stream_results=True, yield_per=batch).execute(orders)
+            for part in result.partitions():
+                for rid, total in part:
+                    s = out[rid]
+                    s["completed_orders"] += 1
+                    s["gross_revenue"] += float(total or 0)
+
+            refunds = (select(o.restaurant_id, func.count(r.refund_id),
+                              func.coalesce(func.sum(func.coalesce(r.amount, p.amount)), 0))
+                       .select_from(refund_t
+                                    .join(payment_t, p.payment_id == r.payment_id)
+                                    .join(order_t, o.order_id == p.order_id))
+                       .where(o.restaurant_id.between(lo, hi),
+                              r.status == REFUND_COMPLETED,
+                              r.completed_at >= start,
+                              r.completed_at < end)
+                       .group_by(o.restaurant_id))
+            for rid, n, amount in conn.execute(refunds):
+                s = out[rid]
+                s["refunded_orders"] += int(n or 0)
+                s["refunded_amount"] += int(amount or 0) / 100   # VND * 100 -> VND
+    finally:
+        engine.dispose()
+    return dict(out)